@@ -1,7 +1,6 @@
 import os
 from typing import List, Optional
 
-import google.generativeai as genai
 from dotenv import load_dotenv
 from sqlalchemy.orm import joinedload
 from models import Attraction, db
@@ -11,8 +10,17 @@ load_dotenv()
 
 # Cấu hình API
 GENAI_API_KEY = os.environ.get('GEMINI_API_KEY')
-if GENAI_API_KEY:
-    genai.configure(api_key=GENAI_API_KEY)
+_genai = None
+
+
+def _get_genai():
+    """Nạp SDK Gemini khi dùng lần đầu (import mất ~1s, không để mọi worker phải chịu lúc khởi động)."""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=GENAI_API_KEY)
+        _genai = genai
+    return _genai
 
 # --- CẤU HÌNH NHÂN VẬT (SYSTEM PROMPT) ---
 # Đây là bí quyết để AI viết hay!
@@ -127,7 +135,7 @@ def chat_with_tour_guide(user_message, context_data=None, chat_history=None, use
     if not GENAI_API_KEY:
         return "Hệ thống đang bảo trì."
 
-    model = genai.GenerativeModel(
+    model = _get_genai().GenerativeModel(
         "gemini-2.5-flash",
         system_instruction=SYSTEM_PROMPT_SMART_TOURISM  # dùng prompt mới
     )
@@ -181,7 +189,7 @@ def generate_caption(attraction_name, features=None):
     if not GENAI_API_KEY:
         return "Hệ thống đang bảo trì."
 
-    model = genai.GenerativeModel(
+    model = _get_genai().GenerativeModel(
         'gemini-2.5-flash',
         system_instruction=SYSTEM_PROMPT_SMART_TOURISM
     )
@@ -207,7 +215,7 @@ def generate_tour_description(tour_attracions):
     if not GENAI_API_KEY:
         return "Hệ thống đang bảo trì."
 
-    model = genai.GenerativeModel(
+    model = _get_genai().GenerativeModel(
         'gemini-2.5-flash',
         system_instruction=SYSTEM_PROMPT_SMART_TOURISM
     )
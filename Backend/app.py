@@ -1,5 +1,5 @@
 # Import thư viện ngoài 
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
 from datetime import datetime
 import os
@@ -14,6 +14,7 @@ from flask_jwt_extended import (
     verify_jwt_in_request
 )
 from dotenv import load_dotenv
+from sqlalchemy.orm import joinedload
 
 
 # Import trong project
@@ -28,8 +29,12 @@ from models import (
     User,
     TokenBlacklist,
 )
-from init_db import import_demo_data
-from service.search_service import precompute_nearby_attractions, smart_recommendation_service, get_nearby_attr
+from service.search_service import (
+    start_nearby_precompute_in_background,
+    smart_recommendation_service,
+    get_nearby_attr,
+    get_nearby_by_location
+)
 from service.attraction_service import (
     get_attraction_detail_service,
     create_review,
@@ -38,12 +43,33 @@ from service.attraction_service import (
     set_favorite,
 )
 from service.tour_service import generate_smart_tour
+from service.itinerary_cache import get_itinerary_cache
+from service.weather_cache import get_weather_cache
+from service.tour_job_service import validate_tour_params, submit_tour_job, get_tour_job
+from service.route_cache import ROUTE_CACHE_WARM_ON_STARTUP, warm_route_cache, get_shared_route_cache
+from service.http_client import get_http_stats
+from service.db_metrics import (
+    install_query_listeners,
+    start_request_metrics,
+    finish_request_metrics,
+    get_route_metrics,
+    render_prometheus
+)
+from service.schema_service import check_schema
+from service.tracing import trace_timings, get_stage_metrics, render_stage_histograms
+from service.pagination import parse_page_args, keyset_page, page_json
+from service.response_cache import cached_response, invalidate_cache, get_response_cache
+from service.geo_index import build_coord_index
+from service.search_index import build_search_index
+from service.fts_index import ensure_fts_index
 from service.save_tour_service import (
+    count_saved_tours,
     get_saved_tours_service,    
     save_tour_service,
     unsave_tour_service
 )
 from service.user_service import (
+    count_user_reviews,
     get_user_favorites_service,
     get_user_reviews_service
 )
@@ -65,6 +91,12 @@ from agent_utils import build_ai_context, chat_with_tour_guide, generate_caption
 
 # Load environment variables
 load_dotenv()
+# Tính nearby ở thread nền lúc khởi động (mặc định tắt: bootstrap.py / build_nearby.py đã tính sẵn)
+NEARBY_PRECOMPUTE_ON_STARTUP = os.getenv('NEARBY_PRECOMPUTE_ON_STARTUP', '0') == '1'
+# bootstrap.py đặt = 1: chỉ cấu hình app, bỏ qua kiểm tra schema + dựng index (DB có thể chưa có bảng)
+APP_BOOTSTRAP_MODE = os.getenv('APP_BOOTSTRAP_MODE', '0') == '1'
+# /api/metrics chỉ mở cho các IP nội bộ này (Prometheus scrape), nơi khác cần JWT của admin
+METRICS_ALLOWED_IPS = {ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()}
 
 # ===========================================================================
 # ===                                                                     ===
@@ -98,16 +130,41 @@ def create_app():
     jwt_manager = JWTManager(app)
 
     with app.app_context():
-        db.create_all()
-        if Attraction.query.count() == 0:
-            import_demo_data()
-            precompute_nearby_attractions()
+        # Đo số câu SQL / thời gian DB theo request (xem /api/metrics)
+        install_query_listeners(db.engine)
+    if APP_BOOTSTRAP_MODE:
+        return app, jwt_manager
+
+    with app.app_context():
+        # Chỉ kiểm tra DB đã được bootstrap.py dựng (tạo bảng, nạp dữ liệu nằm ở đó, không chạy ở đây)
+        check_schema()
+
+        # Dựng index tọa độ + index tìm kiếm trong RAM
+        build_coord_index()
+        build_search_index()
+        ensure_fts_index()
+
+    # Tính nearby cho các điểm mới / bị đổi tọa độ ở thread nền, không chặn khởi động
+    if NEARBY_PRECOMPUTE_ON_STARTUP:
+        start_nearby_precompute_in_background(app)
+
+    # Nạp sẵn route đã tính từ lần chạy trước (ROUTE_CACHE_WARM_ON_STARTUP=1)
+    if ROUTE_CACHE_WARM_ON_STARTUP:
+        warm_route_cache()
 
     return app, jwt_manager
 
 app, jwt = create_app()
 limiter = Limiter(app)
 
+@app.before_request
+def start_metrics():
+    start_request_metrics()
+
+@app.after_request
+def finish_metrics(response):
+    return finish_request_metrics(response)
+
 # # === THÊM ĐOẠN NÀY ĐỂ DEBUG ===
 # @app.before_request
 # def log_request_info():
@@ -160,6 +217,7 @@ Frontend cần nhớ:
   sẽ không tính tới danh sách Favorite.
 """
 @app.route('/api/search', methods=["GET"])
+@cached_response('search', skip_if_authenticated=True)
 def search():
     # Xử lý thông tin đầu vào với JWT optional (sử dụng nếu hợp lệ, bỏ qua nếu không hợp lệ)
     user_id = None
@@ -243,11 +301,46 @@ def search():
 
 
 
+# NOTE cho frontend:
+#   • GET /api/nearby?lat=<float>&lon=<float>&radius=<km, mặc định 5>&limit=<mặc định 20>
+#       - Các địa điểm quanh tọa độ bất kỳ, sắp theo khoảng cách, mỗi phần tử có thêm "distanceKm".
+@app.route('/api/nearby', methods=['GET'])
+def get_nearby_location():
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        radius = float(request.args.get('radius', 5))
+        limit = int(request.args.get('limit', 20))
+    except (KeyError, ValueError):
+        return jsonify({"success": False, "error": "Cần lat, lon (số thực); radius, limit (nếu có) phải là số"}), 400
+
+    try:
+        result = get_nearby_by_location(lat, lon, radius, limit)
+        return jsonify({"success": True, **result}), 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# NOTE cho frontend:
+#   • GET /api/nearby/<id>?limit=<mặc định 20>&cursor=<optional>&type=<optional>&tag=<optional>
+#       - Điểm lân cận (đường bộ <= 5km), gần nhất trước, mỗi phần tử có thêm "distanceKm", "durationMin".
+#       - type: attraction | festival | cultural_spot, tag: tên tag; nhiều giá trị cách nhau bằng dấu phẩy.
+#       - Trang tiếp theo: cursor = nextCursor (hasMore = false là hết).
+#       - Điểm chưa được tính sẵn: trả theo đường chim bay, "estimated": true, durationMin = null, vẫn phân trang bằng cursor như trên.
 @app.route('/api/nearby/<int:attractionId>', methods=['GET'])
 def get_attraction_nearby(attractionId):
     try:
-        nearby = get_nearby_attr(attractionId)
+        limit, cursor = parse_page_args(request.args)
+        nearby = get_nearby_attr(
+            attractionId, limit, cursor,
+            types=request.args.get('type', '').split(','),
+            tags=request.args.get('tag', '').split(',')
+        )
         return jsonify({"success": True, **nearby}), 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except LookupError as e:
         return jsonify({"success": False, "error": str(e)}), 404
     except Exception as e:
@@ -255,8 +348,9 @@ def get_attraction_nearby(attractionId):
 
 
 # NOTE cho frontend:
-#   • GET    /api/attraction/<id>?userId=<int optional>
-#       - Trả về detail + reviews + trạng thái favorite (nếu có userId).
+#   • GET    /api/attraction/<id>?userId=<int optional>&limit=<optional>&cursor=<optional>
+#       - Trả về detail + reviews (mới nhất trước; toàn bộ, hoặc 1 trang khi gửi limit / cursor) + trạng thái favorite (nếu có userId).
+#       - Trang review tiếp theo: gửi lại cursor = data.reviewsPage.nextCursor (hasMore = false là hết).
 #   • POST   /api/attraction/<id>
 #       - Body theo create_review: { userId, content, ratingScore }.
 #       - Response trả lại full detail để FE refresh ngay.
@@ -269,6 +363,7 @@ def get_attraction_nearby(attractionId):
 #       - Response trả về detail + block `favorite` để đồng bộ UI.
 # Ghi nhớ: mọi response đều có dạng {"success": bool, "data": {...}} (riêng PATCH có thêm "favorite").
 @app.route('/api/attraction/<int:attraction_id>', methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
+@cached_response('attraction:{attraction_id}', 'users', skip_if_authenticated=True)
 def get_attraction_detail(attraction_id):
     # Xử lý JWT optional
     user_id = None
@@ -292,9 +387,12 @@ def get_attraction_detail(attraction_id):
                     return jsonify({"success": False, "error": "userId không hợp lệ"}), 400
 
         try:
-            data = get_attraction_detail_service(attraction_id, user_id=user_id)
+            limit, cursor = parse_page_args(request.args, default_limit=None)
+            data = get_attraction_detail_service(attraction_id, user_id=user_id, review_limit=limit, review_cursor=cursor)
             return jsonify({"success": True, "data": data}), 200
 
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
         except Exception as e:
             return jsonify({"success": False, "error": str(e)}), 500
     
@@ -387,6 +485,8 @@ def get_attraction_detail(attraction_id):
 # === Chức năng tạo tour ===
 # NOTE:
 # Thông tin cần: attractionIds, startLat, startLon, startTime, endTime
+# Thêm debug=timings -> response có "timings": {"totalMs", "stages": [{"name", "ms", "calls"}]}
+#   (thời gian từng bước của lần gọi này, không lưu vào cache lịch trình).
 @app.route('/api/quick-tour-creator', methods=['GET'])
 def creator():
     """
@@ -409,59 +509,30 @@ def creator():
             if x.isdigit():
                 attraction_ids.append(int(x))
 
-        # 2. Lấy các tham số đơn
-        start_lat = request.args.get('startLat')
-        start_lon = request.args.get('startLon')
-        start_time_str = request.args.get('startTime') # Format: dd/mm/yyyy HH:MM
-        end_time_str = request.args.get('endTime')     # Format: dd/mm/yyyy HH:MM (MỚI)
-        start_point_name = request.args.get('startPointName')
-
-        # 3. Validation
-        if not attraction_ids:
-             return jsonify({"success": False, "error": "Chưa chọn điểm đến nào (param: attractionIds)"}), 400
-        if not start_lat or not start_lon:
-             return jsonify({"success": False, "error": "Thiếu tọa độ (param: startLat, startLon)"}), 400
-        if not start_time_str:
-            return jsonify({"success": False, "error": "Thiếu thời gian (param: startTime)"}), 400
-        if not end_time_str:
-            return jsonify({"success": False, "error": "Thiếu thời gian kết thúc (param: endTime)"}), 400
-
-        # Parse endTime
+        # 2. Validation (dùng chung với /api/tour-jobs)
         try:
-            start_time = datetime.strptime(start_time_str, "%d/%m/%Y %H:%M")
-            end_time = datetime.strptime(end_time_str, "%d/%m/%Y %H:%M")
-        except ValueError:
-            return jsonify({"success": False, "error": "Format time không hợp lệ"}), 400
-
-        if end_time <= start_time:
-            return jsonify({"success": False, "error": "Thời gian kết thúc phải sau thời gian bắt đầu"}), 400
+            params = validate_tour_params(
+                attraction_ids,
+                request.args.get('startLat'),
+                request.args.get('startLon'),
+                request.args.get('startTime'),  # Format: dd/mm/yyyy HH:MM
+                request.args.get('endTime'),    # Format: dd/mm/yyyy HH:MM
+                start_point_name=request.args.get('startPointName')
+            )
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
 
-        # Validate và parse tọa độ
-        try:
-            start_lat_float = float(start_lat)
-            start_lon_float = float(start_lon)
-            # Kiểm tra phạm vi hợp lệ cho tọa độ (lat: -90 đến 90, lon: -180 đến 180)
-            if not (-90 <= start_lat_float <= 90):
-                return jsonify({"success": False, "error": "Vĩ độ không hợp lệ (phải từ -90 đến 90)"}), 400
-            if not (-180 <= start_lon_float <= 180):
-                return jsonify({"success": False, "error": "Kinh độ không hợp lệ (phải từ -180 đến 180)"}), 400
-        except ValueError:
-            return jsonify({"success": False, "error": "Tọa độ không hợp lệ (startLat, startLon phải là số)"}), 400
-
-        # 4. Gọi Service (Logic giữ nguyên)
-        result = generate_smart_tour(
-            attraction_ids, 
-            float(start_lat), 
-            float(start_lon), 
-            start_time_str,
-            end_time_str,
-            start_point_name=start_point_name
-        )
+        # 3. Gọi Service (Logic giữ nguyên)
+        with trace_timings(enabled=request.args.get('debug') == 'timings') as trace:
+            result = generate_smart_tour(**params)
 
-        return jsonify({
+        response = {
             "success": True, 
             "data": result
-        }), 200
+        }
+        if trace is not None:
+            response["timings"] = trace.to_json()
+        return jsonify(response), 200
 
     except Exception as e:
         print(f"Error creating tour: {e}")
@@ -469,6 +540,63 @@ def creator():
 
 
 
+# === Tạo tour chạy nền (job) ===
+# NOTE:
+# POST /api/tour-jobs: body JSON giống tham số của /api/quick-tour-creator
+#   {"attractionIds": [1, 5], "startLat": 10.77, "startLon": 106.70,
+#    "startTime": "25/12/2025 08:00", "endTime": "27/12/2025 18:00", "startPointName": "..."}
+#   -> 202 + jobId ngay, không chờ tính xong. Gửi lại y hệt -> nhận lại job cũ (created = false).
+# GET /api/tour-jobs/<jobId>: status queued | running | done | failed, done thì kèm "result"
+#   (cùng định dạng "data" của /api/quick-tour-creator). Nên poll mỗi 1-2 giây.
+# Lưu tour kèm "tourJobId" (/api/save-tour) để mở lại lịch trình không cần tính lại.
+@app.route('/api/tour-jobs', methods=['POST'])
+def create_tour_job():
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({"success": False, "error": "Không có dữ liệu được gửi"}), 400
+
+        attraction_ids = data.get('attractionIds') or []
+        if not isinstance(attraction_ids, list) or not all(str(x).isdigit() for x in attraction_ids):
+            return jsonify({"success": False, "error": "attractionIds phải là danh sách ID"}), 400
+
+        params = validate_tour_params(
+            attraction_ids,
+            data.get('startLat'),
+            data.get('startLon'),
+            data.get('startTime'),
+            data.get('endTime'),
+            start_point_name=data.get('startPointName')
+        )
+        job, created = submit_tour_job(app, params)
+        return jsonify({
+            "success": True,
+            "created": created,
+            "data": job.to_json(include_result=job.status == 'done')
+        }), 202 if created else 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error creating tour job: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/tour-jobs/<string:job_id>', methods=['GET'])
+def get_tour_job_status(job_id):
+    try:
+        job = get_tour_job(job_id)
+        return jsonify({
+            "success": True,
+            "data": job.to_json(include_result=job.status == 'done')
+        }), 200
+    except LookupError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except Exception as e:
+        print(f"Error fetching tour job {job_id}: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @app.route('/api/save-tour', methods=['POST', 'PATCH'])
 def save_tour():
     """
@@ -510,6 +638,7 @@ def save_tour():
             start_lat = data.get('startLat')
             start_lon = data.get('startLon')
             start_point_name = data.get('startPointName') 
+            tour_job_id = data.get('tourJobId')
             try:
                 tour_data = save_tour_service(
                     user_id, 
@@ -519,7 +648,8 @@ def save_tour():
                     end_date=end_date,
                     start_lat=start_lat,
                     start_lon=start_lon,
-                    start_point_name=start_point_name
+                    start_point_name=start_point_name,
+                    tour_job_id=tour_job_id
                 )
                 return jsonify({
                     "success": True,
@@ -561,6 +691,7 @@ def save_tour():
 # Tour Package API Routes
 @app.route('/api/tour-packages', methods=['GET'])
 @limiter.limit("500 per day")
+@cached_response('packages')
 def get_all_tour_packages():
     """
     GET /api/tour-packages: Lấy danh sách tóm tắt tất cả các gói tour
@@ -580,6 +711,7 @@ def get_all_tour_packages():
 
 @app.route('/api/tour-packages/<int:package_id>', methods=['GET'])
 @limiter.limit("100 per hour")
+@cached_response('packages')
 def get_tour_package_detail(package_id):
     """
     GET /api/tour-packages/<id>: Lấy chi tiết một gói tour cụ thể
@@ -619,8 +751,9 @@ def get_tour_package_detail(package_id):
 @app.route('/api/saved-tours', methods=['GET'])
 def get_saved_tours():
     """
-    Lấy danh sách tours đã lưu của user
-    Query param: userId=<int>
+    Lấy danh sách tours đã lưu của user (mới nhất trước, phân trang theo cursor)
+    Query param: userId=<int>, limit=<optional>, cursor=<nextCursor của trang trước>
+    Không gửi limit / cursor thì trả toàn bộ như API cũ. total = tổng số tour đã lưu của user.
     """
     try:
         user_id_param = request.args.get('userId')
@@ -633,11 +766,13 @@ def get_saved_tours():
             return jsonify({"success": False, "error": "userId không hợp lệ"}), 400
         
         try:
-            tours_data = get_saved_tours_service(user_id)
+            limit, cursor = parse_page_args(request.args, default_limit=None)
+            tours_data, next_cursor = get_saved_tours_service(user_id, limit, cursor)
             return jsonify({
                 "success": True,
                 "data": tours_data,
-                "total": len(tours_data)
+                "total": count_saved_tours(user_id),
+                **page_json(next_cursor, limit)
             }), 200
         except ValueError as e:
             return jsonify({"success": False, "error": str(e)}), 400
@@ -675,6 +810,8 @@ def upload_avatar():
             # Lưu link tuyệt đối (https://res.cloudinary.com/...) vào DB
             user.avatar_url = image_url
             db.session.commit()
+            # Avatar hiển thị trong blog và review -> xóa cache các trang đó
+            invalidate_cache('users')
             
             return jsonify({
                 "success": True, 
@@ -788,13 +925,17 @@ def get_user(user_id):
 
 @app.route('/api/users', methods=['GET'])
 def get_users():
-    """Lấy danh sách tất cả người dùng"""
+    """Lấy danh sách người dùng theo user_id tăng dần. Query param: limit, cursor (nextCursor của trang trước)"""
     try:
-        users = User.query.order_by(User.user_id.asc()).all()
+        limit, cursor = parse_page_args(request.args, default_limit=None)
+        users, next_cursor = keyset_page(User.query, (User.user_id,), limit, cursor, descending=False)
         return jsonify({
             "success": True,
-            "data": [user.to_json() for user in users]
+            "data": [user.to_json() for user in users],
+            **page_json(next_cursor, limit)
         }), 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -813,14 +954,18 @@ def get_user_favorites(user_id):
 
 @app.route('/api/user/<int:user_id>/reviews', methods=['GET'])
 def get_user_reviews(user_id):
-    """Lấy lịch sử đánh giá của user"""
+    """Lấy lịch sử đánh giá của user (mới nhất trước). Query param: limit, cursor (nextCursor của trang trước)"""
     try:
-        reviews = get_user_reviews_service(user_id)
+        limit, cursor = parse_page_args(request.args, default_limit=None)
+        reviews, next_cursor = get_user_reviews_service(user_id, limit, cursor)
         return jsonify({
             "success": True,
             "data": reviews,
-            "total": len(reviews)
+            "total": count_user_reviews(user_id),
+            **page_json(next_cursor, limit)
         }), 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -932,14 +1077,21 @@ def logout():
 # ===                                                                     ===
 # ===========================================================================
 @app.route('/api/blogs', methods=['GET'])
+@cached_response('blogs', 'users')
 def get_blogs():
-    """Lấy danh sách tất cả blogs"""
+    """Lấy danh sách blogs (mới nhất trước, kèm tác giả). Query param: limit, cursor (nextCursor của trang trước)"""
     try:
-        blogs = Blog.query.order_by(Blog.created_at.desc()).all()
+        limit, cursor = parse_page_args(request.args, default_limit=None)
+        blogs, next_cursor = keyset_page(
+            Blog.query.options(joinedload(Blog.user)), (Blog.created_at, Blog.blog_id), limit, cursor
+        )
         return jsonify({
             "success": True,
-            "data": [blog.to_json() for blog in blogs]
+            "data": [blog.to_json() for blog in blogs],
+            **page_json(next_cursor, limit)
         }), 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -974,6 +1126,7 @@ def delete_blog(blog_id):
         
         db.session.delete(blog)
         db.session.commit()
+        invalidate_cache('blogs')
 
         return jsonify({"success": True, "message": "Đã xóa bài viết"}), 200
 
@@ -1045,6 +1198,7 @@ def create_blog():
         
         db.session.add(new_blog)
         db.session.commit()
+        invalidate_cache('blogs')
         
         return jsonify({
             "success": True,
@@ -1124,64 +1278,89 @@ def ai_generate_caption():
 def health_check():
     return jsonify({"success": True, "message": "API is running"}), 200
 
-def seed_blog_data():
-    """Tạo 2 bài blog mẫu nếu database chưa có blog nào"""
-    import json
-
+# NOTE cho vận hành:
+#   • GET /api/metrics              -> Prometheus text (số request, thời gian, số câu SQL, thời gian DB theo route)
+#   • GET /api/metrics?format=json  -> như trên dạng JSON, kèm các câu SQL chậm nhất khi bật METRICS_INCLUDE_SQL=1
+#   • Chỉ IP trong METRICS_ALLOWED_IPS (mặc định localhost) hoặc JWT của admin mới xem được.
+#   • Các GET có @cached_response trả header ETag + X-Cache (HIT/MISS); gửi If-None-Match để nhận 304.
+#   • itineraryCache / app_itinerary_cache_*: cache lịch trình của generate_smart_tour.
+#   • weatherCache / app_weather_*: cache dự báo thời tiết theo ô lưới.
+#   • tourStages / app_tour_stage_duration_seconds: histogram thời gian từng bước của generate_smart_tour
+#     (cả request lẫn tour job).
+def _check_metrics_access():
+    """None nếu được xem metrics, ngược lại trả về response lỗi 401 / 403."""
+    if request.remote_addr in METRICS_ALLOWED_IPS:
+        return None
     try:
-        count = Blog.query.count()
-        if count > 0:
-            print("✔ Blog đã có dữ liệu, không tạo mẫu.")
-            return
-
-        default_blogs = [
-            {
-                "title": "Khám phá Hội An – Phố cổ giữa lòng thời gian",
-                "content": (
-                    "Hội An là một trong những điểm đến văn hóa nổi bật nhất Việt Nam, "
-                    "mang vẻ đẹp vừa cổ kính vừa nên thơ. Dạo bước dưới những ánh đèn lồng "
-                    "lung linh, thưởng thức cao lầu hay ngồi thuyền trên sông Hoài là trải nghiệm "
-                    "không thể bỏ qua."
-                ),
-                "image_urls": json.dumps([
-                    "/static/hoian.png",
-                    "/static/hoian.png"
-                ]),
-                "user_id": 1  # Gán cho admin/user mẫu
-            },
-            {
-                "title": "Sapa – Thiên đường săn mây giữa đại ngàn",
-                "content": (
-                    "Sapa nổi tiếng với khí hậu mát lạnh quanh năm, ruộng bậc thang hùng vĩ "
-                    "và những đám mây bồng bềnh vào sáng sớm. Núi Hàm Rồng, Fansipan hay bản Cát Cát "
-                    "là những địa điểm không thể bỏ lỡ."
-                ),
-                "image_urls": json.dumps([
-                    "/static/sapa.png",
-                    "/static/sapa.png"
-                ]),
-                "user_id": 1
-            }
-        ]
-
-        for b in default_blogs:
-            blog = Blog(
-                title=b["title"],
-                content=b["content"],
-                image_urls=b["image_urls"],
-                user_id=b["user_id"]
-            )
-            db.session.add(blog)
-
-        db.session.commit()
-        print("✔ Đã tạo 2 blog mẫu thành công!")
-
-    except Exception as e:
-        print("❌ Lỗi seed blog:", e)
-        db.session.rollback()
-
-with app.app_context():
-    seed_blog_data()
+        verify_jwt_in_request()
+        user = db.session.get(User, int(get_jwt_identity()))
+    except Exception:
+        return jsonify({"success": False, "error": "Cần đăng nhập bằng tài khoản admin"}), 401
+    if user is None or not user.is_admin:
+        return jsonify({"success": False, "error": "Chỉ admin mới xem được metrics"}), 403
+    return None
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    denied = _check_metrics_access()
+    if denied is not None:
+        return denied
+
+    cache_stats = get_shared_route_cache().stats()
+    http_stats = get_http_stats()
+    response_stats = get_response_cache().stats()
+    itinerary_stats = get_itinerary_cache().stats()
+    weather_stats = get_weather_cache().stats()
+
+    if request.args.get('format') == 'json':
+        return jsonify({"success": True, "data": {
+            "routes": get_route_metrics(),
+            "routeCache": cache_stats,
+            "httpClient": http_stats,
+            "responseCache": response_stats,
+            "itineraryCache": itinerary_stats,
+            "weatherCache": weather_stats,
+            "tourStages": get_stage_metrics()
+        }}), 200
+
+    extra_gauges = [
+        ("app_route_cache_entries", "Số route đang giữ trong RAM", {(): cache_stats["entries"]}),
+        ("app_http_client_in_flight", "Số request ra ngoài đang chạy", {(): http_stats["inFlight"]}),
+        ("app_http_client_in_flight_peak", "Số request ra ngoài chạy đồng thời cao nhất", {(): http_stats["peakInFlight"]}),
+        ("app_http_client_latency_avg_ms", "Độ trễ trung bình API ngoài (ms)",
+         {(("endpoint", name),): m["avgMs"] for name, m in http_stats["endpoints"].items()}),
+        ("app_response_cache_entries", "Số response đang cache", {(): response_stats["entries"]}),
+        ("app_itinerary_cache_entries", "Số lịch trình đang cache", {(): itinerary_stats["entries"]}),
+        ("app_itinerary_cache_bytes", "Dung lượng cache lịch trình (byte)", {(): itinerary_stats["bytes"]}),
+    ]
+    extra_counters = [
+        ("app_route_cache_lookups_total", "Số lần tra cache route theo kết quả", {
+            (("result", "hit"),): cache_stats["hits"],
+            (("result", "disk_hit"),): cache_stats["diskHits"],
+            (("result", "miss"),): cache_stats["misses"]
+        }),
+        ("app_http_client_calls_total", "Số lời gọi API ngoài theo endpoint",
+         {(("endpoint", name),): m["calls"] for name, m in http_stats["endpoints"].items()}),
+        ("app_http_client_errors_total", "Số lời gọi API ngoài bị lỗi theo endpoint",
+         {(("endpoint", name),): m["errors"] for name, m in http_stats["endpoints"].items()}),
+        ("app_response_cache_invalidations_total", "Số lần xóa cache response do ghi DB", {(): response_stats["invalidations"]}),
+        ("app_response_cache_lookups_total", "Số lần tra cache response theo endpoint và kết quả", {
+            (("endpoint", name), ("result", result)): count
+            for name, s in response_stats["endpoints"].items() for result, count in s.items()
+        }),
+        ("app_itinerary_cache_lookups_total", "Số lần tra cache lịch trình theo kết quả", {
+            (("result", "hit"),): itinerary_stats["hits"],
+            (("result", "miss"),): itinerary_stats["misses"]
+        }),
+        ("app_weather_cache_lookups_total", "Số lần tra cache thời tiết theo kết quả", {
+            (("result", "hit"),): weather_stats["hits"],
+            (("result", "stale"),): weather_stats["staleHits"],
+            (("result", "miss"),): weather_stats["misses"]
+        }),
+        ("app_weather_api_calls_total", "Số lần gọi API forecast thật sự", {(): weather_stats["apiCalls"]}),
+    ]
+    return Response(render_prometheus(extra_gauges, extra_counters) + render_stage_histograms(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,108 @@
+"""
+So sánh 2 cách chia ngày của generate_smart_tour: GMM (cluster_attractions_with_gmm + tách cụm > 3 điểm)
+và engine theo sức chứa (cluster_attractions_by_capacity), trên các bộ điểm ngẫu nhiên lấy từ DB.
+
+Thời gian di chuyển dùng ước lượng đường chim bay (điền sẵn ma trận) nên không gọi GraphHopper,
+kết quả lặp lại được với cùng --seed.
+
+Cách chạy (trong thư mục Backend):
+    python benchmarks/clustering_benchmark.py
+    python benchmarks/clustering_benchmark.py --scenarios 200 --min-points 4 --max-points 10 --seed 7
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('NEARBY_PRECOMPUTE_ON_STARTUP', '0')
+
+from app import app
+from models import Attraction
+from service.geo_index import haversine_km
+from service.routing import _estimate_road_segment, _route_cache_key
+from service.tour_service import (
+    MAX_DAY_DURATION_MINUTES, MAX_ITEMS_PER_DAY,
+    cluster_attractions_by_capacity, cluster_attractions_with_gmm, estimate_cluster_duration,
+    post_process_clusters_capacity
+)
+
+REGION_RADIUS_KM = 60      # Bộ điểm lấy trong bán kính này (generate_smart_tour chỉ dùng GMM khi các điểm gần nhau)
+
+
+def offline_matrix(points):
+    matrix = {}
+    for start in points:
+        for end in points:
+            if start != end:
+                dist, mins = _estimate_road_segment(start, end)
+                matrix[_route_cache_key(start, end)] = (dist, mins, "car")
+    return matrix
+
+
+def make_scenarios(attractions, count, min_points, max_points, rng):
+    scenarios = []
+    while len(scenarios) < count:
+        center = rng.choice(attractions)
+        nearby = [a for a in attractions if haversine_km(center.lat, center.lon, a.lat, a.lon) <= REGION_RADIUS_KM]
+        if len(nearby) < min_points:
+            continue
+        picked = rng.sample(nearby, rng.randint(min_points, min(max_points, len(nearby))))
+        start = (round(center.lat + rng.uniform(-0.05, 0.05), 5), round(center.lon + rng.uniform(-0.05, 0.05), 5))
+        scenarios.append((picked, start, rng.randint(1, 5)))
+    return scenarios
+
+
+def run_engine(name, scenarios):
+    latencies, days, totals, longest, overflow = [], [], [], [], 0
+    for picked, start, max_days in scenarios:
+        points = [start] + [(a.lat, a.lon) for a in picked]
+        cache = {}
+        matrix = offline_matrix(points)
+
+        began = time.perf_counter()
+        if name == 'gmm':
+            clusters, _ = cluster_attractions_with_gmm(picked, start, max_days, cache, MAX_DAY_DURATION_MINUTES, matrix=matrix)
+        else:
+            clusters, _ = cluster_attractions_by_capacity(picked, start, max_days, cache, MAX_DAY_DURATION_MINUTES, matrix=matrix)
+        clusters = post_process_clusters_capacity([list(c) for c in clusters], max_items_per_day=MAX_ITEMS_PER_DAY)
+        latencies.append((time.perf_counter() - began) * 1000)
+
+        durations = [estimate_cluster_duration(c, start, cache, matrix) for c in clusters if c]
+        days.append(len(durations))
+        totals.append(sum(durations))
+        longest.append(max(durations))
+        overflow += sum(1 for d in durations if d > MAX_DAY_DURATION_MINUTES)
+
+    latencies.sort()
+    return {
+        "engine": name,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "days_avg": statistics.mean(days),
+        "minutes_avg": statistics.mean(totals),
+        "longest_day_avg": statistics.mean(longest),
+        "overflow_days": overflow
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark chia ngày: GMM vs engine theo sức chứa")
+    parser.add_argument('--scenarios', type=int, default=100)
+    parser.add_argument('--min-points', type=int, default=3)
+    parser.add_argument('--max-points', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with app.app_context():
+        attractions = Attraction.query.all()
+        scenarios = make_scenarios(attractions, args.scenarios, args.min_points, args.max_points, random.Random(args.seed))
+        results = [run_engine(name, scenarios) for name in ('gmm', 'capacity')]
+
+    print(f"{len(scenarios)} bộ điểm, {args.min_points}-{args.max_points} điểm / bộ, seed={args.seed}")
+    print(f"{'engine':<10}{'p50 ms':>9}{'p95 ms':>9}{'ngày TB':>9}{'phút TB':>10}{'ngày dài nhất TB':>18}{'ngày quá giờ':>14}")
+    for r in results:
+        print(f"{r['engine']:<10}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['days_avg']:>9.2f}"
+              f"{r['minutes_avg']:>10.1f}{r['longest_day_avg']:>18.1f}{r['overflow_days']:>14}")
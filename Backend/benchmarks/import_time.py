@@ -0,0 +1,84 @@
+"""
+Đo thời gian import app (khởi động 1 worker) bằng `python -X importtime`.
+
+- In tổng thời gian (trung vị của --runs lần chạy) và các module tốn thời gian nhất.
+- Kiểm tra các thư viện nặng chỉ được nạp khi cần (LAZY_MODULES) không bị import lúc khởi động.
+- Ghi báo cáo ra benchmarks/importtime_report.txt (commit cùng code để so sánh giữa các lần thay đổi).
+
+Cách chạy (trong thư mục Backend):
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 5 --top 30 --check   # --check: exit 1 nếu module nặng bị import sớm
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORT_PATH = os.path.join(BACKEND_DIR, 'benchmarks', 'importtime_report.txt')
+
+# Chỉ được nạp khi dùng tới (tạo tour, chat AI...), không được có mặt lúc import app
+LAZY_MODULES = ('sklearn', 'folium', 'google.generativeai', 'numpy', 'geopy', 'scipy')
+
+
+def run_importtime():
+    """Chạy `import app` trong process mới, trả về list (module, self_us, cumulative_us, depth)."""
+    env = dict(os.environ, NEARBY_PRECOMPUTE_ON_STARTUP='0', ROUTE_CACHE_WARM_ON_STARTUP='0', PYTHONWARNINGS='ignore')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import app lỗi:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        head, cumulative_us, name = line.split('|')
+        self_us = int(head.split(':')[1])
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), self_us, int(cumulative_us), depth))
+    return rows
+
+
+def build_report(runs, top):
+    totals = []
+    last = None
+    for _ in range(runs):
+        last = run_importtime()
+        totals.append(next(cum for name, _, cum, _ in last if name == 'app'))
+
+    loaded = {name for name, _, _, _ in last}
+    eager = sorted(m for m in LAZY_MODULES if m in loaded)
+    top_level = sorted((r for r in last if r[3] <= 1 and r[0] != 'app'), key=lambda r: -r[2])[:top]
+
+    lines = [
+        f"import app: {statistics.median(totals) / 1000:.0f} ms (trung vị {runs} lần, "
+        f"min {min(totals) / 1000:.0f} ms, max {max(totals) / 1000:.0f} ms)",
+        f"Số module nạp: {len(last)}",
+        f"Module nặng bị import lúc khởi động: {', '.join(eager) if eager else 'không có'}",
+        "",
+        f"{'cumulative ms':>14}{'self ms':>10}  module (top {top})",
+    ]
+    for name, self_us, cumulative_us, _ in top_level:
+        lines.append(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {name}")
+    return '\n'.join(lines) + '\n', eager
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Đo thời gian import app bằng python -X importtime")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=25)
+    parser.add_argument('--check', action='store_true', help="Exit 1 nếu module trong LAZY_MODULES bị import lúc khởi động")
+    parser.add_argument('--no-write', action='store_true', help="Chỉ in, không ghi importtime_report.txt")
+    args = parser.parse_args()
+
+    report, eager = build_report(args.runs, args.top)
+    print(report)
+    if not args.no_write:
+        with open(REPORT_PATH, 'w', encoding='utf-8') as f:
+            f.write(report)
+    if args.check and eager:
+        sys.exit(1)
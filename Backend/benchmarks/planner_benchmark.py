@@ -0,0 +1,381 @@
+"""
+Benchmark bộ lập lịch trình trên dữ liệu giả lập (100 -> 100k điểm).
+
+- Sinh danh mục điểm đến giả quanh các thành phố Việt Nam (phân bố chuẩn quanh tâm thành phố),
+  gồm attraction / festival (có ngày diễn ra, âm lịch) / cultural spot (có giờ mở cửa), tags,
+  1 user có danh sách yêu thích. Mỗi kích thước dùng 1 DB SQLite tạm riêng.
+- Routing thay bằng hàm giả (ước lượng đường chim bay, không gọi GraphHopper), cache route
+  chỉ trong RAM và làm mới trước mỗi lần đo, tắt cache lịch trình + thời tiết -> kết quả lặp lại được với cùng --seed.
+- Đo generate_smart_tour (vài tour trong 1 thành phố + 1 tour xuyên Việt), smart_recommendation_service
+  (dựng index + các kiểu tìm kiếm) và precompute_nearby_attractions(full=True):
+  thời gian (p50 / p95), số câu SQL nhiều nhất của 1 lần gọi, bộ nhớ đỉnh (tracemalloc, chạy riêng 1 lần).
+- Mỗi lần chạy ghi thêm 1 dòng vào benchmarks/planner_history.jsonl (theo dõi theo thời gian),
+  --check so với benchmarks/planner_baseline.json theo ngưỡng bên dưới, vượt thì exit 1.
+
+Cách chạy (trong thư mục Backend):
+    python benchmarks/planner_benchmark.py                                  # 100, 1000, 10000 điểm
+    python benchmarks/planner_benchmark.py --sizes 100,1000,10000,100000 --nearby-max 10000   # rất lâu
+    python benchmarks/planner_benchmark.py --check                          # so với baseline
+    python benchmarks/planner_benchmark.py --save-baseline                  # ghi kết quả làm baseline mới
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# Phải đặt trước khi import service: cache route chỉ trong RAM, không cache lịch trình, không gọi API thời tiết
+os.environ['ROUTE_CACHE_PATH'] = ''
+os.environ['ITINERARY_CACHE_ENABLED'] = '0'
+os.environ['OPENWEATHERMAP_API_KEY'] = ''
+
+from flask import Flask
+from sqlalchemy import event, insert
+
+from models import db, User, Attraction, Festival, CulturalSpot, Tag, FavoriteAttraction, attraction_tags
+from service import route_cache as route_cache_module
+from service import routing
+from service.fts_index import ensure_fts_index
+from service.geo_index import get_coord_index
+from service.route_cache import RouteCache
+from service.search_index import get_search_index
+from service.search_service import precompute_nearby_attractions, smart_recommendation_service
+from service.tour_service import generate_smart_tour
+
+BASELINE_PATH = os.path.join(BACKEND_DIR, 'benchmarks', 'planner_baseline.json')
+HISTORY_PATH = os.path.join(BACKEND_DIR, 'benchmarks', 'planner_history.jsonl')
+
+# Ngưỡng hồi quy so với baseline (vượt cả tỉ lệ lẫn mức tuyệt đối mới tính, tránh nhiễu ở số nhỏ)
+LATENCY_TOLERANCE = 0.5         # p50 chậm hơn 50%
+LATENCY_MIN_DELTA_MS = 5
+MEMORY_TOLERANCE = 0.25         # Bộ nhớ đỉnh tăng 25%
+MEMORY_MIN_DELTA_KB = 256
+# Số câu SQL không phụ thuộc máy: tăng bất kỳ là hồi quy
+
+# (tên, lat, lon, trọng số): thành phố lớn nhiều điểm hơn
+CITIES = [
+    ("Hà Nội", 21.0285, 105.8542, 10), ("Thành phố Hồ Chí Minh", 10.7769, 106.7009, 10),
+    ("Đà Nẵng", 16.0544, 108.2022, 6), ("Huế", 16.4637, 107.5909, 5), ("Hội An", 15.8801, 108.3380, 4),
+    ("Nha Trang", 12.2388, 109.1967, 5), ("Đà Lạt", 11.9404, 108.4583, 5), ("Hải Phòng", 20.8449, 106.6881, 4),
+    ("Hạ Long", 20.9101, 107.1839, 4), ("Cần Thơ", 10.0452, 105.7469, 4), ("Sa Pa", 22.3364, 103.8438, 3),
+    ("Ninh Bình", 20.2506, 105.9745, 3), ("Quy Nhơn", 13.7820, 109.2197, 3), ("Vũng Tàu", 10.3460, 107.0843, 3),
+    ("Phú Quốc", 10.2899, 103.9840, 3), ("Buôn Ma Thuột", 12.6667, 108.0500, 2), ("Vinh", 18.6796, 105.6813, 2),
+    ("Hà Giang", 22.8233, 104.9836, 2), ("Sóc Trăng", 9.6025, 105.9739, 2), ("Bắc Ninh", 21.1861, 106.0763, 2),
+]
+CITY_SPREAD_DEGREES = 0.15      # Độ lệch chuẩn quanh tâm thành phố (~17km)
+TAG_NAMES = [
+    "Văn hóa", "Di sản", "Lịch sử", "Ẩm thực", "Tâm linh", "Phật giáo", "Hành hương", "Thiên nhiên",
+    "Núi rừng", "Biển", "Hang động", "Sinh thái", "Làng nghề", "Thủ công", "Truyền thống", "Nghệ thuật",
+    "Âm nhạc", "Giải trí", "Cà phê", "Bảo tàng", "Di sản UNESCO", "Lễ hội", "Sự kiện", "Pháo hoa",
+]
+OPENING_HOURS = ["08:00 AM - 05:00 PM", "07:00 - 17:30", "06:30 AM - 09:00 PM", "08:30 AM - 05:30 PM", None]
+SPOT_TYPES = ["Bảo tàng", "Di tích", "Làng nghề", "Đền/Chùa", "Văn hóa"]
+NAME_PREFIXES = {"attraction": ["Hồ", "Núi", "Bãi biển", "Công viên", "Thác"],
+                 "festival": ["Lễ hội", "Hội", "Festival"],
+                 "cultural_spot": ["Chùa", "Bảo tàng", "Đình", "Làng nghề", "Nhà cổ"]}
+YEAR = 2026
+TOURS_PER_SIZE = 6
+RECOMMEND_CASES = [
+    dict(types_list=[]),
+    dict(types_list=["Lễ hội"]),
+    dict(types_list=["Thiên nhiên", "Đền/Chùa"]),
+    dict(types_list=[], user_id=1),
+    dict(types_list=[], search_term="Đà Lạt"),
+    dict(types_list=["Thiên nhiên"], user_id=1, search_term="biển"),
+]
+
+
+# ----------------------------------------------------------------------
+# Routing giả
+# ----------------------------------------------------------------------
+def stub_road_segment(coord_start, coord_end, vehicle='car'):
+    dist, mins = routing._estimate_road_segment(coord_start, coord_end)
+    # Giả làm route thật (estimated = False) để cache route chạy như khi có GraphHopper
+    return dist, mins, [[coord_start[1], coord_start[0]], [coord_end[1], coord_end[0]]], False
+
+
+def stub_road_matrix(origins, destinations, vehicle='car'):
+    return [[routing._estimate_road_segment(o, d) for d in destinations] for o in origins]
+
+
+def install_stub_routing():
+    routing._get_road_segment = stub_road_segment
+    routing._get_road_matrix = stub_road_matrix
+
+
+def reset_caches():
+    """Mỗi lần đo bắt đầu với cache route trống và session sạch."""
+    route_cache_module._shared_route_cache = RouteCache(db_path=None)
+    db.session.remove()
+
+
+# ----------------------------------------------------------------------
+# Dữ liệu giả
+# ----------------------------------------------------------------------
+def seed_catalog(size, rng):
+    """Trả về {"cities": {tên: [id]}, "festivals": [(id, tên thành phố, ngày bắt đầu)]}."""
+    db.session.execute(insert(User), [{"user_id": 1, "username": "bench", "email": "bench@example.com", "password_hash": "x"}])
+    db.session.execute(insert(Tag), [{"id": i + 1, "tag_name": name} for i, name in enumerate(TAG_NAMES)])
+
+    weights = [c[3] for c in CITIES]
+    rows = {"attraction": [], "festival": [], "cultural_spot": []}
+    tag_rows = []
+    catalog = {"cities": {c[0]: [] for c in CITIES}, "festivals": []}
+    for attr_id in range(1, size + 1):
+        city, lat, lon, _ = rng.choices(CITIES, weights)[0]
+        kind = rng.choices(("attraction", "festival", "cultural_spot"), (5, 1, 4))[0]
+        row = {
+            "id": attr_id,
+            "name": f"{rng.choice(NAME_PREFIXES[kind])} {city} {attr_id}",
+            "location": f"Quận {attr_id % 12 + 1}, {city}",
+            "brief_description": f"Điểm đến giả lập số {attr_id} tại {city}",
+            "detail_description": {"mainTitle": "Giới thiệu", "sections": []},
+            "average_rating": round(rng.uniform(3, 5), 1),
+            "visit_duration": rng.choice((60, 90, 120, 180)),
+            "lat": round(rng.gauss(lat, CITY_SPREAD_DEGREES), 6),
+            "lon": round(rng.gauss(lon, CITY_SPREAD_DEGREES), 6),
+            "image_url": f"https://example.com/{attr_id}.jpg",
+        }
+        if kind == "festival":
+            start = datetime(YEAR, 1, 1, rng.choice((7, 8, 18))) + timedelta(days=rng.randrange(365))
+            row.update(time_start=start, time_end=start + timedelta(days=rng.randint(1, 5)),
+                       is_lunar=rng.random() < 0.4, original_start=start.strftime("%d/%m"), original_end=None)
+            catalog["festivals"].append((attr_id, city, start))
+        elif kind == "cultural_spot":
+            row.update(opening_hours=rng.choice(OPENING_HOURS), ticket_price=float(rng.randrange(0, 200, 10) * 1000),
+                       spot_type=rng.choice(SPOT_TYPES))
+        rows[kind].append(row)
+        catalog["cities"][city].append(attr_id)
+        for tag_id in rng.sample(range(1, len(TAG_NAMES) + 1), rng.randint(2, 4)):
+            tag_rows.append({"attraction_id": attr_id, "tag_id": tag_id})
+
+    for kind, model in (("attraction", Attraction), ("festival", Festival), ("cultural_spot", CulturalSpot)):
+        for i in range(0, len(rows[kind]), 10000):
+            if rows[kind][i:i + 10000]:
+                db.session.execute(insert(model), rows[kind][i:i + 10000])
+    for i in range(0, len(tag_rows), 50000):
+        db.session.execute(attraction_tags.insert(), tag_rows[i:i + 50000])
+    db.session.execute(insert(FavoriteAttraction), [
+        {"user_id": 1, "attraction_id": attr_id} for attr_id in rng.sample(range(1, size + 1), min(20, size))
+    ])
+    db.session.commit()
+
+    # Bulk insert không qua ORM event -> đánh dấu các index trong RAM cần dựng lại
+    ensure_fts_index()
+    get_search_index().mark_stale()
+    get_coord_index().mark_stale()
+    return catalog
+
+
+def make_tours(catalog, rng):
+    """TOURS_PER_SIZE tour trong 1 thành phố (tour chẵn ghép 1 lễ hội, đặt ngày theo lễ hội) + 1 tour xuyên Việt."""
+    tours = []
+    cities = [c for c, ids in catalog["cities"].items() if len(ids) >= 3]
+    for i in range(TOURS_PER_SIZE):
+        festivals = [f for f in catalog["festivals"] if f[1] in cities]
+        if i % 2 == 0 and festivals:
+            festival_id, city, start = rng.choice(festivals)
+            start = start - timedelta(days=1)
+            ids = [festival_id] + rng.sample([x for x in catalog["cities"][city] if x != festival_id],
+                                             min(rng.randint(2, 6), len(catalog["cities"][city]) - 1))
+        else:
+            city = rng.choice(cities)
+            start = datetime(YEAR, rng.randint(1, 12), rng.randint(1, 28), 8)
+            ids = rng.sample(catalog["cities"][city], min(rng.randint(3, 7), len(catalog["cities"][city])))
+        _, lat, lon, _ = next(c for c in CITIES if c[0] == city)
+        tours.append((ids, lat, lon, start, start + timedelta(days=rng.randint(1, 4), hours=10)))
+
+    far = [rng.choice(catalog["cities"][c]) for c in ("Hà Nội", "Đà Nẵng", "Đà Lạt", "Thành phố Hồ Chí Minh")
+           if catalog["cities"][c]]
+    start = datetime(YEAR, 3, 10, 8)
+    tours.append((far, 21.0285, 105.8542, start, start + timedelta(days=6, hours=10)))
+    return tours
+
+
+# ----------------------------------------------------------------------
+# Đo
+# ----------------------------------------------------------------------
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def measure(calls, repeat, counter):
+    """
+    calls: list hàm không tham số (mỗi hàm = 1 lần gọi service).
+    Trả về {p50Ms, p95Ms, queries (nhiều nhất / 1 lần gọi), peakKb (lớn nhất / 1 lần gọi), calls}.
+    """
+    timings, queries, peak_kb = [], 0, 0
+    with contextlib.redirect_stdout(io.StringIO()):     # precompute_nearby in tiến độ ra stdout
+        for _ in range(repeat):
+            for call in calls:
+                reset_caches()
+                counter.count = 0
+                started = time.perf_counter()
+                call()
+                timings.append((time.perf_counter() - started) * 1000)
+                queries = max(queries, counter.count)
+        # tracemalloc làm chậm code -> đo bộ nhớ ở lượt riêng
+        for call in calls:
+            reset_caches()
+            tracemalloc.start()
+            call()
+            peak_kb = max(peak_kb, tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+    return {
+        "p50Ms": round(statistics.median(timings), 2),
+        "p95Ms": round(percentile(timings, 0.95), 2),
+        "queries": queries,
+        "peakKb": round(peak_kb),
+        "calls": len(calls)
+    }
+
+
+def run_case(results, key, calls, repeat, counter):
+    started = time.perf_counter()
+    results[key] = measure(calls, repeat, counter)
+    print(f"  {key}: {time.perf_counter() - started:.1f}s", flush=True)
+
+
+def run_size(size, args):
+    rng = random.Random(args.seed + size)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            catalog = seed_catalog(size, rng)
+            print(f"[{size} điểm] seed {time.perf_counter() - started:.1f}s", flush=True)
+            counter = QueryCounter(db.engine)
+
+            tours = make_tours(catalog, rng)
+            run_case(results, f"tour@{size}", [
+                lambda t=t: generate_smart_tour(t[0], t[1], t[2], t[3].strftime("%d/%m/%Y %H:%M"), t[4].strftime("%d/%m/%Y %H:%M"))
+                for t in tours
+            ], args.repeat, counter)
+
+            run_case(results, f"search_index_build@{size}", [get_search_index().rebuild], args.repeat, counter)
+            get_search_index().rebuild()
+            run_case(results, f"recommend@{size}", [
+                lambda kwargs=kwargs: smart_recommendation_service(**kwargs) for kwargs in RECOMMEND_CASES
+            ], args.repeat, counter)
+
+            if size <= args.nearby_max:
+                run_case(results, f"nearby_precompute@{size}",
+                         [lambda: precompute_nearby_attractions(full=True)], args.nearby_repeat, counter)
+            db.session.remove()
+            db.engine.dispose()     # Đóng file SQLite trước khi xóa thư mục tạm
+    return results
+
+
+def compare(results, baseline):
+    """Trả về (list lỗi hồi quy, {key: trạng thái để in})."""
+    failures, status = [], {}
+    for key, current in results.items():
+        base = baseline.get(key)
+        if base is None:
+            status[key] = "mới"
+            continue
+        problems = []
+        if current["p50Ms"] > base["p50Ms"] * (1 + LATENCY_TOLERANCE) and current["p50Ms"] - base["p50Ms"] > LATENCY_MIN_DELTA_MS:
+            problems.append(f"p50 {base['p50Ms']} -> {current['p50Ms']} ms")
+        if current["queries"] > base["queries"]:
+            problems.append(f"queries {base['queries']} -> {current['queries']}")
+        if current["peakKb"] > base["peakKb"] * (1 + MEMORY_TOLERANCE) and current["peakKb"] - base["peakKb"] > MEMORY_MIN_DELTA_KB:
+            problems.append(f"peak {base['peakKb']} -> {current['peakKb']} KB")
+        status[key] = "FAIL" if problems else "ok"
+        failures.extend(f"{key}: {p}" for p in problems)
+    return failures, status
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generate_smart_tour / gợi ý / precompute nearby trên dữ liệu giả lập")
+    parser.add_argument('--sizes', default='100,1000,10000', help="Số điểm của từng bộ dữ liệu, cách nhau bởi dấu phẩy")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--nearby-max', type=int, default=1000,
+                        help="Chỉ chạy precompute nearby với bộ dữ liệu <= số điểm này (1000 điểm mất ~3 phút kể cả lượt đo bộ nhớ)")
+    parser.add_argument('--nearby-repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--check', action='store_true', help="Exit 1 nếu vượt ngưỡng so với planner_baseline.json")
+    parser.add_argument('--save-baseline', action='store_true', help="Ghi kết quả lần này vào planner_baseline.json")
+    parser.add_argument('--no-write', action='store_true', help="Không ghi planner_history.jsonl")
+    parser.add_argument('--verbose', action='store_true', help="Giữ log của service")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.CRITICAL)
+    install_stub_routing()
+
+    results = {}
+    for size in (int(s) for s in args.sizes.split(',') if s.strip()):
+        results.update(run_size(size, args))
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+    failures, status = compare(results, baseline)
+
+    print(f"\n{'':<28}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}{'peak KB':>10}{'base p50':>10}  so với baseline")
+    for key, r in results.items():
+        base = baseline.get(key, {}).get("p50Ms", "-")
+        print(f"{key:<28}{r['p50Ms']:>10}{r['p95Ms']:>10}{r['queries']:>9}{r['peakKb']:>10}{base:>10}  {status[key]}")
+
+    record = {
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": results
+    }
+    if not args.no_write:
+        with open(HISTORY_PATH, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f"\nĐã ghi baseline: {BASELINE_PATH}")
+
+    if failures:
+        print("\nHỒI QUY:\n  " + "\n  ".join(failures))
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
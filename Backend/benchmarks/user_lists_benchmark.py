@@ -0,0 +1,168 @@
+"""
+Kiểm tra hồi quy số query của get_user_favorites_service / get_user_reviews_service.
+
+Tạo DB SQLite tạm với dữ liệu giả (attraction / festival / cultural spot có tags, 1 user có
+--favorites điểm yêu thích và review), rồi so với cách cũ (Attraction.query.get + to_json từng dòng):
+- Số query phải như nhau dù user có 10 hay --favorites điểm (O(1)), không vượt MAX_QUERIES.
+- Kết quả phải giống hệt to_json của model.
+Sai thì exit 1.
+
+Cách chạy (trong thư mục Backend):
+    python benchmarks/user_lists_benchmark.py
+    python benchmarks/user_lists_benchmark.py --favorites 5000 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import event, insert
+
+from models import db, User, Attraction, Festival, CulturalSpot, Tag, Review, FavoriteAttraction, attraction_tags
+from service.user_service import get_user_favorites_service, get_user_reviews_service
+
+MAX_QUERIES = {"favorites": 2, "reviews": 1}
+TAG_COUNT = 40
+TAGS_PER_ATTRACTION = 3
+
+
+def legacy_favorites(user_id):
+    """Cách cũ: 1 query / điểm yêu thích + lazy load tags."""
+    attractions = []
+    for fav in FavoriteAttraction.query.filter_by(user_id=user_id).all():
+        attraction = db.session.get(Attraction, fav.attraction_id)
+        if attraction:
+            attractions.append(attraction.to_json())
+    return attractions
+
+
+def legacy_reviews(user_id, limit):
+    """Cách cũ: lazy load user + attraction từng review."""
+    reviews = Review.query.filter_by(user_id=user_id)\
+        .order_by(Review.created_at.desc(), Review.review_id.desc()).limit(limit).all()
+    reviews_data = []
+    for review in reviews:
+        review_data = review.to_json()
+        attraction = db.session.get(Attraction, review.attraction_id)
+        review_data['attraction'] = {
+            'id': attraction.id, 'name': attraction.name,
+            'location': attraction.location, 'imageUrl': attraction.image_url
+        }
+        reviews_data.append(review_data)
+    return reviews_data
+
+
+def seed(count):
+    """1 user chính (id 1) thích + review `count` điểm đầu, 1 user phụ (id 2) thích + review 10 điểm."""
+    models = (Attraction, Festival, CulturalSpot)
+    db.session.execute(insert(User), [
+        {"user_id": i, "username": f"user{i}", "email": f"user{i}@example.com", "password_hash": "x"} for i in (1, 2)
+    ])
+    db.session.execute(insert(Tag), [{"id": i, "tag_name": f"tag{i}"} for i in range(1, TAG_COUNT + 1)])
+    start = datetime(2025, 1, 1)
+    for index, model in enumerate(models):
+        rows = []
+        for i in range(index + 1, count + 1, len(models)):
+            row = {"id": i, "name": f"Điểm {i}", "location": f"Tỉnh {i % 63}", "brief_description": "Mô tả",
+                   "detail_description": {"text": f"Chi tiết {i}"}, "average_rating": round(i % 50 / 10, 1),
+                   "visit_duration": 60 + i % 120, "lat": 10 + i % 100 / 10, "lon": 105 + i % 30 / 10,
+                   "image_url": f"https://example.com/{i}.jpg"}
+            if model is Festival:
+                row.update(time_start=start + timedelta(days=i % 365), time_end=start + timedelta(days=i % 365 + 2),
+                           is_lunar=i % 2 == 0, original_start="15/8 âm lịch", original_end="17/8 âm lịch")
+            elif model is CulturalSpot:
+                row.update(opening_hours="8:00 - 17:00", ticket_price=float(i % 5 * 10000), spot_type="Bảo tàng")
+            rows.append(row)
+        db.session.execute(insert(model), rows)
+    db.session.execute(attraction_tags.insert(), [
+        {"attraction_id": i, "tag_id": (i + k * 7) % TAG_COUNT + 1}
+        for i in range(1, count + 1) for k in range(TAGS_PER_ATTRACTION)
+    ])
+    db.session.execute(insert(FavoriteAttraction), [{"user_id": 1, "attraction_id": i} for i in range(1, count + 1)]
+                       + [{"user_id": 2, "attraction_id": i} for i in range(1, 11)])
+    db.session.execute(insert(Review), [
+        {"user_id": 1, "attraction_id": i, "rating_score": i % 5 + 1, "content": f"Review {i}",
+         "created_at": start + timedelta(minutes=i)} for i in range(1, count + 1)
+    ] + [
+        {"user_id": 2, "attraction_id": i, "rating_score": 5, "content": f"Review {i}",
+         "created_at": start + timedelta(minutes=i)} for i in range(1, 11)
+    ])
+    db.session.commit()
+
+
+def normalized(items):
+    """Thứ tự tags trong to_json không xác định (theo thứ tự lazy load) -> so sánh không tính thứ tự."""
+    return [{**item, "tags": sorted(item["tags"])} if "tags" in item else item for item in items]
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def measure(self, func, *args, repeat=1):
+        """Trả về (kết quả, số query của 1 lần gọi, list thời gian ms)."""
+        timings = []
+        for _ in range(repeat):
+            db.session.expunge_all()    # Không dùng object đã nạp ở lần trước
+            self.count = 0
+            started = time.perf_counter()
+            result = func(*args)
+            timings.append((time.perf_counter() - started) * 1000)
+        return result, self.count, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra số query của danh sách yêu thích / review của user")
+    parser.add_argument('--favorites', type=int, default=1000, help="Số điểm yêu thích / review của user chính")
+    parser.add_argument('--page-size', type=int, default=100, help="Số review mỗi trang")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            seed(args.favorites)
+            counter = QueryCounter(db.engine)
+            failures = []
+
+            cases = [
+                ("favorites", get_user_favorites_service, legacy_favorites, ()),
+                ("reviews", lambda uid, limit: get_user_reviews_service(uid, limit)[0], legacy_reviews, (args.page_size,)),
+            ]
+            print(f"{'':<10}{'user':>10}{'queries':>9}{'cũ':>7}{'p50 ms':>9}{'cũ ms':>9}")
+            for name, func, legacy, extra in cases:
+                counts = {}
+                for user_id, label in ((2, "10"), (1, str(args.favorites))):
+                    result, queries, timings = counter.measure(func, user_id, *extra, repeat=args.repeat)
+                    expected, legacy_queries, legacy_timings = counter.measure(legacy, user_id, *extra, repeat=args.repeat)
+                    counts[user_id] = queries
+                    print(f"{name:<10}{label:>10}{queries:>9}{legacy_queries:>7}"
+                          f"{statistics.median(timings):>9.1f}{statistics.median(legacy_timings):>9.1f}")
+                    if normalized(result) != normalized(expected):
+                        failures.append(f"{name} (user {label}): kết quả khác to_json của model")
+                if counts[1] != counts[2]:
+                    failures.append(f"{name}: số query tăng theo số dòng ({counts[2]} -> {counts[1]})")
+                if counts[1] > MAX_QUERIES[name]:
+                    failures.append(f"{name}: {counts[1]} query > {MAX_QUERIES[name]}")
+
+    if failures:
+        print("\nFAIL:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\nOK: số query không đổi theo số dòng, kết quả giống to_json")
+
+
+if __name__ == '__main__':
+    main()
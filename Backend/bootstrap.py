@@ -0,0 +1,36 @@
+"""
+Dựng DB trước khi chạy app: tạo bảng, thêm cột mới, nạp demo data (theo lô, chạy lại không bị trùng),
+tính sẵn ma trận khoảng cách + điểm lân cận, rồi ghi schema_marker.
+App (mọi worker gunicorn) lúc khởi động chỉ kiểm tra schema_marker, không tự làm các bước này.
+
+Cách chạy (trong thư mục Backend), sau khi clone / pull code có đổi model:
+    python bootstrap.py                    # đầy đủ
+    python bootstrap.py --no-seed          # chỉ tạo / nâng cấp bảng, không nạp demo_data.json
+    python bootstrap.py --skip-precompute  # không tính ma trận khoảng cách / nearby (không cần mạng)
+"""
+import argparse
+import os
+
+# Chỉ cấu hình app, chưa kiểm tra schema (DB có thể chưa có bảng nào)
+os.environ['APP_BOOTSTRAP_MODE'] = '1'
+os.environ.setdefault('NEARBY_PRECOMPUTE_ON_STARTUP', '0')
+
+from app import app
+from init_db import DEMO_DATA_PATH
+from service.bootstrap_service import bootstrap_database
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tạo bảng, nạp demo data và tính sẵn dữ liệu cho app")
+    parser.add_argument('--no-seed', action='store_true', help="Không nạp demo_data.json / blog mẫu")
+    parser.add_argument('--data', default=DEMO_DATA_PATH, help="Đường dẫn file demo data")
+    parser.add_argument('--skip-precompute', action='store_true', help="Không tính ma trận khoảng cách / nearby")
+    args = parser.parse_args()
+
+    with app.app_context():
+        summary = bootstrap_database(
+            seed=not args.no_seed,
+            json_path=args.data,
+            travel_matrix=not args.skip_precompute,
+            nearby=not args.skip_precompute
+        )
+    print(f"Bootstrap xong: {summary}")
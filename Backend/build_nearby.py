@@ -0,0 +1,27 @@
+"""
+Job tính danh sách điểm lân cận (bảng attraction_neighbor).
+
+Cách chạy (trong thư mục Backend):
+    python build_nearby.py                 # chỉ tính các điểm mới / bị đổi tọa độ
+    python build_nearby.py --full          # tính lại toàn bộ
+    python build_nearby.py --radius 10     # đổi bán kính (km) -> mọi điểm sẽ được tính lại
+Bị dừng giữa chừng thì chạy lại lệnh, job tiếp tục từ các điểm chưa tính.
+"""
+import argparse
+import os
+
+# Job tự chạy đồng bộ, không cần thread nền lúc import app
+os.environ.setdefault('NEARBY_PRECOMPUTE_ON_STARTUP', '0')
+
+from app import app
+from service.search_service import precompute_nearby_attractions, NEARBY_RADIUS_KM, NEARBY_BATCH_SIZE
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tính danh sách điểm lân cận cho các điểm đến")
+    parser.add_argument('--full', action='store_true', help="Tính lại toàn bộ thay vì chỉ các điểm thay đổi")
+    parser.add_argument('--radius', type=float, default=NEARBY_RADIUS_KM, help="Bán kính đường bộ (km)")
+    parser.add_argument('--batch-size', type=int, default=NEARBY_BATCH_SIZE, help="Số điểm commit mỗi lô")
+    args = parser.parse_args()
+
+    with app.app_context():
+        precompute_nearby_attractions(radius=args.radius, full=args.full, batch_size=args.batch_size)
@@ -0,0 +1,20 @@
+"""
+Job offline tính sẵn ma trận khoảng cách giữa các điểm đến (bảng attraction_travel).
+
+Cách chạy (trong thư mục Backend):
+    python build_travel_matrix.py          # chỉ tính các điểm mới / bị đổi tọa độ
+    python build_travel_matrix.py --full   # tính lại toàn bộ
+"""
+import argparse
+
+from app import app
+from service.travel_matrix_service import refresh_travel_matrix
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tính sẵn ma trận khoảng cách giữa các điểm đến")
+    parser.add_argument('--full', action='store_true', help="Tính lại toàn bộ thay vì chỉ các điểm thay đổi")
+    parser.add_argument('--batch-size', type=int, default=500, help="Số cặp commit mỗi lô")
+    args = parser.parse_args()
+
+    with app.app_context():
+        refresh_travel_matrix(full=args.full, batch_size=args.batch_size)
@@ -1,9 +1,14 @@
 import json
+import os
 from datetime import datetime
 from lunardate import LunarDate
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
 
-from models import db, User, Festival, CulturalSpot, Attraction, Tag, Review, TourPackage
-from service.attraction_service import update_attraction_rating_service
+from models import db, User, Festival, CulturalSpot, Attraction, Tag, Review, TourPackage, Blog, attraction_tags, package_attractions
+from service.attraction_service import repair_review_stats
+
+DEMO_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'demo_data.json')
 
 def parse_datetime(date_str):
     """
@@ -64,239 +69,259 @@ def parse_datetime(date_str):
         print(f"Warning: Lỗi xử lý ngày '{date_str}': {e}")
         return None
     
-def find_attraction_id_by_name(name):
-    """Tìm ID của Attraction dựa trên tên (trả về số)"""
-    attr = Attraction.query.filter_by(name=name).first()
-    return attr.id if attr else None
+def _bulk_insert(model, rows):
+    """Insert nhiều dòng trong 1 lệnh (ORM bulk insert, không tạo object / flush từng dòng)."""
+    if rows:
+        db.session.execute(insert(model), rows)
+    return len(rows)
+
+
+def _attraction_ids_by_name(names=None):
+    query = db.session.query(Attraction.name, Attraction.id)
+    if names is not None:
+        query = query.filter(Attraction.name.in_(names))
+    return {name: attraction_id for name, attraction_id in query}
 
-def import_demo_data(json_path="demo_data.json"):
+
+def import_demo_data(json_path=DEMO_DATA_PATH):
     """
-    Nạp dữ liệu từ file JSON vào cơ sở dữ liệu
-    sử dụng cấu trúc model Kế thừa (Inheritance) mới.
+    Nạp dữ liệu từ file JSON vào cơ sở dữ liệu (sử dụng cấu trúc model Kế thừa).
+
+    Chạy lại nhiều lần không bị trùng: user (theo email), điểm đến / gói tour (theo tên),
+    review (theo user + điểm + nội dung) đã có thì bỏ qua.
+    Mỗi loại dữ liệu: 1 query lấy khóa đã có + 1 lệnh insert theo lô.
+    Gọi từ bootstrap.py; lỗi thì rollback rồi raise lại. Trả về số dòng đã thêm theo loại.
     """
     with open(json_path, "r", encoding="utf-8") as f:
         data = json.load(f)
 
-    # Dùng cache (bộ đệm) để lưu các tag đã xử lý
-    # giúp tăng tốc độ và tránh tạo tag trùng lặp
-    tag_cache = {}
-
-    def get_or_create_tag(tag_name):
-        """
-        Kiểm tra xem tag đã có trong cache/DB chưa.
-        Nếu chưa, tạo mới và thêm vào session.
-        """
-        if tag_name in tag_cache:
-            return tag_cache[tag_name]
-        
-        tag = Tag.query.filter_by(tag_name=tag_name).first()
-        if not tag:
-            tag = Tag(tag_name=tag_name)
-            db.session.add(tag)
-            # Dùng flush để tag này có thể được tìm thấy
-            # ngay trong các vòng lặp tiếp theo
-            db.session.flush()
-        
-        tag_cache[tag_name] = tag
-        return tag
-
+    added = {}
     try:
-        # --- 1. Nạp Users ---
+        # --- 1. Nạp Users (bỏ qua email / username đã tồn tại) ---
+        existing = {row for pair in db.session.query(User.email, User.username) for row in pair}
+        user_rows = []
         for u in data["users"]:
-            # Bỏ qua nếu email đã tồn tại
-            if User.query.filter_by(email=u["email"]).count() > 0:
+            if u["email"] in existing or u["name"] in existing:
                 continue
-                
-            new_user = User(
-                username=u["name"], # Dùng "name" làm "username"
-                email=u["email"],
-                avatar_url=u.get("avatarUrl"),
-                is_admin=u.get("isAdmin", False),
-                email_verified=u.get("isVerify", True)
-            )
-            # Dùng hàm set_password để băm mật khẩu
-            new_user.set_password(u["password"])
-            db.session.add(new_user)
+            existing.update((u["email"], u["name"]))
+            user_rows.append({
+                "username": u["name"],  # Dùng "name" làm "username"
+                "email": u["email"],
+                "password_hash": generate_password_hash(u["password"]),
+                "avatar_url": u.get("avatarUrl"),
+                "is_admin": u.get("isAdmin", False),
+                "email_verified": u.get("isVerify", True)
+            })
+        added["users"] = _bulk_insert(User, user_rows)
 
-        # --- 2. Nạp Festivals (từ "festivals" trong JSON) ---
-        for fes in data["festivals"]:
-            # Bỏ qua nếu tên đã tồn tại
-            if Attraction.query.filter_by(name=fes["name"]).count() > 0:
-                continue
+        # --- 2. Nạp Festivals, CulturalSpots, Attraction (bỏ qua tên đã tồn tại) ---
+        existing_names = set(_attraction_ids_by_name())
+        tag_names_by_attraction = {}
+
+        def collect(items, build_row):
+            rows = []
+            for item in items:
+                if item["name"] in existing_names:
+                    continue
+                existing_names.add(item["name"])
+                tag_names_by_attraction[item["name"]] = item.get("tags", [])
+                rows.append(build_row(item))
+            return rows
 
+        def festival_row(fes):
             start_str = fes.get("datetimeStart")
             end_str = fes.get("datetimeEnd")
-            
-            new_festival = Festival(
-                name=fes["name"],
-                location=fes.get("location"),
-                time_start=parse_datetime(start_str),  # Ngày đã chuyển đổi
-                time_end=parse_datetime(end_str),      # Ngày đã chuyển đổi
-                is_lunar="âm lịch" in (start_str or ""),  # Đánh dấu âm lịch
-                original_start=start_str,              # Lưu chuỗi gốc
-                original_end=end_str,                  # Lưu chuỗi gốc
-                brief_description=fes.get("briefDescription"),
-                detail_description=fes.get("detailDescription"),
-                lat=fes.get("lat"),
-                lon=fes.get("lon"),
-                visit_duration=fes.get("visitDuration"),
-                image_url=fes.get("imageUrl"),
-                ideal_time=fes.get("idealTime", 1)
-            )
-            db.session.add(new_festival)
+            return {
+                "name": fes["name"],
+                "location": fes.get("location"),
+                "time_start": parse_datetime(start_str),  # Ngày đã chuyển đổi
+                "time_end": parse_datetime(end_str),      # Ngày đã chuyển đổi
+                "is_lunar": "âm lịch" in (start_str or ""),  # Đánh dấu âm lịch
+                "original_start": start_str,              # Lưu chuỗi gốc
+                "original_end": end_str,                  # Lưu chuỗi gốc
+                "brief_description": fes.get("briefDescription"),
+                "detail_description": fes.get("detailDescription"),
+                "lat": fes.get("lat"),
+                "lon": fes.get("lon"),
+                "visit_duration": fes.get("visitDuration"),
+                "image_url": fes.get("imageUrl"),
+                "ideal_time": fes.get("idealTime", 1)
+            }
 
-            # Gán tag cho festival
-            for tag_name in fes.get("tags", []):
-                tag = get_or_create_tag(tag_name)
-                # Dùng .append() để xử lý quan hệ Nhiều-Nhiều
-                if tag:
-                    new_festival.tags.append(tag)
+        def cultural_spot_row(cul):
+            return {
+                "name": cul["name"],
+                "location": cul.get("location"),
+                "lat": cul.get("lat"),
+                "lon": cul.get("lon"),
+                "brief_description": cul.get("briefDescription"),
+                "detail_description": cul.get("detailDescription"),
+                "spot_type": cul.get("spotType"),
+                "ticket_price": cul.get("ticketPrice"),
+                "opening_hours": cul["openHours"],
+                "visit_duration": cul.get("visitDuration"),
+                "image_url": cul.get("imageUrl"),
+                "ideal_time": cul.get("idealTime", 1)
+            }
 
-        # --- 3. Nạp CulturalSpots (từ "culturalSpots" trong JSON) ---
-        for cul in data["culturalSpots"]:
-            # Bỏ qua nếu tên đã tồn tại
-            if Attraction.query.filter_by(name=cul["name"]).count() > 0:
-                continue
+        def attraction_row(a):
+            return {
+                "name": a["name"],
+                "location": a.get("location"),
+                "brief_description": a.get("briefDescription"),
+                "detail_description": a.get("detailDescription"),
+                "lat": a.get("lat"),
+                "lon": a.get("lon"),
+                "visit_duration": a.get("visitDuration"),
+                "image_url": a.get("imageUrl"),
+                "ideal_time": a.get("idealTime", 1)
+            }
 
-            new_spot = CulturalSpot(
-                name=cul["name"],
-                location=cul.get("location"),
-                lat=cul.get("lat"),
-                lon=cul.get("lon"),
-                brief_description=cul.get("briefDescription"),
-                detail_description=cul.get("detailDescription"),
-                spot_type=cul.get("spotType"),
-                ticket_price=cul.get("ticketPrice"),
-                opening_hours=cul["openHours"],
-                visit_duration=cul.get("visitDuration"),
-                image_url=cul.get("imageUrl"),
-                ideal_time=cul.get("idealTime", 1)
-            )
-            db.session.add(new_spot)
+        added["festivals"] = _bulk_insert(Festival, collect(data["festivals"], festival_row))
+        added["culturalSpots"] = _bulk_insert(CulturalSpot, collect(data["culturalSpots"], cultural_spot_row))
+        added["attractions"] = _bulk_insert(Attraction, collect(data["attraction"], attraction_row))
 
-            # Gán tag cho cultural spot
-            for tag_name in cul.get("tags", []):
-                tag = get_or_create_tag(tag_name)
-                if tag:
-                    new_spot.tags.append(tag)
+        # --- 3. Tags + bảng liên kết Nhiều-Nhiều cho các điểm vừa thêm ---
+        tag_ids = {name: tag_id for name, tag_id in db.session.query(Tag.tag_name, Tag.id)}
+        new_tags = sorted({name for names in tag_names_by_attraction.values() for name in names} - set(tag_ids))
+        added["tags"] = _bulk_insert(Tag, [{"tag_name": name} for name in new_tags])
+        if new_tags:
+            tag_ids = {name: tag_id for name, tag_id in db.session.query(Tag.tag_name, Tag.id)}
 
-        # --- 4. Nạp Attraction (từ "attraction" trong JSON) ---
-        for a in data["attraction"]:
-            # Bỏ qua nếu tên đã tồn tại
-            if Attraction.query.filter_by(name=a["name"]).count() > 0:
-                continue
-
-            new_attr = Attraction(
-                name=a["name"],
-                location=a.get("location"),
-                brief_description=a.get("briefDescription"),
-                detail_description=a.get("detailDescription"),
-                lat=a.get("lat"),
-                lon=a.get("lon"),
-                visit_duration=a.get("visitDuration"),
-                image_url=a.get("imageUrl"),
-                ideal_time=a.get("idealTime", 1)
-            )
-            db.session.add(new_attr)
-
-            # Gán tag cho cultural spot
-            for tag_name in a.get("tags", []):
-                tag = get_or_create_tag(tag_name)
-                if tag:
-                    new_attr.tags.append(tag)
-
-        # Commit tại đây để đảm bảo tất cả Attractions đã có ID
-        db.session.commit()
-        print("Đã thêm toàn bộ Attractions và Users vào session.")
+        new_attraction_ids = _attraction_ids_by_name(list(tag_names_by_attraction))
+        link_rows = {
+            (tag_ids[tag_name], new_attraction_ids[name])
+            for name, tag_names in tag_names_by_attraction.items()
+            for tag_name in tag_names
+        }
+        if link_rows:
+            db.session.execute(attraction_tags.insert(), [
+                {"tag_id": tag_id, "attraction_id": attraction_id} for tag_id, attraction_id in sorted(link_rows)
+            ])
 
-        # --- 5. Nạp Reviews ---
-        # (Chúng ta nạp review SAU KHI đã nạp User và Attraction)
+        # --- 4. Nạp Reviews (SAU KHI đã có User và Attraction) ---
+        user_ids = {email: user_id for email, user_id in db.session.query(User.email, User.user_id)}
+        attraction_ids = _attraction_ids_by_name()
+        existing_reviews = set(db.session.query(Review.user_id, Review.attraction_id, Review.content))
+        review_rows = []
         for r_data in data.get("reviews", []):
-            # 1. Tìm user bằng email
-            user = User.query.filter_by(email=r_data.get("userEmail")).first()
-            
-            # 2. Tìm attraction bằng name
-            attraction = Attraction.query.filter_by(name=r_data.get("attractionName")).first()
-
-            # 3. Chỉ tạo review nếu tìm thấy cả user và attraction
-            if user and attraction:
-                # Kiểm tra xem review này đã tồn tại chưa
-                existing_review = Review.query.filter_by(
-                    user_id=user.user_id,
-                    attraction_id=attraction.id,
-                    content=r_data.get("content") # Thêm kiểm tra content để tránh trùng
-                ).first()
-
-                if not existing_review:
-                    new_review = Review(
-                        content=r_data.get("content"),
-                        rating_score=r_data.get("rating"),
-                        user_id=user.user_id,
-                        attraction_id=attraction.id
-                        # created_at sẽ tự động được gán giá trị default
-                    )
-                    db.session.add(new_review)
-            else:
-                if not user:
-                    print(f"Warning: (Review) Không tìm thấy user với email '{r_data.get('userEmail')}'")
-                if not attraction:
-                    print(f"Warning: (Review) Không tìm thấy attraction với tên '{r_data.get('attractionName')}'")
-
-        db.session.flush()
+            user_id = user_ids.get(r_data.get("userEmail"))
+            attraction_id = attraction_ids.get(r_data.get("attractionName"))
+            # Chỉ tạo review nếu tìm thấy cả user và attraction
+            if not user_id:
+                print(f"Warning: (Review) Không tìm thấy user với email '{r_data.get('userEmail')}'")
+                continue
+            if not attraction_id:
+                print(f"Warning: (Review) Không tìm thấy attraction với tên '{r_data.get('attractionName')}'")
+                continue
+            # Thêm kiểm tra content để tránh trùng
+            key = (user_id, attraction_id, r_data.get("content"))
+            if key in existing_reviews:
+                continue
+            existing_reviews.add(key)
+            review_rows.append({
+                "content": r_data.get("content"),
+                "rating_score": r_data.get("rating"),
+                "user_id": user_id,
+                "attraction_id": attraction_id
+                # created_at sẽ tự động được gán giá trị default
+            })
+        added["reviews"] = _bulk_insert(Review, review_rows)
 
-        all_attractions = Attraction.query.all()
-        for att in all_attractions:
-            # Gọi hàm service mới, nhưng KHÔNG commit
-            update_attraction_rating_service(att.id, commit_now=False)
-        
-        # --- 6. Nạp Tour Packages ---
+        # --- 5. Nạp Tour Packages (bỏ qua tên đã tồn tại) ---
+        existing_packages = {name for (name,) in db.session.query(TourPackage.name)}
+        package_rows = []
+        package_members = {}
         for pkg_data in data.get("themeTours", []):
-            # Lấy list of IDs, sử dụng hàm tra cứu nếu ID là string
-            attraction_ids = []
+            if pkg_data.get("name") in existing_packages:
+                continue
+            # attractionIds: string là TÊN điểm đến, số thì dùng trực tiếp
+            member_ids = []
             for attr_identifier in pkg_data.get("attractionIds", []):
-                # Nếu là string thì nó là TÊN
                 if isinstance(attr_identifier, str):
-                    attr_id = find_attraction_id_by_name(attr_identifier)
-                    if attr_id:
-                        attraction_ids.append(attr_id)
-                # Nếu là số dùng trực tiếp
+                    attr_id = attraction_ids.get(attr_identifier)
                 elif isinstance(attr_identifier, int):
-                    attraction_ids.append(attr_identifier)
-            
-            if not attraction_ids:
+                    attr_id = attr_identifier
+                else:
+                    attr_id = None
+                if attr_id and attr_id not in member_ids:
+                    member_ids.append(attr_id)
+
+            if not member_ids:
                 print(f"Warning: Gói tour '{pkg_data.get('name')}' không có địa điểm hợp lệ.")
                 continue
 
-            # Lấy các đối tượng Attraction
-            attractions_in_package = Attraction.query.filter(Attraction.id.in_(attraction_ids)).all()
+            existing_packages.add(pkg_data.get("name"))
+            package_members[pkg_data.get("name")] = member_ids
             brief_desc = pkg_data.get("briefDescription") or pkg_data.get("description")
-            new_package = TourPackage(             
-                name = pkg_data.get("name"),
-                location = pkg_data.get("location"),
-                brief_description = brief_desc,
-                
-                theme_description = brief_desc,
-                detail_description = pkg_data.get("detailDescription"),
-                cover_image_url = pkg_data.get("cover_image_url"),
-                
-                estimated_duration_days = pkg_data.get("estimated_duration_days", 1),
-                
-                attractions = attractions_in_package
-            )
-            db.session.add(new_package)
+            package_rows.append({
+                "name": pkg_data.get("name"),
+                "location": pkg_data.get("location"),
+                "brief_description": brief_desc,
+                "theme_description": brief_desc,
+                "detail_description": pkg_data.get("detailDescription"),
+                "cover_image_url": pkg_data.get("cover_image_url"),
+                "estimated_duration_days": pkg_data.get("estimated_duration_days", 1)
+            })
+        added["tourPackages"] = _bulk_insert(TourPackage, package_rows)
 
-        # --- 7. Commit & Cập nhật Ratings ---
-        db.session.flush()
+        if package_members:
+            package_ids = dict(db.session.query(TourPackage.name, TourPackage.id)
+                               .filter(TourPackage.name.in_(list(package_members))))
+            db.session.execute(package_attractions.insert(), [
+                {"package_id": package_ids[name], "attraction_id": attraction_id}
+                for name, member_ids in package_members.items()
+                for attraction_id in member_ids
+            ])
 
-        all_attractions = Attraction.query.all()
-        for att in all_attractions:
-            update_attraction_rating_service(att.id, commit_now=False)
-        
         db.session.commit()
-        print("Import demo data (mới) hoàn tất!")
+
+        # --- 6. Cập nhật Ratings (1 câu GROUP BY trên bảng review) ---
+        repair_review_stats()
+        print(f"Import demo data hoàn tất: {added}")
+        return added
 
     except Exception as e:
         # Nếu có lỗi, rollback lại toàn bộ
         db.session.rollback()
         print(f"Lỗi khi import demo data: {e}")
-        raise e
\ No newline at end of file
+        raise
+
+
+def seed_blog_data():
+    """Tạo 2 bài blog mẫu nếu database chưa có blog nào"""
+    if Blog.query.count() > 0:
+        return 0
+
+    default_blogs = [
+        {
+            "title": "Khám phá Hội An – Phố cổ giữa lòng thời gian",
+            "content": (
+                "Hội An là một trong những điểm đến văn hóa nổi bật nhất Việt Nam, "
+                "mang vẻ đẹp vừa cổ kính vừa nên thơ. Dạo bước dưới những ánh đèn lồng "
+                "lung linh, thưởng thức cao lầu hay ngồi thuyền trên sông Hoài là trải nghiệm "
+                "không thể bỏ qua."
+            ),
+            "image_urls": json.dumps([
+                "/static/hoian.png",
+                "/static/hoian.png"
+            ]),
+            "user_id": 1  # Gán cho admin/user mẫu
+        },
+        {
+            "title": "Sapa – Thiên đường săn mây giữa đại ngàn",
+            "content": (
+                "Sapa nổi tiếng với khí hậu mát lạnh quanh năm, ruộng bậc thang hùng vĩ "
+                "và những đám mây bồng bềnh vào sáng sớm. Núi Hàm Rồng, Fansipan hay bản Cát Cát "
+                "là những địa điểm không thể bỏ lỡ."
+            ),
+            "image_urls": json.dumps([
+                "/static/sapa.png",
+                "/static/sapa.png"
+            ]),
+            "user_id": 1
+        }
+    ]
+    added = _bulk_insert(Blog, default_blogs)
+    db.session.commit()
+    return added
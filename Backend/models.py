@@ -47,13 +47,15 @@ class TourPackage(db.Model):
     # Số ngày gợi ý cho gói tour
     estimated_duration_days = db.Column(db.Integer, default=1) 
 
-    def to_json(self):
-        # Lấy danh sách các địa điểm trong gói
-        attraction_list = [attr.to_json_brief() for attr in self.attractions.all()]
-        attraction_ids = [attr.id for attr in self.attractions.all()]
+    def to_json(self, attractions=None):
+        # Lấy danh sách các địa điểm trong gói (1 query, hoặc danh sách đã nạp sẵn)
+        if attractions is None:
+            attractions = self.attractions.order_by(Attraction.id).all()
+        attraction_list = [attr.to_json_brief() for attr in attractions]
+        attraction_ids = [attr.id for attr in attractions]
         
         # Tính toán Rating trung bình
-        total_rating = sum(attr.average_rating for attr in self.attractions.all() if attr.average_rating is not None)
+        total_rating = sum(attr.average_rating for attr in attractions if attr.average_rating is not None)
         avg_rating = total_rating / len(attraction_list) if attraction_list else 0.0
 
         return {
@@ -72,11 +74,16 @@ class TourPackage(db.Model):
             "isPackage": True
         }
 
-    def to_json_brief(self):
-        attractions = self.attractions.all()
-        total_rating = sum(attr.average_rating for attr in attractions if attr.average_rating)
-        count = len(attractions)
-        avg_rating = total_rating / count if count > 0 else 0.0
+    def to_json_brief(self, summary=None):
+        # summary: TourPackageSummary tính sẵn -> không cần query các địa điểm
+        if summary is not None:
+            attraction_ids = summary.attraction_ids or []
+            avg_rating = summary.average_rating or 0.0
+        else:
+            attractions = self.attractions.order_by(Attraction.id).all()
+            attraction_ids = [attr.id for attr in attractions]
+            total_rating = sum(attr.average_rating for attr in attractions if attr.average_rating)
+            avg_rating = total_rating / len(attractions) if attractions else 0.0
 
         return {
             "id": self.id,
@@ -84,13 +91,25 @@ class TourPackage(db.Model):
             "briefDescription": self.brief_description, 
             "coverImageUrl": self.cover_image_url,
             "location": self.location, 
-            "attractionIds": [attr.id for attr in attractions],
-            "attractionCount": count,
+            "attractionIds": attraction_ids,
+            "attractionCount": len(attraction_ids),
             "estimatedDurationDays": self.estimated_duration_days,
             "averageRating": round(avg_rating, 1), 
             "isPackage": True
         }
 
+
+class TourPackageSummary(db.Model):
+    """
+    Tóm tắt gói tour tính sẵn cho trang danh sách (slider): danh sách điểm, rating trung bình.
+    Được làm mới khi đổi thành viên gói hoặc rating của điểm (xem tour_package_service).
+    """
+    __tablename__ = 'tour_package_summary'
+    package_id = db.Column(db.Integer, db.ForeignKey('tour_package.id'), primary_key=True)
+    attraction_ids = db.Column(db.JSON, default=list)
+    average_rating = db.Column(db.Float, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 # ======================================================================
 # ===                                                                ===
 # ===                    Thong tin nguoi dung                        ===
@@ -168,11 +187,14 @@ class Attraction(db.Model):
     brief_description = db.Column(db.String(200))
     detail_description = db.Column(db.JSON)
     average_rating = db.Column(db.Float, default=0.0)
+    # Tổng hợp review, cập nhật O(1) khi thêm / sửa / xóa review (xem attraction_service)
+    review_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    rating_sum = db.Column(db.Float, default=0.0, nullable=False, server_default='0')
     visit_duration = db.Column(db.Integer)
     lat = db.Column(db.Float)
     lon = db.Column(db.Float)
     image_url = db.Column(db.String(500))
-    nearby_attractions = db.Column(db.JSON, default=list)
+    nearby_attractions = db.Column(db.JSON, default=list)    # Cũ, không còn cập nhật: dùng bảng attraction_neighbor
     ideal_time = db.Column(db.Integer, default=1)
 
     type = db.Column(db.String(50))
@@ -305,6 +327,9 @@ class Review(db.Model):
     __table_args__ = (
         db.Index('idx_review_user_attraction', 'user_id', 'attraction_id'),
         db.Index('idx_review_created_at', 'created_at'),
+        # Phân trang keyset: review của 1 điểm / của 1 user, mới nhất trước
+        db.Index('idx_review_attraction_created', 'attraction_id', 'created_at', 'review_id'),
+        db.Index('idx_review_user_created', 'user_id', 'created_at', 'review_id'),
     )
 
     def to_json(self):
@@ -332,9 +357,48 @@ class SavedTour(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), nullable=False)
     user = db.relationship('User', back_populates='saved_tours')
 
+    # Lịch trình đã tạo (job /api/tour-jobs), mở lại tour không cần tính lại
+    tour_job_id = db.Column(db.String(32), db.ForeignKey('tour_job.job_id'), nullable=True)
+
     # Mối quan hệ M2M
     attractions = db.relationship('Attraction', secondary=tour_attractions, back_populates='tours', lazy='dynamic')
 
+    __table_args__ = (
+        db.Index('idx_saved_tour_user_created', 'user_id', 'created_at', 'tour_id'),
+    )
+
+
+class TourJob(db.Model):
+    """
+    Job tạo lịch trình chạy nền (xem service/tour_job_service.py).
+    input_hash: hash của tham số đầu vào, request giống hệt dùng lại job cũ.
+    """
+    __tablename__ = 'tour_job'
+    job_id = db.Column(db.String(32), primary_key=True)
+    input_hash = db.Column(db.String(64), nullable=False, index=True)
+    params = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')   # queued | running | done | failed
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)    # Worker đang chạy gia hạn định kỳ (lease)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_json(self, include_result=True):
+        data = {
+            "jobId": self.job_id,
+            "status": self.status,
+            "params": self.params,
+            "error": self.error,
+            "createdAt": self.created_at.isoformat() if self.created_at else None,
+            "startedAt": self.started_at.isoformat() if self.started_at else None,
+            "finishedAt": self.finished_at.isoformat() if self.finished_at else None
+        }
+        if include_result:
+            data["result"] = self.result
+        return data
+
 class FavoriteAttraction(db.Model):
     __tablename__ = 'favorite_attraction'
     # Dùng 2 cột làm khóa chính (Composite Primary Key)
@@ -344,6 +408,69 @@ class FavoriteAttraction(db.Model):
     user = db.relationship('User', back_populates='favorite_attractions')
     attraction = db.relationship('Attraction', back_populates='favorited_by')
 
+# ======================================================================
+# ===                                                                ===
+# ===              Ma tran khoang cach giua cac diem den             ===
+# ===                                                                ===
+# ======================================================================
+class AttractionTravel(db.Model):
+    """
+    Khoảng cách / thời gian di chuyển tính sẵn cho từng cặp (from -> to).
+    Được tạo bởi job build_travel_matrix.py, tour_service đọc thay vì gọi routing.
+    Tọa độ 2 đầu được lưu lại để phát hiện điểm đã bị di chuyển (dữ liệu cũ).
+    """
+    __tablename__ = 'attraction_travel'
+    from_id = db.Column(db.Integer, db.ForeignKey('attraction.id'), primary_key=True)
+    to_id = db.Column(db.Integer, db.ForeignKey('attraction.id'), primary_key=True)
+
+    from_lat = db.Column(db.Float)
+    from_lon = db.Column(db.Float)
+    to_lat = db.Column(db.Float)
+    to_lon = db.Column(db.Float)
+
+    distance_km = db.Column(db.Float, nullable=False)
+    duration_min = db.Column(db.Integer, nullable=False)
+    # "car", "plane:<sân bay đi>-<sân bay đến>" hoặc "estimated" (ước lượng đường chim bay, lần chạy sau tính lại)
+    mode = db.Column(db.String(255), default='car')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_attraction_travel_to', 'to_id'),
+    )
+
+
+class AttractionNeighbor(db.Model):
+    """
+    Điểm lân cận (trong bán kính đường bộ) của từng điểm đến, kèm khoảng cách / thời gian đi đường bộ.
+    Tạo bởi precompute_nearby_attractions (build_nearby.py), /api/nearby/<id> đọc theo
+    idx_attraction_neighbor_rank: lọc attraction_id, đã sắp sẵn theo khoảng cách.
+    Không đặt FK để xóa điểm đến không bị chặn, job precompute dọn các dòng của điểm đã xóa.
+    """
+    __tablename__ = 'attraction_neighbor'
+    attraction_id = db.Column(db.Integer, primary_key=True)
+    neighbor_id = db.Column(db.Integer, primary_key=True)
+    distance_km = db.Column(db.Float, nullable=False)
+    duration_min = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index('idx_attraction_neighbor_rank', 'attraction_id', 'distance_km', 'neighbor_id'),
+        db.Index('idx_attraction_neighbor_reverse', 'neighbor_id'),
+    )
+
+
+class AttractionNearbyState(db.Model):
+    """
+    Trạng thái lần tính điểm lân cận (attraction_neighbor) gần nhất của từng điểm.
+    precompute_nearby_attractions chỉ tính lại điểm chưa có dòng ở đây, bị đổi tọa độ
+    hoặc tính với bán kính khác. Không đặt FK để còn phát hiện được điểm đã bị xóa.
+    """
+    __tablename__ = 'attraction_nearby_state'
+    attraction_id = db.Column(db.Integer, primary_key=True)
+    lat = db.Column(db.Float)
+    lon = db.Column(db.Float)
+    radius_km = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 # ======================================================================
 # ===                                                                ===
 # ===                    Token Blocklist                              ===
@@ -382,6 +509,10 @@ class Blog(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), nullable=False)
     user = db.relationship('User', backref='blogs')
 
+    __table_args__ = (
+        db.Index('idx_blog_created_at', 'created_at', 'blog_id'),
+    )
+
     def to_json(self):
         import json
         image_urls_list = []
@@ -404,4 +535,32 @@ class Blog(db.Model):
                 "username": self.user.username if self.user else None,
                 "avatar_url": self.user.avatar_url if self.user else None
             }
-        }
\ No newline at end of file
+        }
+# ======================================================================
+# ===                                                                ===
+# ===                    Phien ban schema / du lieu                  ===
+# ===                                                                ===
+# ======================================================================
+class SchemaMarker(db.Model):
+    """
+    Đánh dấu DB đã được bootstrap.py dựng xong (1 dòng, id = 1).
+    App chỉ đọc dòng này lúc khởi động, không tự tạo bảng / nạp dữ liệu.
+    """
+    __tablename__ = 'schema_marker'
+    id = db.Column(db.Integer, primary_key=True)
+    schema_version = db.Column(db.Integer, nullable=False)
+    seeded_at = db.Column(db.DateTime, nullable=True)      # Lần nạp demo data gần nhất
+    # Phiên bản dữ liệu điểm đến cho cache lịch trình (service/itinerary_cache.py),
+    # tăng trong cùng transaction với thay đổi -> mọi worker / job CLI thấy cùng 1 giá trị
+    data_version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class CacheGeneration(db.Model):
+    """
+    "Thế hệ" của từng tag cache response (service/response_cache.py), dùng chung giữa các worker:
+    ghi DB ở worker nào thì response cũ gắn tag đó ở mọi worker đều hết hiệu lực.
+    """
+    __tablename__ = 'cache_generation'
+    tag = db.Column(db.String(255), primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
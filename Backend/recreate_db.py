@@ -1,24 +1,17 @@
 """Simple script to recreate database with updated schema"""
-from models import db, User, Attraction, Festival, CulturalSpot, Review, Tag, Blog, SavedTour, FavoriteAttraction
-from flask import Flask
-from init_db import import_demo_data
+import os
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///demo.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+os.environ['APP_BOOTSTRAP_MODE'] = '1'
 
-db.init_app(app)
+from app import app
+from models import db
+from service.bootstrap_service import bootstrap_database
 
 with app.app_context():
     # Drop all tables and recreate
     db.drop_all()
-    db.create_all()
-    print("Database schema created successfully!")
-    
-    # Import demo data
-    try:
-        import_demo_data("demo_data.json")
-        print("Demo data imported successfully!")
-    except Exception as e:
-        print(f"Warning: Could not import demo data: {e}")
+    print("Database dropped, bootstrapping...")
 
+    # Tạo bảng + nạp demo data (không tính ma trận khoảng cách / nearby, chạy build_*.py sau)
+    bootstrap_database(travel_matrix=False, nearby=False)
+    print("Demo data imported successfully!")
@@ -0,0 +1,18 @@
+"""
+Sửa / backfill số review, tổng điểm và rating trung bình (Attraction.review_count, rating_sum,
+average_rating) từ bảng review. Dùng khi review bị sửa trực tiếp trong DB, ngoài app.
+
+Cách chạy (trong thư mục Backend):
+    python repair_review_stats.py
+"""
+import os
+
+# Job tự chạy đồng bộ, không cần thread nền lúc import app
+os.environ.setdefault('NEARBY_PRECOMPUTE_ON_STARTUP', '0')
+
+from app import app
+from service.attraction_service import repair_review_stats
+
+if __name__ == '__main__':
+    with app.app_context():
+        print(f"Đã sửa {repair_review_stats()} điểm đến.")
@@ -0,0 +1,19 @@
+"""
+Chạy lại các job tạo tour (/api/tour-jobs) còn dở: job 'queued' chưa ai nhận và job 'running'
+mất heartbeat quá TOUR_JOB_LEASE_SECONDS (worker bị tắt giữa chừng). App không tự làm bước này lúc khởi động.
+Chạy song song với server vẫn an toàn: job đang có worker chạy (còn heartbeat) không bị chạy lại.
+
+Cách chạy (trong thư mục Backend), VD sau khi deploy / restart server:
+    python resume_tour_jobs.py
+"""
+import os
+
+# Job tự chạy đồng bộ, không cần thread nền lúc import app
+os.environ.setdefault('NEARBY_PRECOMPUTE_ON_STARTUP', '0')
+
+from app import app
+from service.tour_job_service import resume_pending_tour_jobs
+
+if __name__ == '__main__':
+    requeued, resumed = resume_pending_tour_jobs(app)
+    print(f"Đã chạy {resumed} job ({requeued} job mất lease được đưa lại hàng đợi).")
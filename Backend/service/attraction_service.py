@@ -1,10 +1,23 @@
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+
 from models import db, Attraction, Review, FavoriteAttraction
+from .pagination import keyset_page, page_json
+from .response_cache import invalidate_cache
+from .tour_package_service import refresh_package_summaries
 
-def get_attraction_detail_service(attraction_id, user_id=None):
+def get_attraction_detail_service(attraction_id, user_id=None, review_limit=None, review_cursor=None):
+    """
+    Chi tiết điểm đến + review (mới nhất trước, kèm tác giả): review_limit=None lấy toàn bộ,
+    có review_limit thì 1 trang, trang sau: review_cursor = reviewsPage.nextCursor.
+    """
     attraction = Attraction.query.get_or_404(attraction_id)
     attraction_data = attraction.to_json()
 
-    reviews = Review.query.filter_by(attraction_id=attraction_id).order_by(Review.created_at.desc()).all()
+    reviews, next_cursor = keyset_page(
+        Review.query.filter_by(attraction_id=attraction_id).options(joinedload(Review.user)),
+        (Review.created_at, Review.review_id), review_limit, review_cursor
+    )
     reviews_data = [review.to_json() for review in reviews]
 
     favorite_info = None
@@ -20,7 +33,8 @@ def get_attraction_detail_service(attraction_id, user_id=None):
 
     response_data = {
         "infomation": attraction_data,
-        "reviews": reviews_data
+        "reviews": reviews_data,
+        "reviewsPage": page_json(next_cursor, review_limit)
     }
     if favorite_info is not None:
         response_data["favorite"] = favorite_info
@@ -28,10 +42,15 @@ def get_attraction_detail_service(attraction_id, user_id=None):
     return response_data
 
 
+def _average(review_count, rating_sum):
+    return round(rating_sum / review_count, 1) if review_count > 0 else 0.0
+
+
 def update_attraction_rating_service(attraction_id, commit_now=True):
     """
-    Tính toán và cập nhật điểm rating trung bình cho một attraction.
-    Hàm này nên được gọi bất cứ khi nào có review mới/sửa/xóa.
+    Tính lại từ bảng review: số review, tổng điểm và điểm rating trung bình của một attraction.
+    Dùng khi nạp dữ liệu (init_db) hoặc sửa lệch; thêm/sửa/xóa review đã cập nhật O(1)
+    qua _apply_review_delta.
 
     :param attraction_id: ID của attraction cần cập nhật
     :param commit_now: Nếu True, hàm sẽ tự commit. 
@@ -44,17 +63,15 @@ def update_attraction_rating_service(attraction_id, commit_now=True):
         print(f"Warning: Không tìm thấy attraction ID {attraction_id} để cập nhật rating.")
         return False
 
-    # 2. Lấy tất cả review của attraction đó
-    reviews = Review.query.filter_by(attraction_id=attraction.id).all()
+    # 2. Đếm + cộng điểm review ngay trong SQL
+    review_count, rating_sum = db.session.query(
+        func.count(Review.review_id), func.coalesce(func.sum(Review.rating_score), 0)
+    ).filter(Review.attraction_id == attraction.id).one()
 
     # 3. Tính toán
-    if reviews:
-        total_score = sum(r.rating_score for r in reviews)
-        avg_score = total_score / len(reviews)
-        attraction.average_rating = round(avg_score, 1)
-    else:
-        # Nếu không có review
-        attraction.average_rating = 0.0
+    attraction.review_count = review_count
+    attraction.rating_sum = float(rating_sum)
+    attraction.average_rating = _average(review_count, rating_sum)
     
     # 4. Lưu thay đổi (nếu được yêu cầu)
     if commit_now:
@@ -70,8 +87,64 @@ def update_attraction_rating_service(attraction_id, commit_now=True):
         # Nếu không commit, chỉ cần thêm vào session để lệnh commit bên ngoài (của init_db) xử lý
         db.session.add(attraction)
         return True
+
+
+def repair_review_stats():
+    """
+    Đối chiếu review_count / rating_sum / average_rating của mọi attraction với bảng review
+    (1 câu GROUP BY) và sửa các điểm bị lệch: backfill sau khi thêm cột,
+    hoặc sau khi review bị sửa trực tiếp trong DB. Trả về số attraction đã sửa.
+    """
+    stats = {
+        attraction_id: (count, float(total))
+        for attraction_id, count, total in db.session.query(
+            Review.attraction_id, func.count(Review.review_id), func.sum(Review.rating_score)
+        ).group_by(Review.attraction_id)
+    }
+
+    fixed = 0
+    for attraction in Attraction.query.all():
+        review_count, rating_sum = stats.get(attraction.id, (0, 0.0))
+        average = _average(review_count, rating_sum)
+        if (attraction.review_count, attraction.rating_sum, attraction.average_rating) != (review_count, rating_sum, average):
+            attraction.review_count = review_count
+            attraction.rating_sum = rating_sum
+            attraction.average_rating = average
+            fixed += 1
+
+    if fixed:
+        refresh_package_summaries()
+    db.session.commit()
+    return fixed
+
+
+def _apply_review_delta(attraction_id, count_delta, score_delta):
+    """
+    Cập nhật O(1) số review / tổng điểm / điểm trung bình của attraction
+    trong cùng transaction với thay đổi review (không đọc lại toàn bộ review).
+    Cộng dồn bằng SQL để 2 request ghi cùng lúc không ghi đè nhau.
+    """
+    attraction_filter = Attraction.id == attraction_id
+    db.session.query(Attraction).filter(attraction_filter).update({
+        Attraction.review_count: Attraction.review_count + count_delta,
+        Attraction.rating_sum: Attraction.rating_sum + score_delta
+    })
+    row = db.session.query(Attraction.review_count, Attraction.rating_sum).filter(attraction_filter).one_or_none()
+    if row is None:
+        print(f"Warning: Không tìm thấy attraction ID {attraction_id} để cập nhật rating.")
+        return
+    db.session.query(Attraction).filter(attraction_filter).update({
+        Attraction.average_rating: _average(*row)
+    })
+    # Rating trung bình của các gói tour chứa điểm này
+    refresh_package_summaries(attraction_ids=[attraction_id])
     
 
+def _invalidate_review_caches(attraction_id):
+    # Review đổi rating -> chi tiết điểm, kết quả search và rating gói tour đều cũ
+    invalidate_cache(f"attraction:{attraction_id}", "search", "packages")
+
+
 def _validate_review_payload(data, require_review_id=False):
     """
     Chuẩn hóa và kiểm tra dữ liệu review từ frontend.
@@ -137,8 +210,9 @@ def create_review(attraction_id, data):
     )
 
     db.session.add(new_review)
+    _apply_review_delta(attraction_id, 1, payload["rating_score"])
     db.session.commit()
-    update_attraction_rating_service(attraction_id)
+    _invalidate_review_caches(attraction_id)
     return new_review.to_json()
 
 
@@ -147,10 +221,13 @@ def update_review(attraction_id, data):
     review = _get_review_or_404(payload["review_id"], attraction_id)
     _assert_owner(review, payload["user_id"])
 
+    score_delta = payload["rating_score"] - review.rating_score
     review.content = payload["content"]
     review.rating_score = payload["rating_score"]
+    if score_delta:
+        _apply_review_delta(attraction_id, 0, score_delta)
     db.session.commit()
-    update_attraction_rating_service(attraction_id)
+    _invalidate_review_caches(attraction_id)
     return review.to_json()
 
 def delete_review(attraction_id, data):
@@ -167,12 +244,11 @@ def delete_review(attraction_id, data):
     # 3. Kiểm tra quyền sở hữu
     _assert_owner(review, int(user_id))
 
-    # 4. Xóa
+    # 4. Xóa + cập nhật lại điểm số trong cùng transaction
+    _apply_review_delta(attraction_id, -1, -review.rating_score)
     db.session.delete(review)
     db.session.commit()
-    
-    # 5. Cập nhật lại điểm số
-    update_attraction_rating_service(attraction_id)
+    _invalidate_review_caches(attraction_id)
     
     return True
 
@@ -244,6 +320,9 @@ def set_favorite(attraction_id, data):
         db.session.rollback()
         raise e
 
+    # Favorite ảnh hưởng trạng thái yêu thích ở trang chi tiết và điểm sở thích khi search
+    invalidate_cache(f"attraction:{attraction_id}", "search")
+
     return {
         "userId": payload["user_id"],
         "isFavorite": payload["is_favorite"]
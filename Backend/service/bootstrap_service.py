@@ -0,0 +1,55 @@
+"""
+Dựng DB cho app: tạo bảng, nâng cấp schema, nạp demo data, tính sẵn dữ liệu phụ.
+
+Chạy 1 lần trước khi khởi động app (bootstrap.py), không chạy trong create_app
+-> worker khởi động chỉ đọc schema_marker, không có 2 worker cùng nạp dữ liệu.
+Mọi bước đều chạy lại được: bảng / cột / bản ghi đã có thì bỏ qua.
+"""
+import logging
+
+from models import db
+from init_db import DEMO_DATA_PATH, import_demo_data, seed_blog_data
+from .attraction_service import repair_review_stats
+from .schema_service import upgrade_schema, write_schema_marker
+from .tour_package_service import ensure_package_summaries
+from .fts_index import ensure_fts_index
+from .itinerary_cache import bump_data_version
+from .travel_matrix_service import refresh_travel_matrix
+from .search_service import precompute_nearby_attractions
+
+logger = logging.getLogger(__name__)
+
+
+def bootstrap_database(seed=True, json_path=DEMO_DATA_PATH, travel_matrix=True, nearby=True):
+    """
+    Gọi trong app context. Trả về dict tóm tắt các bước đã làm.
+    seed: nạp demo_data.json + blog mẫu.
+    travel_matrix / nearby: tính ma trận khoảng cách, điểm lân cận cho các điểm mới
+    (gọi GraphHopper, có thể lâu -> tắt được, chạy riêng bằng build_travel_matrix.py / build_nearby.py).
+    """
+    summary = {}
+    db.create_all()
+    summary["schemaChanges"] = upgrade_schema()
+    # DB cũ: backfill số review / tổng điểm từ bảng review
+    if 'attraction.review_count' in summary["schemaChanges"]:
+        repair_review_stats()
+
+    if seed:
+        summary["seeded"] = import_demo_data(json_path)
+        summary["seeded"]["blogs"] = seed_blog_data()
+    ensure_package_summaries()
+    ensure_fts_index()
+
+    # Ghi marker ngay khi schema + dữ liệu chính đã xong: các bước sau chỉ là dữ liệu tính sẵn,
+    # lỗi (mất mạng...) thì chạy lại lệnh, app vẫn khởi động được
+    write_schema_marker(seeded=seed)
+    # Demo data nạp bằng bulk insert (không qua event ORM) -> lịch trình đã cache ở worker đang chạy hết hiệu lực
+    if seed:
+        bump_data_version()
+
+    if travel_matrix:
+        summary["travelMatrixPairs"] = refresh_travel_matrix()
+    if nearby:
+        summary["nearby"] = precompute_nearby_attractions()
+    logger.info(f"[Bootstrap] {summary}")
+    return summary
@@ -0,0 +1,160 @@
+"""
+Chia điểm đến thành các ngày có giới hạn sức chứa (số điểm / ngày + tổng thời gian / ngày).
+
+Thay cho vòng lặp GaussianMixture n = 1..max_days (mỗi lần fit lại chạy ước lượng thời gian
+cho mọi cụm) + tách cụm > 3 điểm sau đó: làm 1 lượt trên ma trận thời gian di chuyển.
+
+1. Số cụm ban đầu k = max(min_clusters, ceil(n / max_items)), không vượt max_clusters (số ngày của tour).
+2. Chọn k điểm làm tâm (medoid) xa nhau nhất (farthest-first) tính theo thời gian di chuyển.
+3. Xếp các điểm còn lại theo "regret" giảm dần (chênh lệch giữa tâm gần nhất và gần nhì):
+   điểm khó chọn xếp trước, vào cụm gần nhất còn chỗ + còn thời gian; không vừa cụm nào thì mở ngày mới,
+   đã đủ max_clusters ngày thì xếp vào cụm bị quá tải ít nhất (ưu tiên cụm còn chỗ, rồi vượt ít thời gian nhất).
+4. Tinh chỉnh kiểu k-medoids: tính lại tâm, chuyển điểm sang cụm khác nếu vẫn thỏa ràng buộc
+   và giảm tổng thời gian.
+
+Module thuần Python (không query DB / gọi API): nhận ma trận thời gian, trả về chỉ số điểm theo cụm.
+"""
+import math
+
+
+def route_duration(members, travel, visit, start=0, wake_up_hour=6, lunch_hour=11.5, lunch_minutes=90):
+    """
+    Ước lượng thời gian 1 ngày (di chuyển + tham quan + ăn trưa) theo láng giềng gần nhất,
+    cùng luật với tour_service.estimate_cluster_duration.
+    members: chỉ số điểm trong ma trận; travel[i][j]: phút di chuyển i -> j; visit[i]: phút tham quan.
+    """
+    pending = list(members)
+    current = start
+    total = 0
+    clock = wake_up_hour
+    has_lunch = False
+    while pending:
+        nearest = min(pending, key=lambda p: travel[current][p])
+        travel_min = travel[current][nearest]
+        total += travel_min
+        clock += travel_min / 60.0
+        if not has_lunch and clock >= lunch_hour:
+            total += lunch_minutes
+            clock += lunch_minutes / 60.0
+            has_lunch = True
+        total += visit[nearest]
+        clock += visit[nearest] / 60.0
+        current = nearest
+        pending.remove(nearest)
+    return total
+
+
+class CapacityClusterer:
+    """
+    travel: ma trận (n + 1) x (n + 1) phút di chuyển, chỉ số 0 là điểm xuất phát, 1..n là các điểm đến.
+    visit: list n + 1 phần tử (visit[0] bỏ qua).
+    """
+
+    def __init__(self, travel, visit, max_duration, max_items, refine_passes=3):
+        self.travel = travel
+        self.visit = visit
+        self.max_duration = max_duration
+        self.max_items = max_items
+        self.refine_passes = refine_passes
+        self.n = len(travel) - 1
+        self._duration_cache = {}
+
+    def _dist(self, a, b):
+        # Khoảng cách đối xứng giữa 2 điểm để chọn tâm / gán cụm
+        return (self.travel[a][b] + self.travel[b][a]) / 2.0
+
+    def duration(self, members):
+        key = frozenset(members)
+        value = self._duration_cache.get(key)
+        if value is None:
+            value = self._duration_cache[key] = route_duration(sorted(members), self.travel, self.visit)
+        return value
+
+    def _fits(self, members, point):
+        return len(members) < self.max_items and self.duration(members + [point]) <= self.max_duration
+
+    def _pick_seeds(self, k):
+        points = range(1, self.n + 1)
+        # Tâm đầu tiên: điểm xa điểm xuất phát nhất, sau đó lần lượt điểm xa các tâm đã chọn nhất
+        seeds = [max(points, key=lambda p: (self._dist(0, p), -p))]
+        while len(seeds) < k:
+            seeds.append(max(
+                (p for p in points if p not in seeds),
+                key=lambda p: (min(self._dist(p, s) for s in seeds), -p)
+            ))
+        return seeds
+
+    def _medoid(self, members):
+        return min(members, key=lambda m: (sum(self._dist(m, o) for o in members), m))
+
+    def _least_overloaded(self, clusters, medoids, point):
+        """Cụm nhận thêm point mà bị quá tải ít nhất: còn chỗ trước, rồi vượt max_duration ít nhất, rồi gần nhất."""
+        def overload(c):
+            members = clusters[c] + [point]
+            return (
+                max(0, len(members) - self.max_items),
+                max(0, self.duration(members) - self.max_duration),
+                self._dist(point, medoids[c]),
+                c
+            )
+        return min(range(len(clusters)), key=overload)
+
+    def cluster(self, min_clusters=1, max_clusters=None):
+        """max_clusters: số cụm (ngày) tối đa, None = không giới hạn."""
+        if self.n == 0:
+            return []
+        k = min(self.n, max(min_clusters, math.ceil(self.n / self.max_items)))
+        if max_clusters:
+            k = min(k, max_clusters)
+        seeds = self._pick_seeds(k)
+        clusters = [[s] for s in seeds]
+        medoids = list(seeds)
+
+        def regret(p):
+            dists = sorted(self._dist(p, m) for m in medoids)
+            return dists[1] - dists[0] if len(dists) > 1 else 0.0
+
+        rest = sorted((p for p in range(1, self.n + 1) if p not in seeds), key=lambda p: (-regret(p), p))
+        for p in rest:
+            order = sorted(range(len(clusters)), key=lambda c: (self._dist(p, medoids[c]), c))
+            target = next((c for c in order if self._fits(clusters[c], p)), None)
+            if target is None and max_clusters and len(clusters) >= max_clusters:
+                target = self._least_overloaded(clusters, medoids, p)
+            if target is None:
+                clusters.append([p])     # Không vừa ngày nào -> thêm ngày
+                medoids.append(p)
+            else:
+                clusters[target].append(p)
+
+        self._refine(clusters)
+        return [sorted(c) for c in clusters if c]
+
+    def _refine(self, clusters):
+        for _ in range(self.refine_passes):
+            medoids = [self._medoid(c) if c else None for c in clusters]
+            moved = False
+            for src, members in enumerate(clusters):
+                for p in list(members):
+                    if len(members) == 1:
+                        break
+                    rest = [m for m in members if m != p]
+                    before = self.duration(members)
+                    after_src = self.duration(rest)
+                    for dst in sorted(range(len(clusters)), key=lambda c: (self._dist(p, medoids[c]) if medoids[c] else math.inf, c)):
+                        if dst == src or not clusters[dst] or not self._fits(clusters[dst], p):
+                            continue
+                        gain = before + self.duration(clusters[dst]) - after_src - self.duration(clusters[dst] + [p])
+                        if gain > 1e-9:
+                            members.remove(p)
+                            clusters[dst].append(p)
+                            moved = True
+                            break
+            if not moved:
+                return
+
+
+def capacity_cluster(travel, visit, max_duration, max_items, min_clusters=1, max_clusters=None):
+    """Trả về list cụm, mỗi cụm là list chỉ số điểm đến (1..n, theo ma trận travel)."""
+    return CapacityClusterer(travel, visit, max_duration, max_items).cluster(
+        min_clusters=min_clusters, max_clusters=max_clusters
+    )
@@ -0,0 +1,230 @@
+"""
+Đo số câu SQL / thời gian DB để phát hiện N+1 query.
+
+- count_queries / log_query_count: đếm số câu SQL của 1 khối code (chỉ trên thread hiện tại).
+- Theo request: hook vào engine event của SQLAlchemy + before/after_request của Flask,
+  gom theo route: số request, thời gian xử lý, số câu SQL, thời gian DB,
+  các câu SQL chậm nhất. Xuất ra /api/metrics (Prometheus text hoặc JSON,
+  câu SQL chỉ kèm theo khi bật METRICS_INCLUDE_SQL vì có thể lộ dữ liệu / cấu trúc bảng).
+- Request chậm hơn SLOW_REQUEST_MS và câu SQL chậm hơn SLOW_QUERY_MS được ghi log.
+"""
+import functools
+import heapq
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 500))
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+METRICS_TOP_STATEMENTS = 5          # Số câu SQL chậm nhất giữ lại cho mỗi route
+METRICS_INCLUDE_SQL = os.getenv('METRICS_INCLUDE_SQL', '0') == '1'
+STATEMENT_MAX_LENGTH = 300
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self._thread_id = threading.get_ident()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._thread_id:
+            self.count += 1
+
+
+@contextmanager
+def count_queries():
+    """
+    with count_queries() as counter:
+        ...
+    counter.count -> số câu SQL đã chạy trong khối with.
+    """
+    counter = QueryCounter()
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', counter._on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter._on_execute)
+
+
+def log_query_count(label):
+    """Decorator: ghi log số câu SQL mà hàm đã chạy sau mỗi lần gọi."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with count_queries() as counter:
+                result = func(*args, **kwargs)
+            logger.info(f"[SQL] {label}: {counter.count} queries")
+            return result
+        return wrapper
+    return decorator
+
+
+# ----------------------------------------------------------------------
+# Thống kê theo request
+# ----------------------------------------------------------------------
+class RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_ms = 0.0
+        self.slowest = []   # min-heap (ms, statement), giữ METRICS_TOP_STATEMENTS câu chậm nhất
+
+    def add(self, elapsed_ms, status_code, sql):
+        self.requests += 1
+        self.errors += int(status_code >= 500)
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.queries += sql["count"]
+        self.max_queries = max(self.max_queries, sql["count"])
+        self.db_ms += sql["db_ms"]
+        for item in sql["statements"]:
+            if len(self.slowest) < METRICS_TOP_STATEMENTS:
+                heapq.heappush(self.slowest, item)
+            elif item[0] > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, item)
+
+    def to_json(self, include_sql=False):
+        data = {
+            "requests": self.requests,
+            "errors": self.errors,
+            "avgMs": round(self.total_ms / self.requests, 1) if self.requests else 0.0,
+            "maxMs": round(self.max_ms, 1),
+            "queries": self.queries,
+            "avgQueries": round(self.queries / self.requests, 1) if self.requests else 0.0,
+            "maxQueries": self.max_queries,
+            "dbMs": round(self.db_ms, 1)
+        }
+        if include_sql:
+            data["slowestStatements"] = [
+                {"ms": round(ms, 2), "statement": stmt}
+                for ms, stmt in sorted(self.slowest, reverse=True)
+            ]
+        return data
+
+
+_route_stats = {}       # (method, rule) -> RouteStats
+_stats_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start_time')
+    if not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+
+    if elapsed_ms >= SLOW_QUERY_MS:
+        logger.warning(f"[SLOW SQL] {elapsed_ms:.1f}ms: {statement[:STATEMENT_MAX_LENGTH]}")
+
+    # Câu SQL chạy ngoài request (thread nền, job) không tính vào route nào
+    if not has_request_context():
+        return
+    sql = g.get('_sql_stats')
+    if sql is None:
+        return
+    sql["count"] += 1
+    sql["db_ms"] += elapsed_ms
+    sql["statements"].append((elapsed_ms, ' '.join(statement.split())[:STATEMENT_MAX_LENGTH]))
+
+
+def install_query_listeners(engine):
+    """Gắn listener đo thời gian cho engine (gọi 1 lần trong app context)."""
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def start_request_metrics():
+    """Gọi trong before_request."""
+    g._request_start = time.perf_counter()
+    g._sql_stats = {"count": 0, "db_ms": 0.0, "statements": []}
+
+
+def finish_request_metrics(response):
+    """Gọi trong after_request: cộng dồn thống kê theo route, log request chậm."""
+    start = g.get('_request_start')
+    sql = g.get('_sql_stats')
+    if start is None or sql is None:
+        return response
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    rule = request.url_rule.rule if request.url_rule else 'unmatched'
+    key = (request.method, rule)
+
+    # Chỉ giữ vài câu chậm nhất của request này
+    sql["statements"] = heapq.nlargest(METRICS_TOP_STATEMENTS, sql["statements"])
+    with _stats_lock:
+        _route_stats.setdefault(key, RouteStats()).add(elapsed_ms, response.status_code, sql)
+
+    if elapsed_ms >= SLOW_REQUEST_MS:
+        logger.warning(
+            f"[SLOW REQUEST] {request.method} {request.full_path.rstrip('?')} -> {response.status_code}: "
+            f"{elapsed_ms:.0f}ms, {sql['count']} queries ({sql['db_ms']:.0f}ms DB)"
+        )
+    return response
+
+
+def get_route_metrics(include_sql=METRICS_INCLUDE_SQL):
+    with _stats_lock:
+        return {
+            f"{method} {rule}": stats.to_json(include_sql)
+            for (method, rule), stats in sorted(_route_stats.items())
+        }
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(extra_gauges=None, extra_counters=None):
+    """
+    Xuất thống kê theo route dạng Prometheus text exposition.
+    extra_gauges / extra_counters: list (name, help, {labels_tuple: value}) để thêm số liệu khác
+    (cache, HTTP client...). Counter là số chỉ tăng (số lần tra cache, số lời gọi...), tên kết thúc bằng _total.
+    """
+    with _stats_lock:
+        items = sorted(_route_stats.items())
+
+    metrics = [
+        ("app_http_requests_total", "counter", "Số request theo route", lambda s: s.requests),
+        ("app_http_request_errors_total", "counter", "Số request lỗi 5xx theo route", lambda s: s.errors),
+        ("app_http_request_duration_seconds_sum", "counter", "Tổng thời gian xử lý request (giây)", lambda s: s.total_ms / 1000),
+        ("app_http_request_duration_seconds_max", "gauge", "Request chậm nhất (giây)", lambda s: s.max_ms / 1000),
+        ("app_db_queries_total", "counter", "Tổng số câu SQL theo route", lambda s: s.queries),
+        ("app_db_queries_per_request_max", "gauge", "Số câu SQL nhiều nhất trong 1 request", lambda s: s.max_queries),
+        ("app_db_query_duration_seconds_sum", "counter", "Tổng thời gian chạy SQL (giây)", lambda s: s.db_ms / 1000),
+    ]
+
+    lines = []
+    for name, metric_type, help_text, getter in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for (method, rule), stats in items:
+            lines.append(f'{name}{{method="{_label(method)}",route="{_label(rule)}"}} {getter(stats):g}')
+
+    extra = [(item, "gauge") for item in (extra_gauges or [])] + [(item, "counter") for item in (extra_counters or [])]
+    for (name, help_text, samples), metric_type in extra:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples.items():
+            label_str = ','.join(f'{k}="{_label(v)}"' for k, v in labels)
+            lines.append(f"{name}{{{label_str}}} {value:g}" if label_str else f"{name} {value:g}")
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,167 @@
+"""
+Tìm kiếm toàn văn bằng SQLite FTS5 cho /api/search.
+
+- Bảng ảo attraction_fts (rowid = attraction.id) chứa tên, mô tả, địa chỉ và tên tag
+  đã bỏ dấu + chữ thường (cùng hàm normalize với index trong RAM), tokenizer unicode61.
+- Từ khóa được tách thành token, mỗi token khớp theo tiền tố ("hoi"* "an"*),
+  SQLite lọc và xếp hạng bằng BM25 (trọng số theo cột) trước khi Python cộng điểm
+  sở thích / rating / review.
+- Đồng bộ trong cùng transaction qua SQLAlchemy event after_flush
+  (attraction thêm / sửa / xóa, đổi tags, đổi tên tag).
+- SQLite không có FTS5 hoặc SEARCH_FTS_ENABLED=0 -> fts_search trả về None,
+  service dùng lại cách so khớp chuỗi con trên index trong RAM.
+"""
+import logging
+import os
+import re
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, selectinload
+
+from models import db, Attraction, Tag, attraction_tags
+from .search_index import normalize
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FTS_ENABLED = os.getenv('SEARCH_FTS_ENABLED', '1') == '1'
+FTS_MAX_CANDIDATES = int(os.getenv('FTS_MAX_CANDIDATES', 1000))   # Số kết quả BM25 tối đa lấy ra để chấm điểm
+FTS_TABLE = 'attraction_fts'
+FTS_COLUMNS = ('name', 'description', 'location', 'tags')
+FTS_WEIGHTS = (10.0, 2.0, 5.0, 5.0)     # Trọng số BM25 theo thứ tự FTS_COLUMNS
+INDEXED_ATTRIBUTES = ('name', 'brief_description', 'location', 'tags')
+
+_fts_ready = False
+
+
+def tokenize(value):
+    """Tách từ khóa thành token đã bỏ dấu, chữ thường (cùng luật với dữ liệu trong bảng FTS)."""
+    return re.findall(r'\w+', normalize(value))
+
+
+def build_match_query(tokens):
+    # Token chỉ gồm ký tự chữ/số nên đặt trong ngoặc kép là an toàn với cú pháp FTS5
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _fts_row(attraction):
+    return {
+        "id": attraction.id,
+        "name": normalize(attraction.name),
+        "description": normalize(attraction.brief_description),
+        "location": normalize(attraction.location),
+        "tags": ' '.join(normalize(t.tag_name) for t in attraction.tags)
+    }
+
+
+def _upsert_rows(connection, rows):
+    if not rows:
+        return
+    connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), [{"id": r["id"]} for r in rows])
+    connection.execute(
+        text(f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) "
+             f"VALUES (:id, {', '.join(':' + c for c in FTS_COLUMNS)})"),
+        rows
+    )
+
+
+def rebuild_fts_index():
+    """Nạp lại toàn bộ bảng FTS từ bảng attraction (cần app context)."""
+    attractions = Attraction.query.options(selectinload(Attraction.tags)).all()
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    _upsert_rows(db.session.connection(), [_fts_row(a) for a in attractions])
+    db.session.commit()
+    return len(attractions)
+
+
+def ensure_fts_index():
+    """
+    Gọi lúc khởi động app (trong app context): tạo bảng FTS nếu chưa có,
+    nạp lại nếu số dòng lệch với bảng attraction (DB cũ, sửa tay ngoài app...).
+    """
+    global _fts_ready
+    if not SEARCH_FTS_ENABLED:
+        return False
+    try:
+        db.session.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5({', '.join(FTS_COLUMNS)}, tokenize='unicode61 remove_diacritics 2')"
+        ))
+        indexed = db.session.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+        db.session.commit()
+    except OperationalError as e:
+        db.session.rollback()
+        logger.warning(f"[FTS] SQLite không hỗ trợ FTS5, dùng tìm kiếm trong RAM: {e}")
+        _fts_ready = False
+        return False
+
+    if indexed != Attraction.query.count():
+        logger.info(f"[FTS] Dựng lại {FTS_TABLE}: {rebuild_fts_index()} điểm")
+    _fts_ready = True
+    return True
+
+
+def fts_search(search_term, limit=FTS_MAX_CANDIDATES):
+    """
+    Trả về list attraction id khớp mọi token của từ khóa, sắp theo BM25 (tốt nhất trước).
+    None nếu FTS không dùng được.
+    """
+    if not _fts_ready:
+        return None
+    tokens = tokenize(search_term)
+    if not tokens:
+        return []
+    weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+    rows = db.session.execute(
+        text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :query "
+             f"ORDER BY bm25({FTS_TABLE}, {weights}), rowid LIMIT :limit"),
+        {"query": build_match_query(tokens), "limit": limit}
+    ).all()
+    return [row[0] for row in rows]
+
+
+# --- Đồng bộ với bảng attraction (cùng transaction với thay đổi) ---
+def _changed(obj, attributes):
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attributes)
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_fts(session, flush_context):
+    if not _fts_ready:
+        return
+
+    upserts = {}
+    deleted_ids = []
+    renamed_tag_ids = []
+    for obj in session.new:
+        if isinstance(obj, Attraction):
+            upserts[obj.id] = obj
+    for obj in session.dirty:
+        if isinstance(obj, Attraction) and _changed(obj, INDEXED_ATTRIBUTES):
+            upserts[obj.id] = obj
+        elif isinstance(obj, Tag) and _changed(obj, ('tag_name',)):
+            renamed_tag_ids.append(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, Attraction):
+            deleted_ids.append(obj.id)
+
+    if not (upserts or deleted_ids or renamed_tag_ids):
+        return
+
+    connection = session.connection()
+    if renamed_tag_ids:
+        # Đổi tên tag -> cập nhật mọi điểm gắn tag đó
+        tagged_ids = connection.execute(
+            attraction_tags.select().with_only_columns(attraction_tags.c.attraction_id)
+            .where(attraction_tags.c.tag_id.in_(renamed_tag_ids))
+        ).scalars().all()
+        with session.no_autoflush:
+            for attraction in session.query(Attraction).filter(Attraction.id.in_(tagged_ids)):
+                upserts.setdefault(attraction.id, attraction)
+
+    with session.no_autoflush:
+        rows = [_fts_row(a) for a in upserts.values() if a.id not in deleted_ids]
+    _upsert_rows(connection, rows)
+    if deleted_ids:
+        connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), [{"id": i} for i in deleted_ids])
@@ -0,0 +1,275 @@
+"""
+Chỉ mục không gian trong RAM cho các truy vấn "điểm gần đây".
+
+- haversine_km: công thức haversine vector hóa (nhận số hoặc mảng, tự broadcast).
+- SpatialIndex: lưới ô vuông theo độ (lat/lon). Truy vấn bán kính chỉ xét các ô
+  giao với hình chữ nhật bao quanh vòng tròn, k điểm gần nhất mở rộng dần theo vòng ô.
+  Khoảng cách tới các ứng viên được tính 1 lần trên mảng NumPy.
+- Index attraction dùng chung được dựng lúc khởi động app, cập nhật từng điểm qua
+  SQLAlchemy event (thêm / sửa / xóa), dựng lại toàn bộ khi session rollback
+  hoặc sau GEO_INDEX_MAX_AGE_SECONDS (để thấy thay đổi từ process khác).
+"""
+import math
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Attraction
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+GEO_INDEX_CELL_DEGREES = float(os.getenv('GEO_INDEX_CELL_DEGREES', 0.1))      # ~11km mỗi ô
+GEO_INDEX_MAX_AGE_SECONDS = int(os.getenv('GEO_INDEX_MAX_AGE_SECONDS', 300))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Khoảng cách đường tròn lớn (km). Tham số có thể là số hoặc mảng NumPy.
+    Sai số so với geodesic (ellipsoid WGS-84) < 0.5%, đủ cho việc lọc sơ bộ.
+    """
+    import numpy as np     # Nạp khi truy vấn lần đầu, không làm chậm lúc import app
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    """
+    Lưới ô vuông cell_degrees x cell_degrees.
+    Key của điểm là tùy ý (id attraction, mã sân bay...).
+    """
+
+    def __init__(self, cell_degrees=GEO_INDEX_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._points = {}       # key -> (lat, lon)
+        self._cells = {}        # (row, col) -> set(key)
+        self._lock = threading.RLock()
+
+    def _cell_of(self, lat, lon):
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees))
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
+
+    # ------------------------------------------------------------------
+    # Cập nhật
+    # ------------------------------------------------------------------
+    def insert(self, key, lat, lon):
+        """Thêm điểm, hoặc di chuyển nếu key đã có."""
+        if lat is None or lon is None:
+            self.remove(key)
+            return
+        with self._lock:
+            old = self._points.get(key)
+            if old == (lat, lon):
+                return
+            if old is not None:
+                self._discard_from_cell(key, old)
+            self._points[key] = (lat, lon)
+            self._cells.setdefault(self._cell_of(lat, lon), set()).add(key)
+
+    def remove(self, key):
+        with self._lock:
+            old = self._points.pop(key, None)
+            if old is not None:
+                self._discard_from_cell(key, old)
+
+    def _discard_from_cell(self, key, coord):
+        cell = self._cell_of(*coord)
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(key)
+            if not members:
+                del self._cells[cell]
+
+    def clear(self):
+        with self._lock:
+            self._points.clear()
+            self._cells.clear()
+
+    # ------------------------------------------------------------------
+    # Truy vấn
+    # ------------------------------------------------------------------
+    def _distances(self, lat, lon, keys):
+        import numpy as np
+        coords = np.array([self._points[k] for k in keys], dtype=float).reshape(-1, 2)
+        return haversine_km(lat, lon, coords[:, 0], coords[:, 1])
+
+    def within_radius(self, lat, lon, radius_km, exclude_ids=None):
+        """
+        Trả về (keys, distances_km) của các điểm cách (lat, lon) không quá radius_km,
+        sắp theo khoảng cách tăng dần.
+        """
+        import numpy as np
+        dlat = radius_km / KM_PER_DEGREE
+        # Càng xa xích đạo 1 độ kinh càng ngắn -> mở rộng theo vĩ độ cao nhất của vùng tìm
+        max_abs_lat = min(abs(lat) + dlat, 89.0)
+        dlon = radius_km / (KM_PER_DEGREE * math.cos(math.radians(max_abs_lat)))
+
+        row_min, col_min = self._cell_of(lat - dlat, lon - dlon)
+        row_max, col_max = self._cell_of(lat + dlat, lon + dlon)
+
+        with self._lock:
+            keys = []
+            if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self._cells):
+                # Vùng tìm lớn hơn số ô đang có điểm -> duyệt các ô có điểm
+                for (row, col), members in self._cells.items():
+                    if row_min <= row <= row_max and col_min <= col <= col_max:
+                        keys.extend(members)
+            else:
+                for row in range(row_min, row_max + 1):
+                    for col in range(col_min, col_max + 1):
+                        keys.extend(self._cells.get((row, col), ()))
+
+            if exclude_ids:
+                keys = [k for k in keys if k not in exclude_ids]
+            if not keys:
+                return [], []
+            dists = self._distances(lat, lon, keys)
+
+        mask = dists <= radius_km
+        order = np.argsort(dists[mask], kind='stable')
+        selected = np.array(keys, dtype=object)[mask][order]
+        return selected.tolist(), dists[mask][order].tolist()
+
+    @staticmethod
+    def _ring_cells(center_row, center_col, ring):
+        """Các ô nằm trên viền hình vuông cách ô trung tâm đúng `ring` ô."""
+        if ring == 0:
+            return [(center_row, center_col)]
+        cells = []
+        for col in range(center_col - ring, center_col + ring + 1):
+            cells.append((center_row - ring, col))
+            cells.append((center_row + ring, col))
+        for row in range(center_row - ring + 1, center_row + ring):
+            cells.append((row, center_col - ring))
+            cells.append((row, center_col + ring))
+        return cells
+
+    def nearest(self, lat, lon, k=1, exclude_ids=None):
+        """
+        Trả về (keys, distances_km) của k điểm gần nhất, sắp theo khoảng cách tăng dần.
+        Mở rộng dần theo vòng ô quanh ô chứa (lat, lon) cho tới khi chắc chắn
+        không còn điểm nào ở vòng ngoài gần hơn điểm thứ k.
+        """
+        import numpy as np
+        with self._lock:
+            if not self._cells:
+                return [], []
+            center_row, center_col = self._cell_of(lat, lon)
+            rows = [row for row, _ in self._cells]
+            cols = [col for _, col in self._cells]
+            max_ring = max(
+                abs(center_row - min(rows)), abs(center_row - max(rows)),
+                abs(center_col - min(cols)), abs(center_col - max(cols))
+            )
+
+            candidates = []
+            ring = 0
+            while ring <= max_ring:
+                for cell in self._ring_cells(center_row, center_col, ring):
+                    candidates.extend(self._cells.get(cell, ()))
+
+                if exclude_ids:
+                    candidates = [c for c in candidates if c not in exclude_ids]
+                if len(candidates) >= k:
+                    dists = self._distances(lat, lon, candidates)
+                    kth = np.partition(dists, k - 1)[k - 1]
+                    # Mọi điểm ngoài vòng hiện tại cách ít nhất `ring` ô (theo chiều ngắn nhất của ô)
+                    cos_lat = math.cos(math.radians(min(abs(lat) + (ring + 1) * self.cell_degrees, 89.0)))
+                    if kth <= ring * self.cell_degrees * KM_PER_DEGREE * cos_lat:
+                        break
+                ring += 1
+
+            if not candidates:
+                return [], []
+            dists = self._distances(lat, lon, candidates)
+
+        order = np.argsort(dists, kind='stable')[:k]
+        return [candidates[i] for i in order], dists[order].tolist()
+
+
+class AttractionSpatialIndex(SpatialIndex):
+    """Index dùng chung cho bảng Attraction, tự dựng lại khi bị đánh dấu cũ."""
+
+    def __init__(self, cell_degrees=GEO_INDEX_CELL_DEGREES):
+        super().__init__(cell_degrees)
+        self._loaded_at = None
+        self._stale = True
+        self._uncommitted = False   # Có thay đổi đã đưa vào index nhưng chưa commit
+
+    def mark_stale(self):
+        self._stale = True
+
+    def rebuild(self):
+        """Nạp lại toàn bộ tọa độ từ DB (cần app context)."""
+        rows = db.session.query(Attraction.id, Attraction.lat, Attraction.lon).filter(
+            Attraction.lat.isnot(None), Attraction.lon.isnot(None)
+        ).all()
+        with self._lock:
+            self.clear()
+            for row in rows:
+                super().insert(row.id, row.lat, row.lon)
+            self._loaded_at = time.time()
+            self._stale = False
+        return len(rows)
+
+    def _ensure_fresh(self):
+        if self._stale or time.time() - self._loaded_at >= GEO_INDEX_MAX_AGE_SECONDS:
+            self.rebuild()
+
+    def within_radius(self, lat, lon, radius_km, exclude_ids=None):
+        self._ensure_fresh()
+        return super().within_radius(lat, lon, radius_km, exclude_ids)
+
+    def nearest(self, lat, lon, k=1, exclude_ids=None):
+        self._ensure_fresh()
+        return super().nearest(lat, lon, k, exclude_ids)
+
+
+_attraction_index = AttractionSpatialIndex()
+
+
+def get_coord_index():
+    """Index tọa độ attraction dùng chung cho toàn process."""
+    return _attraction_index
+
+
+def build_coord_index():
+    """Gọi lúc khởi động app (trong app context)."""
+    return _attraction_index.rebuild()
+
+
+# --- Giữ index đồng bộ với DB ---
+# propagate=True: áp dụng cho cả Festival, CulturalSpot (kế thừa Attraction)
+@event.listens_for(Attraction, 'after_insert', propagate=True)
+@event.listens_for(Attraction, 'after_update', propagate=True)
+def _index_upsert(mapper, connection, target):
+    if not _attraction_index._stale:
+        _attraction_index.insert(target.id, target.lat, target.lon)
+        _attraction_index._uncommitted = True
+
+
+@event.listens_for(Attraction, 'after_delete', propagate=True)
+def _index_delete(mapper, connection, target):
+    _attraction_index.remove(target.id)
+    _attraction_index._uncommitted = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _index_commit(session):
+    _attraction_index._uncommitted = False
+
+
+@event.listens_for(Session, 'after_rollback')
+def _index_rollback(session):
+    # Thay đổi đã flush nhưng bị rollback -> không biết điểm nào cần hoàn tác, dựng lại lần tới
+    if _attraction_index._uncommitted:
+        _attraction_index._uncommitted = False
+        _attraction_index.mark_stale()
@@ -0,0 +1,165 @@
+"""
+HTTP client dùng chung cho các API bên ngoài (GraphHopper, OpenWeatherMap).
+
+- 1 requests.Session duy nhất với connection pool -> không tốn TCP handshake mỗi lần gọi.
+- Timeout (connect, read) và retry có backoff cấu hình qua biến môi trường.
+- Endpoint bị lỗi kết nối sẽ bị "tạm ngắt" vài giây để các lời gọi sau
+  rơi thẳng xuống fallback thay vì chờ retry lặp lại.
+- Executor giới hạn số luồng để chạy song song các lời gọi độc lập.
+- Thống kê số lời gọi / lỗi / độ trễ theo từng endpoint và mức dùng pool.
+"""
+import os
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 20))                  # Số kết nối giữ sẵn cho mỗi host
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 10))
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 2))
+HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', 0.3))
+HTTP_MAX_WORKERS = int(os.getenv('HTTP_MAX_WORKERS', 8))               # Số request chạy song song tối đa
+HTTP_DOWN_COOLDOWN_SECONDS = float(os.getenv('HTTP_DOWN_COOLDOWN_SECONDS', 30))
+
+
+class EndpointUnavailable(requests.ConnectionError):
+    """Endpoint vừa lỗi kết nối, đang trong thời gian tạm ngắt."""
+
+
+class HttpClient:
+    def __init__(self, pool_size=HTTP_POOL_SIZE, max_retries=HTTP_MAX_RETRIES,
+                 backoff_factor=HTTP_BACKOFF_FACTOR,
+                 timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)):
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'POST']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._metrics = {}          # endpoint -> {calls, errors, totalMs, maxMs}
+        self._down_until = {}       # endpoint -> thời điểm hết tạm ngắt
+        self._in_flight = 0
+        self._peak_in_flight = 0
+
+    def _record(self, endpoint, elapsed_ms, error):
+        with self._lock:
+            m = self._metrics.setdefault(endpoint, {"calls": 0, "errors": 0, "totalMs": 0.0, "maxMs": 0.0})
+            m["calls"] += 1
+            m["errors"] += int(error)
+            m["totalMs"] += elapsed_ms
+            m["maxMs"] = max(m["maxMs"], elapsed_ms)
+
+    def request(self, method, url, endpoint=None, timeout=None, **kwargs):
+        """
+        Gửi request qua session dùng chung.
+        endpoint: tên dùng để gom thống kê (mặc định là url).
+        timeout: số giây cho phần đọc, hoặc tuple (connect, read).
+        """
+        endpoint = endpoint or url
+        if self._down_until.get(endpoint, 0) > time.time():
+            raise EndpointUnavailable(f"{endpoint} tạm ngắt sau lỗi kết nối")
+
+        if isinstance(timeout, (int, float)):
+            timeout = (min(self.timeout[0], timeout), timeout)
+
+        with self._lock:
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+
+        start = time.perf_counter()
+        error = True
+        try:
+            response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            error = response.status_code >= 400
+            return response
+        except requests.ConnectionError:
+            self._down_until[endpoint] = time.time() + HTTP_DOWN_COOLDOWN_SECONDS
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._record(endpoint, (time.perf_counter() - start) * 1000, error)
+
+    def get(self, url, endpoint=None, **kwargs):
+        return self.request('GET', url, endpoint=endpoint, **kwargs)
+
+    def post(self, url, endpoint=None, **kwargs):
+        return self.request('POST', url, endpoint=endpoint, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            endpoints = {
+                name: {
+                    "calls": m["calls"],
+                    "errors": m["errors"],
+                    "avgMs": round(m["totalMs"] / m["calls"], 1) if m["calls"] else 0.0,
+                    "maxMs": round(m["maxMs"], 1)
+                }
+                for name, m in self._metrics.items()
+            }
+            return {
+                "poolSize": self.pool_size,
+                "inFlight": self._in_flight,
+                "peakInFlight": self._peak_in_flight,
+                "endpoints": endpoints
+            }
+
+
+_shared_client = None
+_executor = None
+_shared_lock = threading.Lock()
+
+
+def get_http_client():
+    """HTTP client dùng chung cho toàn process."""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_lock:
+            if _shared_client is None:
+                _shared_client = HttpClient()
+    return _shared_client
+
+
+def get_executor():
+    """Thread pool giới hạn HTTP_MAX_WORKERS luồng cho các lời gọi HTTP độc lập."""
+    global _executor
+    if _executor is None:
+        with _shared_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=HTTP_MAX_WORKERS, thread_name_prefix='http')
+    return _executor
+
+
+def run_concurrently(func, args_list):
+    """
+    Chạy func(*args) cho từng phần tử trong args_list trên executor dùng chung,
+    trả về kết quả theo đúng thứ tự đầu vào.
+    Chỉ dùng cho hàm không cần app context của Flask (không query DB).
+    """
+    args_list = list(args_list)
+    if len(args_list) <= 1:
+        return [func(*args) for args in args_list]
+    futures = [get_executor().submit(func, *args) for args in args_list]
+    return [f.result() for f in futures]
+
+
+def get_http_stats():
+    return get_http_client().stats()
@@ -0,0 +1,204 @@
+"""
+Cache kết quả generate_smart_tour (lịch trình đã tính, chưa kèm thời tiết).
+
+- Key = id điểm đã sắp xếp + tọa độ xuất phát làm tròn (ITINERARY_CACHE_COORD_DECIMALS)
+  + thời gian bắt đầu / kết thúc + tên điểm xuất phát + "phiên bản dữ liệu".
+- Phiên bản dữ liệu lưu ở cột schema_marker.data_version, tăng trong cùng transaction
+  với thay đổi attraction / festival / cultural spot (thêm, sửa, xóa, đổi tags, đổi tên tag)
+  -> mọi worker thấy cùng 1 phiên bản, lịch trình cũ tự hết hiệu lực ở mọi process.
+  Chỉ đổi rating / số review thì không tính (không ảnh hưởng lịch trình).
+  Job ghi thẳng vào bảng (nạp demo data, ma trận khoảng cách) gọi bump_data_version().
+- Lưu dạng JSON bytes: giới hạn theo tổng số byte + số phần tử (LRU), thêm TTL để
+  route ước lượng (lúc GraphHopper lỗi) không bị giữ mãi.
+- Thời tiết không nằm trong cache: chỉ lưu ngày + tâm cụm của từng ngày,
+  mỗi request lấy thời tiết riêng rồi ghép vào (TTL thời tiết ngắn hơn nhiều).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from models import db, Attraction, SchemaMarker, Tag
+
+logger = logging.getLogger(__name__)
+
+ITINERARY_CACHE_ENABLED = os.getenv('ITINERARY_CACHE_ENABLED', '1') == '1'
+ITINERARY_CACHE_MAX_BYTES = int(os.getenv('ITINERARY_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+ITINERARY_CACHE_MAX_ENTRIES = int(os.getenv('ITINERARY_CACHE_MAX_ENTRIES', 500))
+ITINERARY_CACHE_TTL_SECONDS = int(os.getenv('ITINERARY_CACHE_TTL_SECONDS', 6 * 3600))
+ITINERARY_CACHE_COORD_DECIMALS = int(os.getenv('ITINERARY_CACHE_COORD_DECIMALS', 3))  # 3 số lẻ ~ 100m
+
+# Cột chỉ phục vụ hiển thị rating, đổi không làm lịch trình thay đổi
+RATING_ATTRIBUTES = ('average_rating', 'review_count', 'rating_sum')
+
+def get_data_version():
+    """Đọc phiên bản dữ liệu từ DB (1 dòng theo khóa chính, rẻ hơn nhiều so với tính lịch trình)."""
+    return db.session.execute(select(SchemaMarker.data_version).where(SchemaMarker.id == 1)).scalar() or 0
+
+
+def _bump_version(connection):
+    connection.execute(
+        update(SchemaMarker.__table__)
+        .where(SchemaMarker.__table__.c.id == 1)
+        .values(data_version=SchemaMarker.__table__.c.data_version + 1)
+    )
+
+
+def bump_data_version():
+    """
+    Gọi khi dữ liệu điểm đến / ma trận khoảng cách thay đổi ngoài ORM (bulk insert, job CLI...).
+    Tăng phiên bản trong transaction hiện tại của db.session và commit luôn.
+    """
+    _bump_version(db.session.connection())
+    db.session.commit()
+    return get_data_version()
+
+
+def make_itinerary_key(attraction_ids, start_lat, start_lon, start_datetime_str, end_datetime_str, start_point_name=None):
+    return json.dumps([
+        sorted(attraction_ids),
+        round(float(start_lat), ITINERARY_CACHE_COORD_DECIMALS),
+        round(float(start_lon), ITINERARY_CACHE_COORD_DECIMALS),
+        start_datetime_str, end_datetime_str, start_point_name or None,
+        get_data_version()
+    ], ensure_ascii=False)
+
+
+class ItineraryCache:
+    """LRU giới hạn theo tổng byte + số phần tử, value là JSON bytes."""
+
+    def __init__(self, max_bytes=ITINERARY_CACHE_MAX_BYTES, max_entries=ITINERARY_CACHE_MAX_ENTRIES,
+                 ttl_seconds=ITINERARY_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()   # key -> (expires_at, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Trả về bản sao mới (dict) mỗi lần, caller sửa thoải mái."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[0] < time.time():
+                self._remove(key)
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            raw = item[1]
+        return json.loads(raw)
+
+    def set(self, key, value):
+        try:
+            raw = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        except (TypeError, ValueError) as e:
+            logger.warning(f"[ItineraryCache] Không serialize được lịch trình, bỏ qua cache: {e}")
+            return False
+        if len(raw) > self.max_bytes:
+            return False    # Lịch trình quá lớn, không cache
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.time() + self.ttl_seconds, raw)
+            self._bytes += len(raw)
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def _remove(self, key):
+        item = self._entries.pop(key, None)
+        if item is not None:
+            self._bytes -= len(item[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Gọi trong app context (đọc phiên bản dữ liệu từ DB)."""
+        data_version = get_data_version()
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": round(self.hits / total, 3) if total else 0.0,
+                "dataVersion": data_version
+            }
+
+
+_itinerary_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_itinerary_cache():
+    """Cache lịch trình dùng chung cho toàn process."""
+    global _itinerary_cache
+    if _itinerary_cache is None:
+        with _cache_lock:
+            if _itinerary_cache is None:
+                _itinerary_cache = ItineraryCache()
+    return _itinerary_cache
+
+
+# --- Tăng phiên bản dữ liệu khi commit thay đổi điểm đến ---
+def _mark_changed(session):
+    session.info['itinerary_data_changed'] = True
+
+
+# propagate=True: áp dụng cho cả Festival, CulturalSpot (kế thừa Attraction)
+@event.listens_for(Attraction, 'after_insert', propagate=True)
+@event.listens_for(Attraction, 'after_delete', propagate=True)
+def _attraction_added_or_deleted(mapper, connection, target):
+    _mark_changed(inspect(target).session)
+
+
+@event.listens_for(Attraction, 'after_update', propagate=True)
+def _attraction_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[prop.key].history.has_changes()
+           for prop in state.mapper.column_attrs if prop.key not in RATING_ATTRIBUTES):
+        _mark_changed(state.session)
+
+
+@event.listens_for(Tag, 'after_update')
+def _tag_renamed(mapper, connection, target):
+    _mark_changed(inspect(target).session)
+
+
+@event.listens_for(Attraction.tags, 'append', propagate=True)
+@event.listens_for(Attraction.tags, 'remove', propagate=True)
+def _attraction_tags_changed(target, value, initiator):
+    session = Session.object_session(target)
+    if session is not None:
+        _mark_changed(session)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_in_transaction(session, flush_context):
+    # Tăng ngay trong transaction đang flush: commit thì cùng commit, rollback thì cùng hủy
+    if session.info.pop('itinerary_data_changed', False):
+        _bump_version(session.connection())
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('itinerary_data_changed', None)
@@ -0,0 +1,104 @@
+"""
+Phân trang keyset (cursor) cho các danh sách lớn dần theo thời gian: blogs, reviews, users, saved tours.
+
+- Sắp xếp theo (cột thời gian, id) -> trang sau lọc WHERE (created_at, id) < (giá trị cuối trang trước),
+  đi thẳng vào index, không OFFSET nên trang thứ 1000 cũng nhanh như trang đầu.
+- Cursor là (created_at, id) của phần tử cuối trang, mã hóa base64 JSON, client gửi lại nguyên văn.
+- Lấy limit + 1 dòng để biết còn trang sau hay không (không cần COUNT).
+- Các danh sách có từ trước (blogs, reviews, saved tours, users): request không gửi limit lẫn cursor
+  vẫn nhận toàn bộ danh sách như API cũ (limit = None), client cũ không bị cắt mất dữ liệu.
+"""
+import base64
+import binascii
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 20))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 100))
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Giải mã cursor thành list giá trị theo kiểu của từng cột. Sai thì raise ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("cursor không hợp lệ")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("cursor không hợp lệ")
+
+    decoded = []
+    for column, value in zip(columns, values):
+        try:
+            if column.type.python_type is datetime:
+                value = datetime.fromisoformat(value) if value is not None else None
+            elif value is not None:
+                value = column.type.python_type(value)
+        except (TypeError, ValueError):
+            raise ValueError("cursor không hợp lệ")
+        decoded.append(value)
+    return decoded
+
+
+def parse_page_args(args, default_limit=DEFAULT_PAGE_SIZE):
+    """
+    Đọc limit / cursor từ query string (request.args). Sai thì raise ValueError.
+    default_limit=None: không gửi limit lẫn cursor thì trả về (None, None) = lấy toàn bộ (API cũ);
+    chỉ gửi cursor thì dùng DEFAULT_PAGE_SIZE.
+    """
+    cursor = args.get('cursor') or None
+    if 'limit' not in args:
+        if default_limit is None and cursor is None:
+            return None, None
+        return min(default_limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE), cursor
+    try:
+        limit = int(args.get('limit'))
+    except (TypeError, ValueError):
+        raise ValueError("limit phải là số nguyên")
+    if limit <= 0:
+        raise ValueError("limit phải lớn hơn 0")
+    return min(limit, MAX_PAGE_SIZE), cursor
+
+
+def keyset_page(query, columns, limit=DEFAULT_PAGE_SIZE, cursor=None, descending=True):
+    """
+    Trả về (items, next_cursor) của 1 trang.
+    columns: các cột sắp xếp, cột cuối phải là khóa chính để thứ tự không bị trùng
+    (VD (Blog.created_at, Blog.blog_id)). next_cursor = None khi đã hết.
+    limit=None: lấy toàn bộ (cùng thứ tự), next_cursor = None.
+    """
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        if any(v is None for v in values):
+            raise ValueError("cursor không hợp lệ")
+        key = tuple_(*columns)
+        query = query.filter(key < tuple_(*values) if descending else key > tuple_(*values))
+
+    order = [c.desc() if descending else c.asc() for c in columns]
+    if limit is None:
+        return query.order_by(*order).all(), None
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+    return items, next_cursor
+
+
+def page_json(next_cursor, limit):
+    """Phần phân trang gắn vào response: {"data": [...], **page_json(next_cursor, limit)}."""
+    return {
+        "limit": limit,
+        "nextCursor": next_cursor,
+        "hasMore": next_cursor is not None
+    }
@@ -0,0 +1,306 @@
+"""
+Cache response cho các endpoint GET đọc nhiều, ít thay đổi
+(/api/tour-packages, /api/blogs, /api/attraction/<id>, /api/search...).
+
+- Key = path + query string đã chuẩn hóa (sắp xếp tham số) + "thế hệ" của các tag.
+  Ghi DB gọi invalidate_cache('tag') -> tăng thế hệ của tag đó,
+  mọi response cũ gắn tag không còn được tra tới (tự bị đẩy ra theo LRU / TTL).
+- Backend: RAM (LRU + TTL) mặc định, hoặc Redis nếu đặt RESPONSE_CACHE_REDIS_URL
+  (cần cài gói `redis`; không kết nối được thì quay về RAM).
+  Với RAM, response nằm riêng từng worker nhưng thế hệ tag lưu trong DB (bảng cache_generation):
+  worker nhận request ghi tăng thế hệ -> các worker khác cũng không trả response cũ nữa
+  (đổi lại mỗi GET có cache tốn 1 query nhỏ theo khóa chính).
+- Hỗ trợ ETag / If-None-Match (trả 304), header X-Cache: HIT / MISS.
+- Chỉ cache response 200 của GET.
+"""
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, make_response, request
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, CacheGeneration
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', '1') == '1'
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv('RESPONSE_CACHE_TTL_SECONDS', 60))
+RESPONSE_CACHE_REDIS_URL = os.getenv('RESPONSE_CACHE_REDIS_URL', '')
+REDIS_KEY_PREFIX = 'respcache:'
+
+
+class CachedResponse:
+    __slots__ = ('body', 'status', 'content_type', 'etag')
+
+    def __init__(self, body, status, content_type, etag):
+        self.body = body
+        self.status = status
+        self.content_type = content_type
+        self.etag = etag
+
+    def to_json(self):
+        return json.dumps({
+            "body": self.body.decode('utf-8'), "status": self.status,
+            "contentType": self.content_type, "etag": self.etag
+        })
+
+    @classmethod
+    def from_json(cls, raw):
+        data = json.loads(raw)
+        return cls(data["body"].encode('utf-8'), data["status"], data["contentType"], data["etag"])
+
+
+class MemoryBackend:
+    """LRU + TTL trong RAM của process, thế hệ tag lưu trong DB (dùng chung giữa các worker)."""
+    name = 'memory'
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (expires_at, CachedResponse)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, entry, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def generations(self, tags):
+        if not tags:
+            return []
+        rows = dict(db.session.query(CacheGeneration.tag, CacheGeneration.generation)
+                    .filter(CacheGeneration.tag.in_(tags)))
+        return [rows.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        """Gọi sau khi đã commit thay đổi: tăng thế hệ trong 1 transaction riêng."""
+        table = CacheGeneration.__table__
+        try:
+            for tag in tags:
+                updated = db.session.execute(
+                    update(table).where(table.c.tag == tag).values(generation=table.c.generation + 1)
+                ).rowcount
+                if not updated:
+                    db.session.add(CacheGeneration(tag=tag, generation=1))
+                    db.session.flush()
+            db.session.commit()
+        except IntegrityError:
+            # Worker khác vừa tạo dòng của tag -> chạy lại, lần này chỉ cần UPDATE
+            db.session.rollback()
+            self.bump(tags)
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Redis (hoặc server tương thích) dùng chung giữa các worker."""
+    name = 'redis'
+
+    def __init__(self, url):
+        import redis    # Phụ thuộc tùy chọn, chỉ cần khi đặt RESPONSE_CACHE_REDIS_URL
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._client.ping()
+        self.evictions = 0
+
+    def get(self, key):
+        raw = self._client.get(REDIS_KEY_PREFIX + key)
+        return CachedResponse.from_json(raw) if raw is not None else None
+
+    def set(self, key, entry, ttl):
+        self._client.set(REDIS_KEY_PREFIX + key, entry.to_json(), ex=ttl)
+
+    def generations(self, tags):
+        if not tags:
+            return []
+        values = self._client.mget([f"{REDIS_KEY_PREFIX}gen:{tag}" for tag in tags])
+        return [int(v) if v is not None else 0 for v in values]
+
+    def bump(self, tags):
+        pipe = self._client.pipeline()
+        for tag in tags:
+            pipe.incr(f"{REDIS_KEY_PREFIX}gen:{tag}")
+        pipe.execute()
+
+    def clear(self):
+        for key in self._client.scan_iter(f"{REDIS_KEY_PREFIX}*"):
+            self._client.delete(key)
+
+    def __len__(self):
+        # Chỉ đếm response của cache này (DB Redis có thể dùng chung), bỏ qua khóa gen:<tag>
+        generation_prefix = f"{REDIS_KEY_PREFIX}gen:".encode('utf-8')
+        return sum(
+            1 for key in self._client.scan_iter(match=f"{REDIS_KEY_PREFIX}*", count=1000)
+            if not key.startswith(generation_prefix)
+        )
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._stats = {}    # endpoint -> {hits, misses, notModified}
+        self.invalidations = 0
+
+    def make_key(self, path, args, tags):
+        query = '&'.join(f"{k}={v.strip()}" for k, v in sorted(args.items(multi=True)))
+        generations = self.backend.generations(tags)
+        version = ','.join(f"{tag}@{gen}" for tag, gen in zip(tags, generations))
+        return f"{path}?{query}|{version}"
+
+    def get(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"[ResponseCache] Lỗi đọc cache: {e}")
+            return None
+
+    def set(self, key, entry, ttl=None):
+        try:
+            self.backend.set(key, entry, ttl or self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"[ResponseCache] Lỗi ghi cache: {e}")
+
+    def invalidate(self, *tags):
+        try:
+            self.backend.bump(tags)
+        except Exception as e:
+            logger.warning(f"[ResponseCache] Lỗi xóa cache {tags}: {e}")
+        with self._lock:
+            self.invalidations += 1
+
+    def record(self, endpoint, result):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {"hits": 0, "misses": 0, "notModified": 0})
+            stats[result] += 1
+
+    def stats(self):
+        with self._lock:
+            endpoints = {name: dict(s) for name, s in self._stats.items()}
+            hits = sum(s["hits"] for s in endpoints.values())
+            misses = sum(s["misses"] for s in endpoints.values())
+            try:
+                entries = len(self.backend)
+            except Exception:
+                entries = -1
+            return {
+                "backend": self.backend.name,
+                "entries": entries,
+                "evictions": self.backend.evictions,
+                "invalidations": self.invalidations,
+                "hits": hits,
+                "misses": misses,
+                "hitRate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+                "endpoints": endpoints
+            }
+
+
+_response_cache = None
+_cache_lock = threading.Lock()
+
+
+def _create_backend():
+    if RESPONSE_CACHE_REDIS_URL:
+        try:
+            return RedisBackend(RESPONSE_CACHE_REDIS_URL)
+        except Exception as e:
+            logger.warning(f"[ResponseCache] Không dùng được Redis ({e}), chuyển sang cache RAM.")
+    return MemoryBackend()
+
+
+def get_response_cache():
+    """Cache response dùng chung cho toàn process."""
+    global _response_cache
+    if _response_cache is None:
+        with _cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(_create_backend())
+    return _response_cache
+
+
+def invalidate_cache(*tags):
+    """Gọi sau khi commit thay đổi làm response gắn các tag này bị cũ."""
+    if RESPONSE_CACHE_ENABLED:
+        get_response_cache().invalidate(*tags)
+
+
+def _etag_matches(etag):
+    header = request.headers.get('If-None-Match', '')
+    return header.strip() == '*' or etag in [t.strip().removeprefix('W/') for t in header.split(',')]
+
+
+def _build_response(entry, cache_status):
+    if _etag_matches(entry.etag):
+        response = Response(status=304)
+    else:
+        response = Response(entry.body, status=entry.status, content_type=entry.content_type)
+    response.headers['ETag'] = entry.etag
+    response.headers['X-Cache'] = cache_status
+    return response
+
+
+def cached_response(*tags, ttl=None, skip_if_authenticated=False):
+    """
+    Decorator cho view GET.
+    tags: tên tag để xóa cache, có thể chứa tham số route, VD 'attraction:{attraction_id}'.
+    skip_if_authenticated: không cache request có header Authorization
+                           (response phụ thuộc user lấy từ JWT).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if (not RESPONSE_CACHE_ENABLED or request.method != 'GET'
+                    or (skip_if_authenticated and request.headers.get('Authorization'))):
+                return view(*args, **kwargs)
+
+            cache = get_response_cache()
+            key = cache.make_key(request.path, request.args, [t.format(**kwargs) for t in tags])
+            entry = cache.get(key)
+            if entry is not None:
+                cache.record(request.endpoint, "hits")
+                if _etag_matches(entry.etag):
+                    cache.record(request.endpoint, "notModified")
+                return _build_response(entry, 'HIT')
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.direct_passthrough:
+                return response
+
+            body = response.get_data()
+            entry = CachedResponse(body, response.status_code, response.content_type,
+                                   '"' + hashlib.sha1(body).hexdigest()[:20] + '"')
+            cache.set(key, entry, ttl)
+            cache.record(request.endpoint, "misses")
+            return _build_response(entry, 'MISS')
+        return wrapper
+    return decorator
@@ -0,0 +1,257 @@
+"""
+Cache route dùng chung cho toàn bộ process (RAM) + lưu xuống đĩa (SQLite).
+
+- RAM: LRU có giới hạn số phần tử + TTL cho từng route.
+- Đĩa: file SQLite để route đã tính không mất khi restart server,
+  các worker khác nhau cũng đọc được của nhau.
+- Giữ interface giống dict (`in`, `[]`, `get`, `len`) để các hàm
+  đang nhận tham số `cache` trong tour_service dùng được luôn.
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'route_cache.sqlite')
+
+ROUTE_CACHE_PATH = os.getenv('ROUTE_CACHE_PATH', DEFAULT_DB_PATH)
+ROUTE_CACHE_MAX_ENTRIES = int(os.getenv('ROUTE_CACHE_MAX_ENTRIES', 5000))     # Số route tối đa giữ trong RAM
+ROUTE_CACHE_TTL_SECONDS = int(os.getenv('ROUTE_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+ROUTE_CACHE_WARM_ON_STARTUP = os.getenv('ROUTE_CACHE_WARM_ON_STARTUP', '0') == '1'
+ROUTE_CACHE_FLUSH_EVERY = 200                                                 # Gom bao nhiêu route thì ghi xuống đĩa 1 lần
+
+
+class RouteCache:
+    """
+    Cache route 2 tầng: RAM (LRU + TTL) -> SQLite.
+    Key là tuple trả về từ _route_cache_key, value là
+    (distance_km, duration_min, geometry, mode).
+    """
+
+    def __init__(self, db_path=None, max_entries=ROUTE_CACHE_MAX_ENTRIES, ttl_seconds=ROUTE_CACHE_TTL_SECONDS):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._pending = {}              # key -> (expires_at, value) chờ ghi xuống đĩa
+        self._lock = threading.RLock()
+        self._conn = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ------------------------------------------------------------------
+    # Tầng đĩa
+    # ------------------------------------------------------------------
+    def _get_conn(self):
+        if not self.db_path:
+            return None
+        if self._conn is None:
+            try:
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+                conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS route_cache (
+                        k TEXT PRIMARY KEY,
+                        distance_km REAL,
+                        duration_min REAL,
+                        geometry TEXT,
+                        mode TEXT,
+                        expires_at REAL
+                    )
+                """)
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.warning(f"[RouteCache] Không mở được file cache {self.db_path}: {e}. Chỉ dùng cache RAM.")
+                self.db_path = None
+                return None
+        return self._conn
+
+    @staticmethod
+    def _encode_key(key):
+        return ','.join(str(part) for part in key)
+
+    @staticmethod
+    def _decode_key(raw):
+        return tuple(float(part) for part in raw.split(','))
+
+    def _load_from_disk(self, key):
+        conn = self._get_conn()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT distance_km, duration_min, geometry, mode, expires_at FROM route_cache WHERE k = ?",
+                (self._encode_key(key),)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"[RouteCache] Lỗi đọc cache: {e}")
+            return None
+
+        if not row or row[4] < time.time():
+            return None
+        dist, mins, geometry, mode, expires_at = row
+        value = (dist, int(mins) if mins == int(mins) else mins, json.loads(geometry) if geometry else None, mode)
+        return expires_at, value
+
+    def flush(self):
+        """Ghi các route mới xuống SQLite (1 transaction)."""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            conn = self._get_conn()
+            if conn is None:
+                return
+            rows = [
+                (self._encode_key(k), v[0], v[1], json.dumps(v[2]) if v[2] else None, v[3], expires_at)
+                for k, (expires_at, v) in pending.items()
+            ]
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO route_cache (k, distance_km, duration_min, geometry, mode, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"[RouteCache] Lỗi ghi cache xuống đĩa: {e}")
+
+    def warm(self, limit=None):
+        """
+        Nạp trước các route còn hạn từ đĩa lên RAM (gọi lúc khởi động app).
+        Đồng thời dọn các route đã hết hạn trong file.
+        """
+        conn = self._get_conn()
+        if conn is None:
+            return 0
+        limit = limit or self.max_entries
+        now = time.time()
+        try:
+            conn.execute("DELETE FROM route_cache WHERE expires_at < ?", (now,))
+            conn.commit()
+            rows = conn.execute(
+                "SELECT k, distance_km, duration_min, geometry, mode, expires_at FROM route_cache "
+                "ORDER BY expires_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"[RouteCache] Lỗi warm cache: {e}")
+            return 0
+
+        with self._lock:
+            # Đọc theo thứ tự mới -> cũ, đưa lên RAM theo thứ tự cũ -> mới để LRU giữ route mới nhất
+            for k, dist, mins, geometry, mode, expires_at in reversed(rows):
+                value = (dist, int(mins) if mins == int(mins) else mins, json.loads(geometry) if geometry else None, mode)
+                self._store(self._decode_key(k), expires_at, value)
+        logger.info(f"[RouteCache] Đã nạp {len(rows)} route từ {self.db_path}")
+        return len(rows)
+
+    # ------------------------------------------------------------------
+    # Tầng RAM
+    # ------------------------------------------------------------------
+    def _store(self, key, expires_at, value):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at >= time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            item = self._pending.get(key) or self._load_from_disk(key)
+            if item is not None:
+                self._store(key, *item)
+                self.disk_hits += 1
+                return item[1]
+
+            self.misses += 1
+            return default
+
+    def set(self, key, value, persist=True):
+        """
+        Lưu route vào cache.
+        persist=False: chỉ giữ trong RAM (VD: route ước lượng đường chim bay
+        khi GraphHopper lỗi, không nên lưu lâu dài xuống đĩa).
+        """
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store(key, expires_at, value)
+            if persist and self.db_path:
+                self._pending[key] = (expires_at, value)
+                if len(self._pending) >= ROUTE_CACHE_FLUSH_EVERY:
+                    self.flush()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+
+    def stats(self):
+        total = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "diskHits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hitRate": round((self.hits + self.disk_hits) / total, 3) if total else 0.0
+        }
+
+    # Interface kiểu dict để tương thích với code cũ dùng `route_cache = {}`
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_shared_route_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_route_cache():
+    """Cache route dùng chung cho mọi request trong process."""
+    global _shared_route_cache
+    if _shared_route_cache is None:
+        with _shared_lock:
+            if _shared_route_cache is None:
+                _shared_route_cache = RouteCache(db_path=ROUTE_CACHE_PATH)
+                # Ghi nốt các route chưa flush khi process tắt
+                atexit.register(_shared_route_cache.flush)
+    return _shared_route_cache
+
+
+def warm_route_cache():
+    """Gọi khi khởi động app nếu bật ROUTE_CACHE_WARM_ON_STARTUP=1."""
+    return get_shared_route_cache().warm()
@@ -0,0 +1,339 @@
+"""
+Tính route / thời gian di chuyển giữa 2 điểm (GraphHopper, đường bay, ước lượng đường chim bay)
+kèm cache route, tách khỏi tour_service để module khác (search, ma trận khoảng cách...)
+dùng được mà không phải nạp các thư viện nặng của phần tạo tour.
+"""
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from .route_cache import RouteCache, get_shared_route_cache
+from .http_client import get_http_client, run_concurrently
+from .geo_index import SpatialIndex
+
+load_dotenv()
+GRAPHHOPPER_API_KEY = os.getenv('GRAPHHOPPER_API_KEY')
+GRAPHHOPPER_MATRIX_URL = os.getenv('GRAPHHOPPER_MATRIX_URL', 'http://localhost:8989/matrix')
+
+FLIGHT_THRESHOLD_KM = 400      # Xa hơn ngưỡng này thì tính đường bay
+MATRIX_BATCH_SIZE = 50         # Số điểm tối đa mỗi chiều trong 1 request Matrix API
+# Mode của cặp điểm chỉ ước lượng đường chim bay (GraphHopper lỗi / không tìm được đường):
+# vẫn dùng được khi tạo tour, nhưng job tính sẵn (ma trận khoảng cách, nearby) phải tính lại lần sau
+ESTIMATED_MODE = "estimated"
+
+logger = logging.getLogger(__name__)
+
+
+def geodesic_km(coord_start, coord_end):
+    # Nạp geopy khi cần lần đầu (geopy kéo theo toàn bộ geocoders, ~0.1s lúc import)
+    from geopy.distance import geodesic
+    return geodesic(coord_start, coord_end).km
+
+
+# Danh sách các sân bay lớn tại Việt Nam (Tên, Lat, Lon)
+VIETNAM_AIRPORTS = {
+    "SGN": {"name": "Sân bay Tân Sơn Nhất (HCM)", "lat": 10.818463, "lon": 106.658825},
+    "HAN": {"name": "Sân bay Nội Bài (Hà Nội)", "lat": 21.218715, "lon": 105.804171},
+    "DAD": {"name": "Sân bay Đà Nẵng", "lat": 16.053813, "lon": 108.204041},
+    "CXR": {"name": "Sân bay Cam Ranh (Khánh Hòa)", "lat": 11.998183, "lon": 109.219373},
+    "PQC": {"name": "Sân bay Phú Quốc", "lat": 10.158092, "lon": 103.993931},
+    "HPH": {"name": "Sân bay Cát Bi (Hải Phòng)", "lat": 20.819262, "lon": 106.724836},
+    "VCA": {"name": "Sân bay Cần Thơ", "lat": 10.082729, "lon": 105.712170},
+    "HUI": {"name": "Sân bay Phú Bài (Huế)", "lat": 16.400557, "lon": 107.697042},
+    "VII": {"name": "Sân bay Vinh (Nghệ An)", "lat": 18.730302, "lon": 105.677322},
+}
+
+# Sân bay thưa nên dùng ô lưới lớn (1 độ)
+_AIRPORT_INDEX = SpatialIndex(cell_degrees=1.0)
+for _code, _info in VIETNAM_AIRPORTS.items():
+    _AIRPORT_INDEX.insert(_code, _info['lat'], _info['lon'])
+
+def find_nearest_airport(lat, lon):
+    """Tìm sân bay gần nhất"""
+    codes, dists = _AIRPORT_INDEX.nearest(lat, lon, k=1)
+    return VIETNAM_AIRPORTS[codes[0]], dists[0]
+
+def _get_road_segment(coord_start, coord_end, vehicle='car'):
+    """
+    Gọi GraphHopper để lấy đường đi bộ chi tiết giữa 2 điểm ngắn.
+    Trả về: (distance_km, duration_min, list_of_coordinates, estimated)
+    estimated = True khi GraphHopper lỗi và phải ước lượng đường chim bay.
+    """
+    base_url = "http://localhost:8989/route"
+    params = {
+        'point': [f"{coord_start[0]},{coord_start[1]}", f"{coord_end[0]},{coord_end[1]}"],
+        'profile': vehicle,
+        'locale': 'vi',
+        'points_encoded': 'false',
+        'calc_points': 'true',
+        'type': 'json'
+    }
+
+    try:
+        response = get_http_client().get(base_url, endpoint='graphhopper.route', params=params, timeout=5)
+        if response.status_code == 200:
+            data = response.json()
+            if 'paths' in data and len(data['paths']) > 0:
+                path = data['paths'][0]
+                dist = round(path['distance'] / 1000, 2)
+                mins = round(path['time'] / 60000)
+                coords = path['points']['coordinates']
+                return dist, mins, coords, False
+    except Exception as e:
+        print(f"[GraphHopper Internal Error] {e}")
+
+    # Fallback: Đường thẳng nếu GraphHopper lỗi
+    dist, mins = _estimate_road_segment(coord_start, coord_end)
+    # GeoJSON format: [lon, lat]
+    coords = [[coord_start[1], coord_start[0]], [coord_end[1], coord_end[0]]]
+    return dist, mins, coords, True
+
+def _estimate_road_segment(coord_start, coord_end):
+    """Ước lượng (distance_km, duration_min) theo đường chim bay khi không gọi được GraphHopper."""
+    dist = geodesic_km(coord_start, coord_end)
+    speed = 30 if dist < 5 else 40
+    mins = round((dist / speed) * 60)
+    return round(dist, 2), mins
+
+def _get_road_matrix(origins, destinations, vehicle='car'):
+    """
+    Gọi GraphHopper Matrix API: 1 request cho N điểm đi x M điểm đến.
+    Trả về ma trận [[(distance_km, duration_min) | None, ...], ...] theo thứ tự origins x destinations,
+    hoặc None nếu API lỗi (cặp không tìm được đường cũng là None).
+    """
+    payload = {
+        # Matrix API nhận tọa độ dạng [lon, lat]
+        'from_points': [[lon, lat] for lat, lon in origins],
+        'to_points': [[lon, lat] for lat, lon in destinations],
+        'out_arrays': ['distances', 'times'],
+        'profile': vehicle,
+        'fail_fast': False
+    }
+
+    try:
+        response = get_http_client().post(GRAPHHOPPER_MATRIX_URL, endpoint='graphhopper.matrix', json=payload, timeout=10)
+        if response.status_code == 200:
+            data = response.json()
+            distances, times = data.get('distances'), data.get('times')
+            if distances and times:
+                result = []
+                for dist_row, time_row in zip(distances, times):
+                    result.append([
+                        (round(d / 1000, 2), round(t / 60)) if d is not None and t is not None else None
+                        for d, t in zip(dist_row, time_row)
+                    ])
+                return result
+        else:
+            print(f"[GraphHopper Matrix Error] Status: {response.status_code}")
+    except Exception as e:
+        print(f"[GraphHopper Matrix Internal Error] {e}")
+    return None
+
+def get_routing_info(coord_start, coord_end, vehicle='car'):
+    """
+    Thông minh:
+    - Nếu đi máy bay: Tính đường bộ ra sân bay + bay + đường bộ về đích.
+    - Kết hợp đường đi chi tiết cho các chặng đường bộ.
+    - Đường bộ mà GraphHopper lỗi (ước lượng đường chim bay): mode = ESTIMATED_MODE.
+    """
+    # 1. Tính khoảng cách đường chim bay tổng thể
+    dist_straight = geodesic_km(coord_start, coord_end)
+    
+    # 2. LOGIC MÁY BAY (Nếu xa hơn 400km)
+    if dist_straight > FLIGHT_THRESHOLD_KM:
+        # A. Tìm sân bay
+        airport_start, dist_to_start_airport = find_nearest_airport(coord_start[0], coord_start[1])
+        airport_end, dist_from_end_airport = find_nearest_airport(coord_end[0], coord_end[1])
+        
+        print(f"[Smart Route] Kết hợp: {airport_start['name']} -> {airport_end['name']}")
+        
+        # B. Tính toán 3 chặng
+        # Chặng 1: Điểm đi -> Sân bay đi (Đường bộ chi tiết)
+        d1, t1, coords1, _ = _get_road_segment(coord_start, (airport_start['lat'], airport_start['lon']))
+        
+        # Chặng 2: Bay (Đường thẳng)
+        flight_dist = geodesic_km((airport_start['lat'], airport_start['lon']),
+                                  (airport_end['lat'], airport_end['lon']))
+        t2 = (flight_dist / 800) * 60 # Giả định bay 800km/h
+        # Tạo đường thẳng bay (2 điểm)
+        coords2 = [
+            [airport_start['lon'], airport_start['lat']], 
+            [airport_end['lon'], airport_end['lat']]
+        ]
+
+        # Chặng 3: Sân bay đến -> Điểm đến (Đường bộ chi tiết)
+        d3, t3, coords3, _ = _get_road_segment((airport_end['lat'], airport_end['lon']), coord_end)
+
+        # C. Tổng hợp
+        total_dist = round(d1 + flight_dist + d3, 2)
+        # Thời gian = Đi xe 1 + Bay + Đi xe 3 + 120p thủ tục
+        total_time = int(t1 + t2 + t3 + 120) 
+        
+        # Nối 3 đoạn đường lại thành 1 danh sách tọa độ duy nhất
+        # coords1 + coords2 + coords3
+        full_coordinates = coords1 + coords2 + coords3
+
+        geometry = {
+            'type': 'LineString',
+            'coordinates': full_coordinates
+        }
+        
+        route_desc = f"plane:{airport_start['name']}-{airport_end['name']}"
+        return total_dist, total_time, geometry, route_desc
+
+    # 3. LOGIC XE (Gần < 400km) - Gọi hàm helper trực tiếp
+    dist, mins, coords, estimated = _get_road_segment(coord_start, coord_end, vehicle)
+    
+    geometry = {
+        'type': 'LineString',
+        'coordinates': coords
+    }
+    return dist, mins, geometry, ESTIMATED_MODE if estimated else "car"
+
+def _route_cache_key(coord_start, coord_end):
+    return (
+        round(coord_start[0], 5), round(coord_start[1], 5),
+        round(coord_end[0], 5), round(coord_end[1], 5)
+    )
+
+
+def get_route_with_cache(coord_start, coord_end, cache=None):
+    """
+    Lấy route giữa 2 điểm, ưu tiên đọc từ cache.
+    cache=None -> dùng cache dùng chung cho toàn process (RAM + SQLite).
+    """
+    if cache is None:
+        cache = get_shared_route_cache()
+
+    key = _route_cache_key(coord_start, coord_end)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    # Hứng 4 giá trị từ API/Hàm tính toán
+    distance_km, duration_min, geometry, mode = get_routing_info(coord_start, coord_end)
+    # Route ước lượng (GraphHopper lỗi) không lưu xuống cache đĩa
+    persist = mode != ESTIMATED_MODE
+
+    # Lưu chiều xuôi vào cache
+    value = (distance_km, duration_min, geometry, mode)
+    _cache_set(cache, key, value, persist)
+
+    # Xử lý cache chiều ngược
+    reverse_key = _route_cache_key(coord_end, coord_start)
+    
+    reversed_geometry = None
+    if geometry and 'coordinates' in geometry:
+        reversed_geometry = {
+            'type': geometry['type'],
+            'coordinates': list(reversed(geometry['coordinates']))
+        }
+    
+    # Logic đảo ngược tên sân bay cho biến mode
+    reverse_mode = mode
+    if isinstance(mode, str) and mode.startswith('plane:'):
+        try:
+            prefix, names = mode.split(':', 1)
+            airport_start, airport_end = names.split('-')
+            reverse_mode = f"{prefix}:{airport_end}-{airport_start}"
+        except ValueError:
+            pass
+            
+    _cache_set(cache, reverse_key, (distance_km, duration_min, reversed_geometry, reverse_mode), persist)
+    
+    return value
+
+
+def _cache_set(cache, key, value, persist=True):
+    # Hỗ trợ cả dict thường lẫn RouteCache
+    if isinstance(cache, RouteCache):
+        cache.set(key, value, persist=persist)
+    else:
+        cache[key] = value
+
+def get_travel_time(coord_start, coord_end, cache=None, matrix=None):
+    """
+    Chỉ lấy (distance_km, duration_min, mode), không cần geometry.
+    Ưu tiên ma trận khoảng cách tính sẵn, thiếu mới gọi routing (qua cache).
+    Route chỉ là ước lượng đường chim bay thì mode = ESTIMATED_MODE.
+    """
+    if matrix:
+        hit = matrix.get(_route_cache_key(coord_start, coord_end))
+        if hit is not None:
+            return hit
+    dist, mins, _, mode = get_route_with_cache(coord_start, coord_end, cache)
+    return dist, mins, mode
+
+
+def prefetch_travel_matrix(origins, destinations, cache=None, matrix=None):
+    """
+    Điền (distance_km, duration_min, mode) cho mọi cặp origins x destinations vào `matrix`
+    bằng ít request nhất: gom các cặp còn thiếu thành lô gửi Matrix API
+    thay vì gọi /route cho từng cặp.
+    - Cặp đã có trong matrix hoặc route cache -> dùng lại.
+    - Cặp xa (> FLIGHT_THRESHOLD_KM) -> get_route_with_cache (logic máy bay).
+    - Matrix API lỗi / ô trống -> ước lượng đường chim bay như _get_road_segment, mode = ESTIMATED_MODE.
+    Các lô và các cặp đi máy bay độc lập nhau nên được gọi song song.
+    Trả về chính dict `matrix` (tạo mới nếu None).
+    """
+    if matrix is None:
+        matrix = {}
+    if cache is None:
+        cache = get_shared_route_cache()
+
+    missing_origins, missing_destinations = {}, {}
+    flight_pairs = {}
+    for start in origins:
+        for end in destinations:
+            key = _route_cache_key(start, end)
+            if key[:2] == key[2:] or key in matrix:
+                continue
+
+            cached = cache.get(key)
+            if cached is not None:
+                matrix[key] = (cached[0], cached[1], cached[3])
+            elif geodesic_km(start, end) > FLIGHT_THRESHOLD_KM:
+                flight_pairs[key] = (start, end)
+            else:
+                missing_origins[key[:2]] = start
+                missing_destinations[key[2:]] = end
+
+    if flight_pairs:
+        # Mỗi cặp chỉ cần tính 1 chiều, chiều ngược get_route_with_cache đã lưu sẵn vào cache
+        unique_pairs = {}
+        for key, (start, end) in flight_pairs.items():
+            if key[2:] + key[:2] not in unique_pairs:
+                unique_pairs[key] = (start, end, cache)
+        run_concurrently(get_route_with_cache, unique_pairs.values())
+
+        for key, (start, end) in flight_pairs.items():
+            dist, mins, _, mode = get_route_with_cache(start, end, cache)
+            matrix[key] = (dist, mins, mode)
+
+    if not missing_origins:
+        return matrix
+
+    origin_list = list(missing_origins.values())
+    destination_list = list(missing_destinations.values())
+    blocks = [
+        (origin_list[i:i + MATRIX_BATCH_SIZE], destination_list[j:j + MATRIX_BATCH_SIZE])
+        for i in range(0, len(origin_list), MATRIX_BATCH_SIZE)
+        for j in range(0, len(destination_list), MATRIX_BATCH_SIZE)
+    ]
+    results = run_concurrently(_get_road_matrix, blocks)
+
+    for (origin_chunk, destination_chunk), result in zip(blocks, results):
+        for oi, start in enumerate(origin_chunk):
+            for di, end in enumerate(destination_chunk):
+                key = _route_cache_key(start, end)
+                if key[:2] == key[2:] or key in matrix:
+                    continue
+                cell = result[oi][di] if result else None
+                if cell:
+                    matrix[key] = (cell[0], cell[1], "car")
+                else:
+                    matrix[key] = (*_estimate_road_segment(start, end), ESTIMATED_MODE)
+
+    logger.debug(f"[Matrix] {len(origin_list)}x{len(destination_list)} điểm trong {len(blocks)} request")
+    return matrix
@@ -1,8 +1,10 @@
-from models import db, SavedTour, Attraction, User
+from models import db, SavedTour, Attraction, User, TourJob, tour_attractions
+from .pagination import DEFAULT_PAGE_SIZE, keyset_page
 
-def save_tour_service(user_id, tour_name, attraction_ids, start_date=None, end_date=None, start_lat=None, start_lon=None, start_point_name=None):
+def save_tour_service(user_id, tour_name, attraction_ids, start_date=None, end_date=None, start_lat=None, start_lon=None, start_point_name=None, tour_job_id=None):
     """
     Service để lưu tour mới
+    tour_job_id: job đã tạo lịch trình (/api/tour-jobs), lưu lại để mở tour không cần tính lại
     """
     # Validation
     if not user_id:
@@ -32,6 +34,9 @@ def save_tour_service(user_id, tour_name, attraction_ids, start_date=None, end_d
     attractions = Attraction.query.filter(Attraction.id.in_(unique_attraction_ids)).all()
     if len(attractions) != len(unique_attraction_ids):
         raise ValueError("Một số attraction không tồn tại")
+
+    if tour_job_id and not db.session.get(TourJob, tour_job_id):
+        raise LookupError(f"Không tìm thấy job {tour_job_id}")
     
     new_tour = SavedTour(
         user_id=user_id, 
@@ -40,7 +45,8 @@ def save_tour_service(user_id, tour_name, attraction_ids, start_date=None, end_d
         end_date=end_date,
         start_lat=start_lat,
         start_lon=start_lon,
-        start_point_name=start_point_name 
+        start_point_name=start_point_name,
+        tour_job_id=tour_job_id or None
     )
     db.session.add(new_tour)
     
@@ -54,7 +60,8 @@ def save_tour_service(user_id, tour_name, attraction_ids, start_date=None, end_d
         "tour_name": new_tour.tour_name,
         "created_at": new_tour.created_at.isoformat(),
         "user_id": new_tour.user_id,
-        "attraction_count": len(attractions)
+        "attraction_count": len(attractions),
+        "tourJobId": new_tour.tour_job_id
     }
 
 def unsave_tour_service(user_id, tour_id):
@@ -78,9 +85,14 @@ def unsave_tour_service(user_id, tour_id):
     
     return tour_name
 
-def get_saved_tours_service(user_id):
+def count_saved_tours(user_id):
+    """Tổng số tour đã lưu của user (không phụ thuộc trang đang xem)."""
+    return SavedTour.query.filter_by(user_id=user_id).count()
+
+def get_saved_tours_service(user_id, limit=DEFAULT_PAGE_SIZE, cursor=None):
     """
-    Service để lấy danh sách tours đã lưu của user
+    Service để lấy 1 trang tours đã lưu của user (mới nhất trước).
+    Trả về (tours_data, next_cursor), next_cursor = None khi hết.
     """
     if not user_id:
         raise ValueError("userId là bắt buộc")
@@ -90,19 +102,32 @@ def get_saved_tours_service(user_id):
     if not user:
         raise LookupError("Không tìm thấy user")
     
-    # Lấy danh sách tours đã lưu
-    saved_tours = SavedTour.query.filter_by(user_id=user_id)\
-        .order_by(SavedTour.created_at.desc()).all()
-    
+    # Lấy 1 trang tours đã lưu
+    saved_tours, next_cursor = keyset_page(
+        SavedTour.query.filter_by(user_id=user_id),
+        (SavedTour.created_at, SavedTour.tour_id), limit, cursor
+    )
+
+    # Điểm đến của cả trang trong 1 query (thay vì tour.attractions từng tour)
+    attractions_by_tour = {tour.tour_id: [] for tour in saved_tours}
+    if saved_tours:
+        rows = db.session.query(
+            tour_attractions.c.tour_id, Attraction.id, Attraction.name, Attraction.lat, Attraction.lon, Attraction.image_url
+        ).join(Attraction, Attraction.id == tour_attractions.c.attraction_id)\
+            .filter(tour_attractions.c.tour_id.in_(list(attractions_by_tour)))\
+            .order_by(tour_attractions.c.tour_id, Attraction.id)
+        for tour_id, attr_id, name, lat, lon, image_url in rows:
+            attractions_by_tour[tour_id].append({
+                "id": attr_id,
+                "name": name,
+                "lat": lat,
+                "lon": lon,
+                "image_url": image_url
+            })
+
     tours_data = []
     for tour in saved_tours:
-        attractions = [{
-            "id": attr.id,
-            "name": attr.name,
-            "lat": attr.lat,
-            "lon": attr.lon,
-            "image_url": attr.image_url
-        } for attr in tour.attractions]
+        attractions = attractions_by_tour[tour.tour_id]
         
         tours_data.append({
             "tour_id": tour.tour_id,
@@ -117,7 +142,9 @@ def get_saved_tours_service(user_id):
                 "name": getattr(tour, 'start_point_name', None), # Dùng getattr để tương thích ngược
                 "lat": getattr(tour, 'start_lat', None),
                 "lon": getattr(tour, 'start_lon', None),
-            }
+            },
+            # Lịch trình đã tính: GET /api/tour-jobs/<tourJobId>
+            "tourJobId": tour.tour_job_id
         })
     
-    return tours_data
\ No newline at end of file
+    return tours_data, next_cursor
\ No newline at end of file
@@ -0,0 +1,86 @@
+"""
+Nâng cấp schema cho DB SQLite tạo từ phiên bản cũ.
+
+db.create_all() chỉ tạo bảng mới, không thêm cột vào bảng đã có
+-> các cột thêm sau được khai báo ở ADDED_COLUMNS và thêm bằng ALTER TABLE khi chạy bootstrap.py,
+index khai báo trong model (__table_args__) mà DB chưa có cũng được tạo thêm.
+
+App lúc khởi động chỉ so SCHEMA_VERSION với dòng trong bảng schema_marker (check_schema).
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+
+from models import db, SchemaMarker
+
+# Tăng mỗi khi thêm bảng / cột (ADDED_COLUMNS) hoặc đổi dữ liệu cần bootstrap lại
+SCHEMA_VERSION = 6
+
+# (bảng, cột, kiểu SQL kèm default cho các dòng đã có)
+ADDED_COLUMNS = [
+    ('attraction', 'review_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('attraction', 'rating_sum', 'FLOAT NOT NULL DEFAULT 0'),
+    ('saved_tour', 'tour_job_id', 'VARCHAR(32) REFERENCES tour_job (job_id)'),
+    ('tour_job', 'heartbeat_at', 'DATETIME'),
+    ('schema_marker', 'data_version', 'INTEGER NOT NULL DEFAULT 0'),
+]
+
+
+def upgrade_schema():
+    """Thêm các cột + index còn thiếu (gọi sau db.create_all()). Trả về list 'bảng.cột' / 'bảng.index' vừa thêm."""
+    inspector = inspect(db.engine)
+    columns = {}
+    added = []
+    for table, column, ddl in ADDED_COLUMNS:
+        if table not in columns:
+            columns[table] = {c['name'] for c in inspector.get_columns(table)}
+        if column in columns[table]:
+            continue
+        db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        columns[table].add(column)
+        added.append(f"{table}.{column}")
+    db.session.commit()
+
+    # create_all() cũng không thêm index mới vào bảng đã có
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                added.append(f"{table.name}.{index.name}")
+    return added
+
+
+def get_schema_version():
+    """Phiên bản schema đã ghi trong DB, None nếu DB chưa được bootstrap."""
+    try:
+        marker = db.session.get(SchemaMarker, 1)
+    except OperationalError:
+        db.session.rollback()   # Chưa có bảng schema_marker
+        return None
+    return marker.schema_version if marker else None
+
+
+def write_schema_marker(seeded=False):
+    marker = db.session.get(SchemaMarker, 1) or SchemaMarker(id=1)
+    marker.schema_version = SCHEMA_VERSION
+    if seeded:
+        marker.seeded_at = datetime.utcnow()
+    db.session.add(marker)
+    db.session.commit()
+    return marker
+
+
+def check_schema():
+    """
+    Gọi lúc khởi động app: chỉ đọc schema_marker (1 query), không tạo bảng / nạp dữ liệu.
+    DB chưa bootstrap hoặc cũ hơn SCHEMA_VERSION thì raise RuntimeError.
+    """
+    version = get_schema_version()
+    if version is None or version < SCHEMA_VERSION:
+        raise RuntimeError(
+            f"DB chưa được bootstrap hoặc đã cũ (phiên bản {version}, cần {SCHEMA_VERSION}). "
+            f"Chạy: python bootstrap.py"
+        )
+    return version
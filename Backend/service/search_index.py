@@ -0,0 +1,384 @@
+"""
+Index tìm kiếm trong RAM cho smart_recommendation_service.
+
+Mỗi attraction là 1 "document" đã chuẩn hóa sẵn (bỏ dấu, chữ thường) kèm tags,
+rating, số review (cột review_count) và bản to_json_brief() để trả kết quả không cần query DB.
+
+- Khớp từ khóa theo luật cũ (so khớp chuỗi con 2 chiều trên tên / mô tả / địa chỉ / tag),
+  nên index là n-gram (trigram) ngược: chỉ các document chứa mọi trigram của từ khóa
+  mới được chấm điểm. Chiều ngược lại (tên / địa chỉ / tag nằm trong từ khóa)
+  tra bằng bảng giá trị đầy đủ với mọi chuỗi con của từ khóa.
+- Không có từ khóa: document được sắp sẵn theo điểm nền (rating + review),
+  chỉ cần chấm thêm các điểm có tag sở thích.
+- Ghi DB (attraction, tags, review) được ghi nhận qua SQLAlchemy event và chỉ
+  áp vào index sau khi commit; document bị đổi được nạp lại ở lần tìm kiếm sau.
+"""
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, selectinload, with_polymorphic
+
+from models import db, Attraction, Festival, CulturalSpot, Review, Tag
+
+SEARCH_INDEX_MAX_AGE_SECONDS = int(os.getenv('SEARCH_INDEX_MAX_AGE_SECONDS', 300))
+NGRAM = 3
+
+# Luật lọc theo loại hình (giữ nguyên như bộ lọc SQL cũ)
+NATURE_TAGS = {'Thiên nhiên', 'Sinh thái', 'Núi rừng', 'Biển', 'Hang động'}
+RELIGION_SPOT_TYPES = {'Đền', 'Chùa', 'Tôn giáo'}
+RELIGION_TAGS = {'Tâm linh', 'Phật giáo', 'Đền', 'Chùa', 'Hành hương'}
+CRAFT_VILLAGE_TAGS = {'Làng nghề', 'Thủ công', 'Truyền thống'}
+
+
+def to_unaccent(text):
+    """Bỏ dấu để so sánh không phân biệt dấu."""
+    return ''.join(c for c in unicodedata.normalize('NFD', text) if unicodedata.category(c) != 'Mn')
+
+
+def normalize(text):
+    return to_unaccent((text or "").lower())
+
+
+def _ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+def _tokens_match(tokens, value):
+    """Mọi token của từ khóa là tiền tố của 1 từ trong value (cùng luật khớp với FTS5)."""
+    words = re.findall(r'\w+', value)
+    return all(any(word.startswith(token) for word in words) for token in tokens)
+
+
+def matches_type(doc, type_name):
+    if type_name == 'Lễ hội':
+        return doc.type == 'festival'
+    if type_name == 'Thiên nhiên':
+        return doc.type == 'nature' or bool(doc.tags & NATURE_TAGS)
+    if type_name == 'Đền/Chùa':
+        return doc.spot_type in RELIGION_SPOT_TYPES or bool(doc.tags & RELIGION_TAGS)
+    if type_name == 'Làng nghề':
+        return doc.spot_type == 'Làng nghề' or bool(doc.tags & CRAFT_VILLAGE_TAGS)
+    return doc.spot_type == type_name or type_name in doc.tags
+
+
+class SearchDoc:
+    __slots__ = ('id', 'name', 'desc', 'loc', 'tags', 'tags_u', 'type', 'spot_type',
+                 'rating', 'review_count', 'base_score', 'brief')
+
+    def __init__(self, attraction):
+        self.id = attraction.id
+        self.name = normalize(attraction.name)
+        self.desc = normalize(attraction.brief_description)
+        self.loc = normalize(attraction.location)
+        self.tags = {t.tag_name for t in attraction.tags}
+        self.tags_u = [normalize(t) for t in self.tags]
+        self.type = attraction.type
+        self.spot_type = getattr(attraction, 'spot_type', None)
+        self.rating = attraction.average_rating
+        self.review_count = attraction.review_count or 0
+        self.base_score = (self.rating * 1.5 if self.rating else 0) + self.review_count * 0.1
+        self.brief = attraction.to_json_brief()
+
+    def exact_keys(self):
+        """Các giá trị được so khớp theo chiều 'nằm trong từ khóa'."""
+        return {self.name, self.loc, *self.tags_u}
+
+    def grams(self):
+        grams = _ngrams(self.name) | _ngrams(self.desc) | _ngrams(self.loc)
+        for tag in self.tags_u:
+            grams |= _ngrams(tag)
+        return grams
+
+    def score(self, query, interest_tags):
+        """
+        Tính điểm cho 1 địa điểm (query đã bỏ dấu, chữ thường):
+        1. Khớp search keyword 50-100đ
+        2: Khớp tag sở thích   3đ/tag
+        3. Rating              1.5đ/sao
+        4. Số review 1đ        0.1đ/bài
+        """
+        score = 0
+        keyword_matched = False
+
+        # --- Tiêu chí 1 ---
+        if query:
+            if query in self.name or self.name in query:
+                score += 100
+                keyword_matched = True
+            elif query in self.desc:
+                score += 50
+                keyword_matched = True
+            elif query in self.loc or self.loc in query:
+                score += 50
+                keyword_matched = True
+
+            # Cho match hai chiều để bắt cả trường hợp tag ngắn hơn hoặc dài hơn từ khóa
+            for tag in self.tags_u:
+                if tag in query or query in tag:
+                    score += 50
+                    keyword_matched = True
+
+        score = self._add_boosts(score, interest_tags)
+
+        # Nếu có search term nhưng không khớp tên/mô tả/tag thì loại bỏ (score = 0)
+        if query and not keyword_matched:
+            return 0
+        return score
+
+    def score_tokens(self, query, tokens, interest_tags):
+        """
+        Giống score() nhưng chiều "từ khóa nằm trong trường" khớp theo token (như FTS5),
+        token rải rác nhiều trường được 25đ.
+        """
+        score = 0
+        if _tokens_match(tokens, self.name) or (self.name and self.name in query):
+            score += 100
+        elif _tokens_match(tokens, self.desc) or _tokens_match(tokens, self.loc) or (self.loc and self.loc in query):
+            score += 50
+
+        for tag in self.tags_u:
+            if _tokens_match(tokens, tag) or tag in query:
+                score += 50
+
+        if score == 0:
+            score = 25
+        return self._add_boosts(score, interest_tags)
+
+    def _add_boosts(self, score, interest_tags):
+        # --- Tiêu chí 2, 3, 4 --- (cộng lần lượt để điểm giữ đúng như cách tính cũ)
+        if interest_tags:
+            score += len(self.tags & interest_tags) * 3
+        if self.rating:
+            score += self.rating * 1.5
+        score += self.review_count * 0.1
+        return score
+
+
+class SearchIndex:
+    def __init__(self):
+        self._docs = {}         # id -> SearchDoc
+        self._grams = {}        # trigram -> set(id)
+        self._exact = {}        # tên / địa chỉ / tag (đã chuẩn hóa) -> set(id)
+        self._tag_ids = {}      # tag gốc -> set(id)
+        self._by_base = []      # id sắp theo (-điểm nền, id)
+        self._dirty = set()
+        self._stale = True
+        self._loaded_at = None
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------
+    # Nạp / cập nhật
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _load_docs(ids=None):
+        poly = with_polymorphic(Attraction, [Festival, CulturalSpot])
+        query = db.session.query(poly).options(selectinload(poly.tags))
+        if ids is not None:
+            query = query.filter(poly.id.in_(ids))
+        return [SearchDoc(a) for a in query.all()]
+
+    def _add(self, doc):
+        self._docs[doc.id] = doc
+        for gram in doc.grams():
+            self._grams.setdefault(gram, set()).add(doc.id)
+        for key in doc.exact_keys():
+            self._exact.setdefault(key, set()).add(doc.id)
+        for tag in doc.tags:
+            self._tag_ids.setdefault(tag, set()).add(doc.id)
+
+    def _remove(self, doc_id):
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return
+        for index, keys in ((self._grams, doc.grams()), (self._exact, doc.exact_keys()), (self._tag_ids, doc.tags)):
+            for key in keys:
+                members = index.get(key)
+                if members is not None:
+                    members.discard(doc_id)
+                    if not members:
+                        del index[key]
+
+    def _sort_by_base(self):
+        self._by_base = sorted(self._docs, key=lambda i: (-self._docs[i].base_score, i))
+
+    def rebuild(self):
+        docs = self._load_docs()
+        with self._lock:
+            self._docs, self._grams, self._exact, self._tag_ids = {}, {}, {}, {}
+            for doc in docs:
+                self._add(doc)
+            self._sort_by_base()
+            self._dirty.clear()
+            self._stale = False
+            self._loaded_at = time.time()
+        return len(docs)
+
+    def mark_dirty(self, ids):
+        with self._lock:
+            self._dirty.update(ids)
+
+    def mark_stale(self):
+        self._stale = True
+
+    def _ensure_fresh(self):
+        if self._stale or time.time() - self._loaded_at >= SEARCH_INDEX_MAX_AGE_SECONDS:
+            self.rebuild()
+            return
+        if not self._dirty:
+            return
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        docs = self._load_docs(dirty)
+        with self._lock:
+            for doc_id in dirty:
+                self._remove(doc_id)
+            for doc in docs:
+                self._add(doc)
+            self._sort_by_base()
+
+    # ------------------------------------------------------------------
+    # Tìm kiếm
+    # ------------------------------------------------------------------
+    def _keyword_candidates(self, query):
+        """Tập id có thể khớp từ khóa (tập cha của kết quả, sẽ chấm điểm lại chính xác)."""
+        if len(query) < NGRAM:
+            return set(self._docs)
+
+        # query nằm trong 1 trường -> trường đó chứa mọi trigram của query
+        posting = [self._grams.get(g, set()) for g in _ngrams(query)]
+        posting.sort(key=len)
+        candidates = set(posting[0]).intersection(*posting[1:]) if posting else set()
+
+        # tên / địa chỉ / tag nằm trong query (kể cả giá trị rỗng)
+        return candidates | self._contained_in(query, include_empty=True)
+
+    def _contained_in(self, query, include_empty=False):
+        """Tập id có tên / địa chỉ / tag là chuỗi con của query."""
+        ids = set()
+        for i in range(len(query) + 1):
+            for j in range(i if include_empty else i + 1, len(query) + 1):
+                members = self._exact.get(query[i:j])
+                if members:
+                    ids |= members
+        return ids
+
+    def search(self, query=None, interest_tags=frozenset(), types=None, limit=50):
+        """
+        query: từ khóa đã bỏ dấu, chữ thường (None = không tìm theo từ khóa).
+        Trả về list (doc, score) đã sắp theo điểm giảm dần.
+        """
+        self._ensure_fresh()
+        interest_tags = set(interest_tags or ())
+
+        with self._lock:
+            def passes(doc):
+                return not types or any(matches_type(doc, t) for t in types)
+
+            if query:
+                candidates = (self._docs[i] for i in self._keyword_candidates(query))
+                scored = [(doc, doc.score(query, interest_tags)) for doc in candidates if passes(doc)]
+                scored = [(doc, score) for doc, score in scored if score > 0]
+            else:
+                # Điểm có tag sở thích được cộng thêm, còn lại xếp theo điểm nền sắp sẵn
+                boosted = set()
+                for tag in interest_tags:
+                    boosted |= self._tag_ids.get(tag, set())
+                scored = [(self._docs[i], self._docs[i].score(None, interest_tags))
+                          for i in boosted if passes(self._docs[i])]
+                taken = 0
+                for doc_id in self._by_base:
+                    if taken >= limit:
+                        break
+                    doc = self._docs[doc_id]
+                    if doc_id not in boosted and passes(doc):
+                        scored.append((doc, doc.score(None, interest_tags)))
+                        taken += 1
+
+        scored.sort(key=lambda item: (-item[1], item[0].id))
+        return scored[:limit]
+
+    def rank_matches(self, ranked_ids, query, tokens, interest_tags=frozenset(), types=None, limit=50):
+        """
+        Chấm điểm các id đã được FTS5 lọc + sắp theo BM25, cộng thêm các điểm có
+        tên / địa chỉ / tag nằm trong từ khóa (VD "Phố cổ Hội An, Quảng Nam").
+        Cùng điểm thì giữ thứ tự BM25.
+        """
+        self._ensure_fresh()
+        interest_tags = set(interest_tags or ())
+
+        scored = []
+        with self._lock:
+            extra_ids = sorted(self._contained_in(query) - set(ranked_ids))
+            for rank, doc_id in enumerate(list(ranked_ids) + extra_ids):
+                doc = self._docs.get(doc_id)
+                if doc is None or (types and not any(matches_type(doc, t) for t in types)):
+                    continue
+                scored.append((doc, doc.score_tokens(query, tokens, interest_tags), rank))
+
+        scored.sort(key=lambda item: (-item[1], item[2]))
+        return [(doc, score) for doc, score, _ in scored[:limit]]
+
+
+_search_index = SearchIndex()
+
+
+def get_search_index():
+    return _search_index
+
+
+def build_search_index():
+    """Gọi lúc khởi động app (trong app context)."""
+    return _search_index.rebuild()
+
+
+# --- Đồng bộ với DB: gom id bị đổi trong session, chỉ áp vào index sau khi commit ---
+def _pending(session):
+    return session.info.setdefault('search_index_pending', set())
+
+
+@event.listens_for(Attraction, 'after_insert', propagate=True)
+@event.listens_for(Attraction, 'after_update', propagate=True)
+@event.listens_for(Attraction, 'after_delete', propagate=True)
+def _attraction_changed(mapper, connection, target):
+    _pending(Session.object_session(target)).add(target.id)
+
+
+@event.listens_for(Review, 'after_insert')
+@event.listens_for(Review, 'after_update')
+@event.listens_for(Review, 'after_delete')
+def _review_changed(mapper, connection, target):
+    _pending(Session.object_session(target)).add(target.attraction_id)
+
+
+@event.listens_for(Attraction.tags, 'append', propagate=True)
+@event.listens_for(Attraction.tags, 'remove', propagate=True)
+def _tags_changed(target, value, initiator):
+    session = Session.object_session(target)
+    if session is not None and target.id is not None:
+        _pending(session).add(target.id)
+
+
+@event.listens_for(Tag, 'after_update')
+def _tag_renamed(mapper, connection, target):
+    # Đổi tên tag ảnh hưởng nhiều điểm -> dựng lại toàn bộ
+    _pending(Session.object_session(target)).add(None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending(session):
+    pending = session.info.pop('search_index_pending', None)
+    if not pending:
+        return
+    if None in pending:
+        _search_index.mark_stale()
+    else:
+        _search_index.mark_dirty(pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('search_index_pending', None)
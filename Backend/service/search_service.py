@@ -1,9 +1,17 @@
-from sqlalchemy import or_
-from sqlalchemy.orm import aliased, joinedload
-from models import db, Attraction, Festival, CulturalSpot, Tag, FavoriteAttraction
-from .tour_service import get_route_with_cache
-from functools import lru_cache
-import unicodedata
+from sqlalchemy import insert, or_
+
+from models import (
+    db, Attraction, Festival, CulturalSpot, Tag, FavoriteAttraction,
+    AttractionNeighbor, AttractionNearbyState, attraction_tags
+)
+from .routing import get_travel_time, prefetch_travel_matrix, ESTIMATED_MODE, MATRIX_BATCH_SIZE
+from .route_cache import get_shared_route_cache
+from .geo_index import get_coord_index
+from .search_index import get_search_index, to_unaccent, normalize
+from .fts_index import fts_search, tokenize
+from .pagination import DEFAULT_PAGE_SIZE, decode_cursor, encode_cursor, keyset_page, page_json
+from datetime import datetime
+import threading
 
 # NEW SEARCH LOGIC
 def get_user_interest_tags(user_id):
@@ -25,67 +33,6 @@ def get_user_interest_tags(user_id):
     # Trả về set các tag (VD: {'Biển', 'Ẩm thực', 'Di tích'})
     return {t[0] for t in favorite_tags}
 
-def to_unaccent(text):
-    """Bỏ dấu để so sánh không phân biệt dấu."""
-    return ''.join(c for c in unicodedata.normalize('NFD', text) if unicodedata.category(c) != 'Mn')
-
-def calculate_score(attraction, interest_tags, search_keywords):
-    """
-    Bước 2: Hàm tính điểm cho 1 địa điểm dựa trên các tiêu chí
-    1. Khớp search keyword 50-100đ
-    2: Khớp tag sở thích   3đ/tag
-    3. Rating              1.5đ/sao
-    4. Số review 1đ        0.1đ/bài
-    """
-    score = 0
-    keyword_matched = False
-
-    attr_tags = {t.tag_name for t in attraction.tags}
-
-    # --- Tiêu chí 1 ---
-    if search_keywords:
-        # Kiểm tra xem tên/mô tả/địa chỉ 
-        query_lower = to_unaccent(search_keywords.lower())
-        name_lower = to_unaccent(attraction.name.lower())
-        desc_lower = to_unaccent((attraction.brief_description or "").lower())
-        loc_lower = to_unaccent((attraction.location or "").lower())
-
-        if query_lower in name_lower or name_lower in query_lower:
-            score += 100  # Khớp tên -> ưu tiên cực cao
-            keyword_matched = True
-        elif query_lower in desc_lower:
-            score += 50
-            keyword_matched = True
-        elif query_lower in loc_lower or loc_lower in query_lower:
-            score += 50
-            keyword_matched = True
-            
-        # Kiểm tra tag
-        for tag in attr_tags:
-            normalized_tag = to_unaccent(tag.lower())
-            # Cho match hai chiều để bắt cả trường hợp tag ngắn hơn hoặc dài hơn từ khóa
-            if normalized_tag in query_lower or query_lower in normalized_tag:
-                score += 50 
-                keyword_matched = True
-
-    # --- Tiêu chí 2 ---
-    matched_interests = attr_tags.intersection(interest_tags)
-    score += len(matched_interests) * 3
-    
-    # --- Tiêu chí 3 ---
-    if attraction.average_rating:
-        score += attraction.average_rating * 1.5
-        
-    # --- Tiêu chí 4 ---
-    review_count = len(attraction.reviews)
-    score += review_count * 0.1
-
-    # Nếu có search term nhưng không khớp tên/mô tả/tag thì loại bỏ (score = 0)
-    if search_keywords and not keyword_matched:
-        return 0
-
-    return score
-
 province_map = {
     "TPHCM": "Thành phố Hồ Chí Minh",
     "SG": "Thành phố Hồ Chí Minh",
@@ -106,146 +53,334 @@ def smart_recommendation_service(types_list=[], user_id=None, search_term=None,
     """
     Service search thông minh: 
     Kết hợp tìm theo Type, SpotType và cả Tag để đảm bảo không bị sót dữ liệu.
+    Chấm điểm trên index trong RAM (service/search_index.py) thay vì quét toàn bảng,
+    từ khóa được lọc bằng FTS5 (service/fts_index.py) nếu SQLite hỗ trợ.
     """
-    # Lọc theo types_list trước khi tính điểm
-    query = Attraction.query.options(joinedload(Attraction.tags))
-
+    query = None
     if search_term:
         search_term = to_unaccent(search_term.upper())
         search_term = province_map.get(search_term, search_term)
+        query = normalize(search_term)
 
-    if types_list:
-        normalized_types = [t.strip() for t in types_list if isinstance(t, str) and t.strip()]
-        
-        if normalized_types:
-            # Alias cho các bảng để tránh conflict
-            festival_alias = aliased(Festival)
-            cultural_spot_alias = aliased(CulturalSpot)
-            
-            # Join các bảng liên quan
-            query = query.outerjoin(festival_alias, festival_alias.id == Attraction.id)
-            query = query.outerjoin(cultural_spot_alias, cultural_spot_alias.id == Attraction.id)
-            # Join với Tag để tìm kiếm linh hoạt hơn
-            query = query.outerjoin(Attraction.tags)
-            
-            type_conditions = []
-            
-            for t in normalized_types:
-                # 1. Xử lý Lễ hội
-                if t == 'Lễ hội':
-                    type_conditions.append(Attraction.type == 'festival')
-                
-                # 2. Xử lý Thiên nhiên
-                elif t == 'Thiên nhiên':
-                    type_conditions.append(or_(
-                        Attraction.type == 'nature',
-                        Tag.tag_name.in_(['Thiên nhiên', 'Sinh thái', 'Núi rừng', 'Biển', 'Hang động'])
-                    ))
-                
-                # 3. Xử lý Đền / Chùa
-                elif t == 'Đền/Chùa': 
-                    type_conditions.append(or_(
-                        cultural_spot_alias.spot_type.in_(['Đền', 'Chùa', 'Tôn giáo']),
-                        Tag.tag_name.in_(['Tâm linh', 'Phật giáo', 'Đền', 'Chùa', 'Hành hương'])
-                    ))
-                
-                # 4. Xử lý Làng nghề
-                elif t == 'Làng nghề':
-                    type_conditions.append(or_(
-                        cultural_spot_alias.spot_type == 'Làng nghề',
-                        Tag.tag_name.in_(['Làng nghề', 'Thủ công', 'Truyền thống'])
-                    ))
-                
-                # 5. Các loại hình khác (Di tích, Bảo tàng...)
-                else:
-                    type_conditions.append(or_(
-                        cultural_spot_alias.spot_type == t,
-                        Tag.tag_name == t
-                    ))
-
-            # Áp dụng bộ lọc
-            if type_conditions:
-                query = query.filter(or_(*type_conditions))
-    
-    # Lấy danh sách (dùng distinct để loại bỏ bản ghi trùng do join với tags)
-    all_attractions = query.distinct().all()
+    normalized_types = [t.strip() for t in (types_list or []) if isinstance(t, str) and t.strip()]
 
     interest_tags = get_user_interest_tags(user_id)
 
-    @lru_cache(maxsize=128)
-    def cached_calculate_score(attr):
-        return calculate_score(attr, interest_tags, search_term)
-    
-    scored_results = []
-    for attr in all_attractions:
-        score = cached_calculate_score(attr)
-        
-        if score > 0 or not search_term:
-            scored_results.append({
-                "attraction": attr,
-                "score": score,
-                "match_reason": "Phù hợp sở thích" if score > 5 else "Gợi ý phổ biến"
-            })
-    
-    scored_results.sort(key=lambda x: x["score"], reverse=True)
-    final_results = scored_results[:limit]
-    
+    # Có từ khóa: SQLite FTS5 lọc + xếp hạng BM25, Python chỉ chấm điểm các điểm khớp
+    ranked_ids = fts_search(search_term) if query else None
+    if ranked_ids is not None:
+        results = get_search_index().rank_matches(
+            ranked_ids, query, tokenize(search_term), interest_tags=interest_tags, types=normalized_types, limit=limit
+        )
+    else:
+        results = get_search_index().search(
+            query=query, interest_tags=interest_tags, types=normalized_types, limit=limit
+        )
+
     return [
         {
-            **item["attraction"].to_json_brief(),
-            "recommendationScore": item["score"], 
-            "matchReason": item["match_reason"]
+            **doc.brief,
+            "recommendationScore": score, 
+            "matchReason": "Phù hợp sở thích" if score > 5 else "Gợi ý phổ biến"
         } 
-        for item in final_results
+        for doc, score in results
+    ]
+
+
+NEARBY_RADIUS_KM = 5
+NEARBY_MAX_RADIUS_KM = 100
+NEARBY_MAX_LIMIT = 100
+NEARBY_TYPES = ('attraction', 'festival', 'cultural_spot')
+
+_festival = Festival.__table__
+_cultural_spot = CulturalSpot.__table__
+
+
+def _brief_row_json(row):
+    """Giống Attraction/Festival.to_json_brief, dựng từ dòng query (không nạp object)."""
+    has_dates = row.type == 'festival' and row.original_start and row.original_end
+    return {
+        "id": row.id,
+        "name": row.name,
+        "averageRating": row.average_rating,
+        "imageUrl": row.image_url,
+        "type": row.type,
+        "spotType": row.spot_type,
+        "datetimeStart": row.original_start if has_dates else "12/1",
+        "datetimeEnd": row.original_end if has_dates else "31/12",
+        "lat": row.lat,
+        "lon": row.lon
+    }
+
+
+def _parse_nearby_filters(types, tags):
+    types = [t.strip() for t in (types or []) if t and t.strip()]
+    invalid = [t for t in types if t not in NEARBY_TYPES]
+    if invalid:
+        raise ValueError(f"type không hợp lệ: {', '.join(invalid)} (chỉ nhận {', '.join(NEARBY_TYPES)})")
+    return types, [t.strip() for t in (tags or []) if t and t.strip()]
+
+
+def get_nearby_attr(attraction_id, limit=DEFAULT_PAGE_SIZE, cursor=None, types=None, tags=None):
+    """
+    Các điểm lân cận của 1 điểm đến, gần nhất trước, kèm khoảng cách / thời gian đi đường bộ.
+    1 query trên bảng attraction_neighbor (idx_attraction_neighbor_rank) join attraction,
+    lọc tùy chọn theo type (attraction / festival / cultural_spot) và tag (khớp 1 trong các tag),
+    phân trang keyset theo (khoảng cách, id).
+    """
+    types, tags = _parse_nearby_filters(types, tags)
+
+    query = db.session.query(
+        AttractionNeighbor.neighbor_id, AttractionNeighbor.distance_km, AttractionNeighbor.duration_min,
+        Attraction.id, Attraction.name, Attraction.average_rating, Attraction.image_url, Attraction.type,
+        Attraction.lat, Attraction.lon, _cultural_spot.c.spot_type,
+        _festival.c.original_start, _festival.c.original_end
+    ).select_from(AttractionNeighbor)\
+        .join(Attraction, Attraction.id == AttractionNeighbor.neighbor_id)\
+        .outerjoin(_festival, _festival.c.id == Attraction.id)\
+        .outerjoin(_cultural_spot, _cultural_spot.c.id == Attraction.id)\
+        .filter(AttractionNeighbor.attraction_id == attraction_id)
+    if types:
+        query = query.filter(Attraction.type.in_(types))
+    if tags:
+        query = query.filter(
+            db.session.query(attraction_tags.c.attraction_id)
+            .join(Tag, Tag.id == attraction_tags.c.tag_id)
+            .filter(attraction_tags.c.attraction_id == Attraction.id, Tag.tag_name.in_(tags))
+            .exists()
+        )
+    rows, next_cursor = keyset_page(
+        query, (AttractionNeighbor.distance_km, AttractionNeighbor.neighbor_id), limit, cursor, descending=False
+    )
+
+    if not rows and db.session.get(AttractionNearbyState, attraction_id) is None:
+        # Chưa có dữ liệu precompute (điểm mới thêm / chưa chạy job) -> lọc theo đường chim bay trên index tọa độ
+        return _nearby_by_straight_line(attraction_id, limit, cursor, types, tags)
+
+    data = [
+        {**_brief_row_json(row), "distanceKm": round(row.distance_km, 2), "durationMin": row.duration_min}
+        for row in rows
     ]
+    return {"data": data, **page_json(next_cursor, limit)}
 
 
-def get_nearby_attr(attraction_id):
-    target = Attraction.query.get(attraction_id)
+def _nearby_by_straight_line(attraction_id, limit, cursor, types, tags):
+    """
+    Như get_nearby_attr nhưng khoảng cách theo đường chim bay, phân trang keyset theo (khoảng cách, id)
+    cùng định dạng cursor với bảng attraction_neighbor.
+    """
+    after = decode_cursor(cursor, (AttractionNeighbor.distance_km, AttractionNeighbor.neighbor_id)) if cursor else None
+    if after is not None and any(v is None for v in after):
+        raise ValueError("cursor không hợp lệ")
+
+    target = db.session.get(Attraction, attraction_id)
     if not target:
         raise LookupError("Không tìm thấy địa điểm")
+    if target.lat is None or target.lon is None:
+        return {"data": [], **page_json(None, limit)}
+
+    ids, dists = get_coord_index().within_radius(target.lat, target.lon, NEARBY_RADIUS_KM, exclude_ids={target.id})
+    query = Attraction.query.filter(Attraction.id.in_(ids))
+    if types:
+        query = query.filter(Attraction.type.in_(types))
+    if tags:
+        query = query.filter(Attraction.tags.any(Tag.tag_name.in_(tags)))
+    attractions = {a.id: a for a in query}
+    ranked = sorted((dist, attr_id) for attr_id, dist in zip(ids, dists) if attr_id in attractions)
+    if after is not None:
+        ranked = [item for item in ranked if item > tuple(after)]
+
+    page = ranked[:limit]
+    next_cursor = encode_cursor(list(page[-1])) if len(ranked) > limit else None
+    data = [
+        {**attractions[attr_id].to_json_brief(), "distanceKm": round(dist, 2), "durationMin": None}
+        for dist, attr_id in page
+    ]
+    return {"data": data, **page_json(next_cursor, limit), "estimated": True}
+
 
-    nearby_attractions = Attraction.query.filter(Attraction.id.in_(target.nearby_attractions)).all()
-    return {a.to_json_brief() for a in nearby_attractions}
+def get_nearby_by_location(lat, lon, radius_km=NEARBY_RADIUS_KM, limit=20):
+    """
+    Các địa điểm trong bán kính radius_km (đường chim bay) quanh tọa độ bất kỳ,
+    sắp theo khoảng cách tăng dần.
+    """
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("Tọa độ không hợp lệ")
+    if not 0 < radius_km <= NEARBY_MAX_RADIUS_KM:
+        raise ValueError(f"radius phải trong khoảng (0, {NEARBY_MAX_RADIUS_KM}] km")
+    if not 0 < limit <= NEARBY_MAX_LIMIT:
+        raise ValueError(f"limit phải trong khoảng [1, {NEARBY_MAX_LIMIT}]")
 
+    ids, dists = get_coord_index().within_radius(lat, lon, radius_km)
+    ids, dists = ids[:limit], dists[:limit]
 
-def precompute_nearby_attractions(radius=5):
+    attractions = {a.id: a for a in Attraction.query.filter(Attraction.id.in_(ids)).all()}
+    data = []
+    for attr_id, dist in zip(ids, dists):
+        attr = attractions.get(attr_id)
+        if attr:
+            data.append({**attr.to_json_brief(), "distanceKm": round(dist, 2)})
+    return {"data": data, "total": len(data)}
+
+
+NEARBY_BATCH_SIZE = MATRIX_BATCH_SIZE      # Khớp kích thước 1 lô Matrix API
+_precompute_lock = threading.Lock()
+
+
+def _find_dirty_nearby(attractions, states, radius):
+    """Điểm cần tính lại: chưa từng tính, bị đổi tọa độ hoặc đã tính với bán kính khác."""
+    dirty = []
+    for attr in attractions:
+        state = states.get(attr.id)
+        if state is None or (state.lat, state.lon) != (attr.lat, attr.lon) or state.radius_km != radius:
+            dirty.append(attr)
+    return dirty
+
+
+def precompute_nearby_attractions(radius=NEARBY_RADIUS_KM, full=False, batch_size=NEARBY_BATCH_SIZE):
+    """
+    Tính bảng attraction_neighbor (các điểm cách <= radius km đường bộ, kèm khoảng cách / thời gian).
+
+    - full=False (mặc định): chỉ tính lại các điểm mới thêm / bị đổi tọa độ
+      (theo bảng attraction_nearby_state), đồng thời cập nhật cạnh ngược của các điểm
+      lân cận cũ và mới của chúng; xóa các dòng của điểm đã bị xóa.
+    - Chỉ route các cặp nằm trong bán kính theo đường chim bay (lọc qua index tọa độ),
+      vì đường bộ luôn dài hơn đường chim bay.
+    - Commit theo lô batch_size điểm kèm trạng thái, dừng giữa chừng thì lần chạy sau
+      tiếp tục từ các điểm còn lại. Điểm còn cặp chỉ ước lượng đường chim bay (GraphHopper lỗi)
+      không được ghi trạng thái -> lần chạy sau tính lại.
+    Trả về số điểm đã tính lại.
+    """
+    if not _precompute_lock.acquire(blocking=False):
+        print("Nearby pre-computation is already running, skipped.")
+        return 0
+    try:
+        return _precompute_nearby(radius, full, batch_size)
+    finally:
+        _precompute_lock.release()
+
+
+def _delete_neighbor_rows(attraction_ids):
+    """Xóa mọi cạnh (cả 2 chiều) của các điểm trong attraction_ids."""
+    attraction_ids = list(attraction_ids)
+    AttractionNeighbor.query.filter(or_(
+        AttractionNeighbor.attraction_id.in_(attraction_ids),
+        AttractionNeighbor.neighbor_id.in_(attraction_ids)
+    )).delete(synchronize_session=False)
+
+
+def _precompute_nearby(radius, full, batch_size):
     print(f"Starting pre-computation of nearby attractions with radius {radius}km...")
 
-    all_attractions = Attraction.query.all()
-    total_count = len(all_attractions)
+    all_attractions = [a for a in Attraction.query.all() if a.lat is not None and a.lon is not None]
+    by_id = {a.id: a for a in all_attractions}
+    states = {s.attraction_id: s for s in AttractionNearbyState.query.all()}
 
-    if total_count == 0:
-        print("No attractions found to process!")
-        return
+    # 1. Xóa cạnh của điểm đã bị xóa
+    deleted_ids = set(states) - set(by_id)
+    if deleted_ids:
+        _delete_neighbor_rows(deleted_ids)
+        AttractionNearbyState.query.filter(
+            AttractionNearbyState.attraction_id.in_(deleted_ids)
+        ).delete(synchronize_session=False)
+        for attr_id in deleted_ids:
+            states.pop(attr_id)
+        db.session.commit()
 
-    # Tạo cache route chung cho toàn bộ quá trình pre-compute
-    # Điều này giúp tránh tính toán lại các route đã được tính
-    route_cache = {}
+    # DB cũ chỉ có danh sách JSON nearby_attractions, bảng attraction_neighbor còn trống -> tính lại toàn bộ
+    if not full and states and db.session.query(AttractionNeighbor.attraction_id).first() is None:
+        full = True
 
-    print(f"Processing {total_count} attractions...")
+    dirty = list(all_attractions) if full else _find_dirty_nearby(all_attractions, states, radius)
+    if not dirty:
+        print(f"Nearby attractions are up to date ({len(all_attractions)} attractions).")
+        return 0
+    # Gom các điểm gần nhau vào cùng lô (theo ô 1 độ): mỗi lô route chéo mọi điểm x mọi ứng viên của lô,
+    # lô trải khắp cả nước thì phần lớn là cặp ở xa (thậm chí đi máy bay) không bao giờ dùng tới
+    dirty.sort(key=lambda a: (int(a.lat // 1), int(a.lon // 1), a.lat, a.lon))
+
+    # Dùng cache route chung của process (RAM + SQLite) để các lần chạy sau
+    # và các request tạo tour có thể tái sử dụng route đã tính
+    route_cache = get_shared_route_cache()
+    coord_index = get_coord_index()
+    coord_index.rebuild()
+    # Nới bán kính lọc 1% vì haversine và geodesic lệch nhau một chút
+    prefilter_radius = radius * 1.01
 
+    print(f"Processing {len(dirty)}/{len(all_attractions)} attractions...")
     processed_count = 0
+    estimated_count = 0
 
-    for attraction in all_attractions:
-        nearby_ids = []
+    for i in range(0, len(dirty), batch_size):
+        chunk = dirty[i:i + batch_size]
 
-        # Tối ưu: Chỉ kiểm tra với những attraction có cùng hoặc tọa độ gần
-        # Giảm số lượng so sánh không cần thiết
-        for other in all_attractions:
-            if attraction.id != other.id:
-                # Sử dụng cache route chung để tránh tính toán lại
-                distance_km, _, _, _ = get_route_with_cache((attraction.lat, attraction.lon), (other.lat, other.lon), route_cache)
+        # Ứng viên của từng điểm trong lô + lấy khoảng cách đường bộ cả lô qua Matrix API
+        candidates = {}
+        for attr in chunk:
+            ids, _ = coord_index.within_radius(attr.lat, attr.lon, prefilter_radius, exclude_ids={attr.id})
+            candidates[attr.id] = [by_id[c] for c in ids if c in by_id]
+        destinations = {(c.lat, c.lon) for cands in candidates.values() for c in cands}
+        matrix = prefetch_travel_matrix([(a.lat, a.lon) for a in chunk], list(destinations), route_cache)
+
+        edges = {}
+        estimated_ids = set()
+        for attraction in chunk:
+            for other in candidates[attraction.id]:
+                distance_km, duration_min, mode = get_travel_time((attraction.lat, attraction.lon), (other.lat, other.lon), route_cache, matrix)
+                if mode == ESTIMATED_MODE:
+                    estimated_ids.add(attraction.id)
                 if distance_km <= radius:
-                    nearby_ids.append(other.id)
+                    edges[(attraction.id, other.id)] = (distance_km, duration_min)
+                    # Khoảng cách coi như đối xứng -> ghi luôn cạnh ngược (điểm kia không nằm trong lô)
+                    edges.setdefault((other.id, attraction.id), (distance_km, duration_min))
+
+        # Ghi lại toàn bộ cạnh (2 chiều) của các điểm trong lô
+        _delete_neighbor_rows(a.id for a in chunk)
+        if edges:
+            db.session.execute(insert(AttractionNeighbor), [
+                {"attraction_id": a, "neighbor_id": b, "distance_km": dist, "duration_min": int(round(mins))}
+                for (a, b), (dist, mins) in edges.items()
+            ])
+
+        for attraction in chunk:
+            state = states.get(attraction.id)
+            if attraction.id in estimated_ids:
+                # Có cặp chỉ là ước lượng đường chim bay: vẫn ghi cạnh tạm, không ghi trạng thái
+                # -> lần chạy sau tính lại điểm này
+                if state is not None:
+                    db.session.delete(state)
+                    states.pop(attraction.id)
+                continue
+            if state is None:
+                state = AttractionNearbyState(attraction_id=attraction.id)
+                db.session.add(state)
+                states[attraction.id] = state
+            state.lat, state.lon, state.radius_km = attraction.lat, attraction.lon, radius
+            state.computed_at = datetime.utcnow()
+
+        db.session.commit()
+        processed_count += len(chunk)
+        estimated_count += len(estimated_ids)
+        print(f"Processed {processed_count}/{len(dirty)} attractions...")
+
+    route_cache.flush()
+    print(f"Successfully pre-computed nearby attractions for {processed_count} attractions!")
+    if estimated_count:
+        print(f"{estimated_count} attractions only have estimated distances, they will be recomputed next run.")
+    print(f"Route cache stats: {route_cache.stats()}")
+    return processed_count
 
-        attraction.nearby_attractions = nearby_ids
-        processed_count += 1
 
-        # Hiển thị tiến trình mỗi 50 attractions
-        if processed_count % 50 == 0 or processed_count == total_count:
-            print(f"Processed {processed_count}/{total_count} attractions...")
+def start_nearby_precompute_in_background(app, **kwargs):
+    """Chạy precompute_nearby_attractions trong thread nền để không chặn khởi động app."""
+    def _run():
+        with app.app_context():
+            try:
+                precompute_nearby_attractions(**kwargs)
+            except Exception as e:
+                db.session.rollback()
+                print(f"[Nearby Precompute Error] {e}")
 
-    db.session.commit()
-    print(f"Successfully pre-computed nearby attractions for {total_count} attractions!")
-    print(f"Route cache contains {len(route_cache)} cached routes.")
\ No newline at end of file
+    thread = threading.Thread(target=_run, name='nearby-precompute', daemon=True)
+    thread.start()
+    return thread
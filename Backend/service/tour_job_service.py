@@ -0,0 +1,215 @@
+"""
+Tạo lịch trình dạng job chạy nền cho /api/tour-jobs.
+
+- POST tạo job (lưu bảng tour_job) rồi trả về ngay, thread pool riêng chạy generate_smart_tour.
+- Tham số được chuẩn hóa + hash: request giống hệt một job đang chạy hoặc đã xong
+  (trong TOUR_JOB_REUSE_SECONDS) dùng lại job đó thay vì tính lại.
+- Kết quả lưu trong DB nên tour đã lưu (SavedTour.tour_job_id) mở lại không cần tính lại.
+- Mỗi job chỉ chạy 1 lần dù nhiều process cùng submit: nhận job bằng 1 câu UPDATE ... WHERE status='queued'
+  (không cập nhật được dòng nào = process khác đã nhận).
+- Job đang chạy cập nhật heartbeat_at định kỳ; job 'running' mất heartbeat quá TOUR_JOB_LEASE_SECONDS
+  (worker bị tắt giữa chừng) được đưa lại về 'queued' bởi resume_tour_jobs.py, không tự chạy lúc khởi động app.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, update
+
+from models import db, TourJob
+from .tour_service import generate_smart_tour
+
+logger = logging.getLogger(__name__)
+
+TOUR_JOB_WORKERS = int(os.getenv('TOUR_JOB_WORKERS', 2))                    # Số tour tính song song
+TOUR_JOB_REUSE_SECONDS = int(os.getenv('TOUR_JOB_REUSE_SECONDS', 3600))     # Kết quả cũ hơn thì tính lại (thời tiết...)
+TOUR_JOB_HEARTBEAT_SECONDS = int(os.getenv('TOUR_JOB_HEARTBEAT_SECONDS', 30))
+TOUR_JOB_LEASE_SECONDS = int(os.getenv('TOUR_JOB_LEASE_SECONDS', 300))     # Mất heartbeat lâu hơn -> coi như worker đã chết
+TIME_FORMAT = "%d/%m/%Y %H:%M"
+
+_executor = None
+_submit_lock = threading.Lock()
+
+
+def validate_tour_params(attraction_ids, start_lat, start_lon, start_time_str, end_time_str, start_point_name=None):
+    """
+    Kiểm tra + chuẩn hóa tham số tạo tour (dùng chung cho /api/quick-tour-creator và /api/tour-jobs).
+    Sai thì raise ValueError với thông báo cho frontend.
+    """
+    if not attraction_ids:
+        raise ValueError("Chưa chọn điểm đến nào (param: attractionIds)")
+    if start_lat in (None, '') or start_lon in (None, ''):
+        raise ValueError("Thiếu tọa độ (param: startLat, startLon)")
+    if not start_time_str:
+        raise ValueError("Thiếu thời gian (param: startTime)")
+    if not end_time_str:
+        raise ValueError("Thiếu thời gian kết thúc (param: endTime)")
+
+    try:
+        start_time = datetime.strptime(start_time_str, TIME_FORMAT)
+        end_time = datetime.strptime(end_time_str, TIME_FORMAT)
+    except (TypeError, ValueError):
+        raise ValueError("Format time không hợp lệ")
+    if end_time <= start_time:
+        raise ValueError("Thời gian kết thúc phải sau thời gian bắt đầu")
+
+    try:
+        start_lat = float(start_lat)
+        start_lon = float(start_lon)
+    except (TypeError, ValueError):
+        raise ValueError("Tọa độ không hợp lệ (startLat, startLon phải là số)")
+    # Kiểm tra phạm vi hợp lệ cho tọa độ (lat: -90 đến 90, lon: -180 đến 180)
+    if not (-90 <= start_lat <= 90):
+        raise ValueError("Vĩ độ không hợp lệ (phải từ -90 đến 90)")
+    if not (-180 <= start_lon <= 180):
+        raise ValueError("Kinh độ không hợp lệ (phải từ -180 đến 180)")
+
+    return {
+        "attraction_ids": [int(i) for i in attraction_ids],
+        "start_lat": start_lat,
+        "start_lon": start_lon,
+        "start_datetime_str": start_time_str,
+        "end_datetime_str": end_time_str,
+        "start_point_name": start_point_name or None
+    }
+
+
+def _input_hash(params):
+    # Cùng tập điểm (khác thứ tự / trùng id) cho ra cùng lịch trình -> cùng hash, dùng lại job cũ
+    normalized = dict(params, attraction_ids=sorted(set(params["attraction_ids"])))
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _submit_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=TOUR_JOB_WORKERS, thread_name_prefix='tour-job')
+    return _executor
+
+
+def _claim_job(job_id):
+    """Chuyển queued -> running trong 1 câu UPDATE. False nếu job đã được process khác nhận / không còn queued."""
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        update(TourJob)
+        .where(TourJob.job_id == job_id, TourJob.status == 'queued')
+        .values(status='running', started_at=now, heartbeat_at=now)
+    ).rowcount
+    db.session.commit()
+    return claimed == 1
+
+
+def _heartbeat(engine, job_id, stop):
+    """Thread phụ: gia hạn lease của job đang chạy cho tới khi stop được set."""
+    while not stop.wait(TOUR_JOB_HEARTBEAT_SECONDS):
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    update(TourJob.__table__)
+                    .where(TourJob.__table__.c.job_id == job_id, TourJob.__table__.c.status == 'running')
+                    .values(heartbeat_at=datetime.utcnow())
+                )
+        except Exception as e:
+            logger.warning(f"[TourJob] {job_id} không cập nhật được heartbeat: {e}")
+
+
+def _run_job(app, job_id):
+    with app.app_context():
+        if not _claim_job(job_id):
+            db.session.remove()
+            return
+        job = db.session.get(TourJob, job_id)
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(db.engine, job_id, stop),
+                                     name=f'tour-job-heartbeat-{job_id[:8]}', daemon=True)
+        heartbeat.start()
+        try:
+            result = generate_smart_tour(**job.params)
+            # Chuẩn hóa về kiểu JSON thuần giống response của API
+            job.result = json.loads(app.json.dumps(result))
+            job.status = 'done'
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(TourJob, job_id)
+            logger.exception(f"[TourJob] {job_id} lỗi: {e}")
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            stop.set()
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        db.session.remove()
+
+
+def submit_tour_job(app, params):
+    """
+    Tạo job (hoặc trả về job giống hệt đang chạy / vừa xong). Trả về (TourJob, created).
+    params: dict từ validate_tour_params.
+    """
+    input_hash = _input_hash(params)
+    reuse_after = datetime.utcnow() - timedelta(seconds=TOUR_JOB_REUSE_SECONDS)
+
+    with _submit_lock:
+        existing = TourJob.query.filter(
+            TourJob.input_hash == input_hash,
+            TourJob.status.in_(('queued', 'running', 'done')),
+            TourJob.created_at >= reuse_after
+        ).order_by(TourJob.created_at.desc()).first()
+        if existing is not None:
+            return existing, False
+
+        job = TourJob(job_id=uuid.uuid4().hex, input_hash=input_hash, params=params, status='queued')
+        db.session.add(job)
+        db.session.commit()
+
+    _get_executor().submit(_run_job, app, job.job_id)
+    return job, True
+
+
+def get_tour_job(job_id):
+    job = db.session.get(TourJob, job_id)
+    if job is None:
+        raise LookupError(f"Không tìm thấy job {job_id}")
+    return job
+
+
+def requeue_stale_tour_jobs():
+    """Đưa các job 'running' mất heartbeat quá TOUR_JOB_LEASE_SECONDS về 'queued'. Trả về số job."""
+    cutoff = datetime.utcnow() - timedelta(seconds=TOUR_JOB_LEASE_SECONDS)
+    count = db.session.execute(
+        update(TourJob)
+        .where(
+            TourJob.status == 'running',
+            or_(TourJob.heartbeat_at < cutoff, TourJob.heartbeat_at.is_(None) & (TourJob.started_at < cutoff))
+        )
+        .values(status='queued', started_at=None, heartbeat_at=None)
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def resume_pending_tour_jobs(app, wait=True):
+    """
+    Dùng bởi resume_tour_jobs.py (không gọi lúc khởi động app): đưa job mất lease về 'queued'
+    rồi chạy mọi job 'queued'. Chạy song song với worker khác vẫn an toàn vì job được nhận bằng UPDATE.
+    wait=True: chờ chạy xong. Trả về (số job đưa lại hàng đợi, số job đã gửi chạy).
+    """
+    with app.app_context():
+        requeued = requeue_stale_tour_jobs()
+        pending_ids = [row[0] for row in db.session.query(TourJob.job_id).filter(TourJob.status == 'queued')]
+        db.session.remove()
+    futures = [_get_executor().submit(_run_job, app, job_id) for job_id in pending_ids]
+    if pending_ids:
+        logger.info(f"[TourJob] Chạy lại {len(pending_ids)} job còn dở ({requeued} job mất lease)")
+    if wait:
+        for future in futures:
+            future.result()
+    return requeued, len(pending_ids)
@@ -1,16 +1,106 @@
-from models import db, TourPackage, Attraction
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, with_polymorphic
+
+from models import db, TourPackage, TourPackageSummary, Attraction, Festival, CulturalSpot, package_attractions
+
+
+def _package_stats(package_ids=None, session=None):
+    """
+    Tính danh sách điểm + rating trung bình cho các gói tour bằng 1 câu SQL
+    (package_attractions JOIN attraction). package_ids=None -> mọi gói.
+    Trả về {package_id: (attraction_ids, average_rating)}.
+    """
+    session = session or db.session
+    query = session.query(
+        package_attractions.c.package_id, Attraction.id, Attraction.average_rating
+    ).join(Attraction, Attraction.id == package_attractions.c.attraction_id)
+    if package_ids is not None:
+        query = query.filter(package_attractions.c.package_id.in_(package_ids))
+
+    grouped = {}
+    for package_id, attraction_id, rating in query.order_by(package_attractions.c.package_id, Attraction.id):
+        grouped.setdefault(package_id, []).append((attraction_id, rating))
+
+    return {
+        package_id: ([a for a, _ in rows], sum(r for _, r in rows if r) / len(rows))
+        for package_id, rows in grouped.items()
+    }
+
+
+def refresh_package_summaries(package_ids=None, attraction_ids=None, session=None):
+    """
+    Làm mới bảng tour_package_summary (không tự commit).
+    - package_ids: các gói cần làm mới
+    - attraction_ids: làm mới các gói chứa những điểm này (VD khi rating điểm thay đổi)
+    - cả 2 đều None: làm mới toàn bộ
+    """
+    session = session or db.session
+    if attraction_ids is not None:
+        package_ids = {
+            row[0] for row in session.query(package_attractions.c.package_id)
+            .filter(package_attractions.c.attraction_id.in_(attraction_ids))
+        }
+        if not package_ids:
+            return 0
+
+    package_query = session.query(TourPackage.id)
+    summary_query = session.query(TourPackageSummary)
+    if package_ids is not None:
+        package_query = package_query.filter(TourPackage.id.in_(package_ids))
+        summary_query = summary_query.filter(TourPackageSummary.package_id.in_(package_ids))
+
+    existing_ids = {row[0] for row in package_query}
+    stats = _package_stats(existing_ids, session=session) if existing_ids else {}
+    summaries = {s.package_id: s for s in summary_query}
+    now = datetime.utcnow()
+
+    for package_id, summary in summaries.items():
+        if package_id not in existing_ids:
+            session.delete(summary)     # Gói đã bị xóa
+    for package_id in existing_ids:
+        attraction_list, average = stats.get(package_id, ([], 0.0))
+        summary = summaries.get(package_id)
+        if summary is None:
+            summary = TourPackageSummary(package_id=package_id)
+            session.add(summary)
+        summary.attraction_ids = attraction_list
+        summary.average_rating = average
+        summary.updated_at = now
+    return len(existing_ids)
+
+
+def ensure_package_summaries():
+    """Gọi lúc khởi động app: dựng lại bảng tóm tắt nếu lệch số gói (DB cũ, sửa tay...)."""
+    if TourPackageSummary.query.count() != TourPackage.query.count():
+        refresh_package_summaries()
+        db.session.commit()
+
 
 def get_all_packages_service():
     """
     Service để lấy danh sách tóm tắt tất cả các Gói Tour Chủ đề.
     Dùng cho việc hiển thị danh sách slider trên trang Service.js.
+    Đọc từ bảng tóm tắt tính sẵn (1 query JOIN), không query địa điểm của từng gói.
     """
     try:
-        packages = TourPackage.query.order_by(TourPackage.id.asc()).all()
-        packages_data = [pkg.to_json_brief() for pkg in packages]
-        
+        rows = db.session.query(TourPackage, TourPackageSummary)\
+            .outerjoin(TourPackageSummary, TourPackageSummary.package_id == TourPackage.id)\
+            .order_by(TourPackage.id.asc()).all()
+
+        missing_ids = [pkg.id for pkg, summary in rows if summary is None]
+        if missing_ids:
+            # Gói mới chưa có tóm tắt (VD thêm thẳng vào DB) -> tính bù 1 lần
+            refresh_package_summaries(missing_ids)
+            db.session.commit()
+            summaries = {s.package_id: s for s in TourPackageSummary.query.filter(TourPackageSummary.package_id.in_(missing_ids))}
+            rows = [(pkg, summary or summaries.get(pkg.id)) for pkg, summary in rows]
+
+        packages_data = [pkg.to_json_brief(summary) for pkg, summary in rows]
+
         return packages_data
-    
+
     except Exception as e:
         print(f"Error fetching all tour packages: {e}")
         raise Exception("Lỗi hệ thống khi tải danh sách gói tour")
@@ -24,12 +114,54 @@ def get_package_detail_service(package_id):
         raise ValueError("package_id là bắt buộc")
 
     try:
-        package = TourPackage.query.get(package_id) 
+        package = TourPackage.query.get(package_id)
         if not package:
             raise LookupError(f"Không tìm thấy gói tour với ID: {package_id}")
-        return package.to_json()
+
+        # Nạp các điểm 1 lần, kèm cột của Festival / CulturalSpot cho to_json_brief
+        poly = with_polymorphic(Attraction, [Festival, CulturalSpot])
+        attractions = db.session.query(poly)\
+            .join(package_attractions, package_attractions.c.attraction_id == poly.id)\
+            .filter(package_attractions.c.package_id == package_id)\
+            .order_by(poly.id).all()
+        return package.to_json(attractions=attractions)
     except LookupError:
         raise
     except Exception as e:
         print(f"Error fetching package detail for ID {package_id}: {e}")
-        raise Exception("Lỗi hệ thống khi tải chi tiết gói tour")
\ No newline at end of file
+        raise Exception("Lỗi hệ thống khi tải chi tiết gói tour")
+
+
+# --- Làm mới tóm tắt khi đổi thành viên gói: gom trong session, tính lại ngay trước commit ---
+def _pending(session):
+    return session.info.setdefault('package_summary_pending', set())
+
+
+@event.listens_for(TourPackage.attractions, 'append')
+@event.listens_for(TourPackage.attractions, 'remove')
+def _package_members_changed(target, value, initiator):
+    session = Session.object_session(target)
+    if session is not None:
+        _pending(session).add(target)
+
+
+@event.listens_for(TourPackage, 'after_insert')
+@event.listens_for(TourPackage, 'after_delete')
+def _package_saved_or_deleted(mapper, connection, target):
+    _pending(Session.object_session(target)).add(target)
+
+
+@event.listens_for(Session, 'before_commit')
+def _refresh_pending_summaries(session):
+    # Flush trước (commit cũng sẽ flush) để các gói vừa thêm / xóa kịp vào danh sách chờ
+    session.flush()
+    pending = session.info.pop('package_summary_pending', set())
+    package_ids = {pkg.id for pkg in pending if pkg.id is not None}
+    if package_ids:
+        refresh_package_summaries(package_ids, session=session)
+        session.flush()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_summaries(session):
+    session.info.pop('package_summary_pending', None)
@@ -1,19 +1,24 @@
 import requests
-import folium
 import re
 import heapq
 from datetime import datetime, timedelta
-from geopy.distance import geodesic
-from sqlalchemy.sql.functions import current_date
-from models import Attraction, Festival, CulturalSpot
-import numpy as np
-from sklearn.mixture import GaussianMixture
+from sqlalchemy.orm import with_polymorphic, selectinload
+from models import db, Attraction, Festival, CulturalSpot, AttractionTravel
+from .route_cache import get_shared_route_cache
+from .routing import _route_cache_key, get_route_with_cache, get_travel_time, prefetch_travel_matrix
+from .http_client import get_http_client, get_executor, get_http_stats
+from .geo_index import haversine_km, get_coord_index
+from .db_metrics import log_query_count
+from .tracing import span, profile_call
+from .day_clustering import capacity_cluster
+from .weather_cache import OPENWEATHERMAP_CURRENT_URL, get_forecast
+from .itinerary_cache import ITINERARY_CACHE_ENABLED, get_itinerary_cache, make_itinerary_key
+# numpy / sklearn chỉ nạp trong hàm cần dùng: worker không tạo tour không tốn thời gian import
 from dotenv import load_dotenv
 import os
 import logging
 
 load_dotenv()
-GRAPHHOPPER_API_KEY = os.getenv('GRAPHHOPPER_API_KEY')
 OPENWEATHERMAP_API_KEY = os.getenv('OPENWEATHERMAP_API_KEY')
 
 # --- CẤU HÌNH ---
@@ -23,6 +28,9 @@ MAX_DAY_DURATION_MINUTES = 660 # 11 tiếng hoạt động/ngày
 GMM_RANDOM_STATE = 42
 IDEAL_TIME_DEFAULT = 1         
 IDEAL_TIME_ORDER = {0: 0, 1: 1, 2: 2}
+MAX_ITEMS_PER_DAY = 3          # Số điểm chính tối đa mỗi ngày
+# Cách chia ngày: 'capacity' (engine có ràng buộc, mặc định) hoặc 'gmm' (GaussianMixture như cũ)
+TOUR_CLUSTERING_ENGINE = os.getenv('TOUR_CLUSTERING_ENGINE', 'capacity')
 
 # --- CẤU HÌNH LOGGING ---
 logging.basicConfig(
@@ -32,68 +40,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Danh sách các sân bay lớn tại Việt Nam (Tên, Lat, Lon)
-VIETNAM_AIRPORTS = {
-    "SGN": {"name": "Sân bay Tân Sơn Nhất (HCM)", "lat": 10.818463, "lon": 106.658825},
-    "HAN": {"name": "Sân bay Nội Bài (Hà Nội)", "lat": 21.218715, "lon": 105.804171},
-    "DAD": {"name": "Sân bay Đà Nẵng", "lat": 16.053813, "lon": 108.204041},
-    "CXR": {"name": "Sân bay Cam Ranh (Khánh Hòa)", "lat": 11.998183, "lon": 109.219373},
-    "PQC": {"name": "Sân bay Phú Quốc", "lat": 10.158092, "lon": 103.993931},
-    "HPH": {"name": "Sân bay Cát Bi (Hải Phòng)", "lat": 20.819262, "lon": 106.724836},
-    "VCA": {"name": "Sân bay Cần Thơ", "lat": 10.082729, "lon": 105.712170},
-    "HUI": {"name": "Sân bay Phú Bài (Huế)", "lat": 16.400557, "lon": 107.697042},
-    "VII": {"name": "Sân bay Vinh (Nghệ An)", "lat": 18.730302, "lon": 105.677322},
-}
-
-def find_nearest_airport(lat, lon):
-    """Tìm sân bay gần nhất"""
-    nearest_code = None
-    min_dist = float('inf')
-    
-    for code, info in VIETNAM_AIRPORTS.items():
-        dist = geodesic((lat, lon), (info['lat'], info['lon'])).km
-        if dist < min_dist:
-            min_dist = dist
-            nearest_code = code
-            
-    return VIETNAM_AIRPORTS[nearest_code], min_dist
-
-def _get_road_segment(coord_start, coord_end, vehicle='car'):
-    """
-    Gọi GraphHopper để lấy đường đi bộ chi tiết giữa 2 điểm ngắn.
-    Trả về: (distance_km, duration_min, list_of_coordinates)
-    """
-    base_url = "http://localhost:8989/route"
-    params = {
-        'point': [f"{coord_start[0]},{coord_start[1]}", f"{coord_end[0]},{coord_end[1]}"],
-        'profile': vehicle,
-        'locale': 'vi',
-        'points_encoded': 'false',
-        'calc_points': 'true',
-        'type': 'json'
-    }
-
-    try:
-        response = requests.get(base_url, params=params, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if 'paths' in data and len(data['paths']) > 0:
-                path = data['paths'][0]
-                dist = round(path['distance'] / 1000, 2)
-                mins = round(path['time'] / 60000)
-                coords = path['points']['coordinates']
-                return dist, mins, coords
-    except Exception as e:
-        print(f"[GraphHopper Internal Error] {e}")
-
-    # Fallback: Đường thẳng nếu GraphHopper lỗi
-    dist = geodesic(coord_start, coord_end).km
-    speed = 30 if dist < 5 else 40
-    mins = round((dist / speed) * 60)
-    # GeoJSON format: [lon, lat]
-    coords = [[coord_start[1], coord_start[0]], [coord_end[1], coord_end[0]]]
-    return round(dist, 2), mins, coords
-
 # --- HÀM TIỆN ÍCH LÀM TRÒN GIỜ & FORMAT ---
 def round_to_nearest_10_minutes(dt):
     """
@@ -120,107 +66,31 @@ def format_time_vn(dt):
     if not dt: return ""
     return f"{dt.hour}h{dt.minute:02d}p"
 
-def get_routing_info(coord_start, coord_end, vehicle='car'):
+def load_travel_matrix(attractions):
     """
-    Thông minh:
-    - Nếu đi máy bay: Tính đường bộ ra sân bay + bay + đường bộ về đích.
-    - Kết hợp đường đi chi tiết cho các chặng đường bộ.
+    Đọc ma trận khoảng cách tính sẵn (bảng attraction_travel) cho các điểm
+    trong tour bằng 1 query. Trả về dict key theo _route_cache_key.
+    Bỏ qua các cặp đã cũ (tọa độ đã thay đổi sau lần tính gần nhất).
     """
-    # 1. Tính khoảng cách đường chim bay tổng thể
-    dist_straight = geodesic(coord_start, coord_end).km
-    
-    # 2. LOGIC MÁY BAY (Nếu xa hơn 400km)
-    if dist_straight > 400:
-        # A. Tìm sân bay
-        airport_start, dist_to_start_airport = find_nearest_airport(coord_start[0], coord_start[1])
-        airport_end, dist_from_end_airport = find_nearest_airport(coord_end[0], coord_end[1])
-        
-        print(f"[Smart Route] Kết hợp: {airport_start['name']} -> {airport_end['name']}")
-        
-        # B. Tính toán 3 chặng
-        # Chặng 1: Điểm đi -> Sân bay đi (Đường bộ chi tiết)
-        d1, t1, coords1 = _get_road_segment(coord_start, (airport_start['lat'], airport_start['lon']))
-        
-        # Chặng 2: Bay (Đường thẳng)
-        flight_dist = geodesic((airport_start['lat'], airport_start['lon']), 
-                               (airport_end['lat'], airport_end['lon'])).km
-        t2 = (flight_dist / 800) * 60 # Giả định bay 800km/h
-        # Tạo đường thẳng bay (2 điểm)
-        coords2 = [
-            [airport_start['lon'], airport_start['lat']], 
-            [airport_end['lon'], airport_end['lat']]
-        ]
-
-        # Chặng 3: Sân bay đến -> Điểm đến (Đường bộ chi tiết)
-        d3, t3, coords3 = _get_road_segment((airport_end['lat'], airport_end['lon']), coord_end)
-
-        # C. Tổng hợp
-        total_dist = round(d1 + flight_dist + d3, 2)
-        # Thời gian = Đi xe 1 + Bay + Đi xe 3 + 120p thủ tục
-        total_time = int(t1 + t2 + t3 + 120) 
-        
-        # Nối 3 đoạn đường lại thành 1 danh sách tọa độ duy nhất
-        # coords1 + coords2 + coords3
-        full_coordinates = coords1 + coords2 + coords3
-
-        geometry = {
-            'type': 'LineString',
-            'coordinates': full_coordinates
-        }
-        
-        route_desc = f"plane:{airport_start['name']}-{airport_end['name']}"
-        return total_dist, total_time, geometry, route_desc
-
-    # 3. LOGIC XE (Gần < 400km) - Gọi hàm helper trực tiếp
-    dist, mins, coords = _get_road_segment(coord_start, coord_end, vehicle)
-    
-    geometry = {
-        'type': 'LineString',
-        'coordinates': coords
-    }
-    return dist, mins, geometry, "car"
-
-def _route_cache_key(coord_start, coord_end):
-    return (
-        round(coord_start[0], 5), round(coord_start[1], 5),
-        round(coord_end[0], 5), round(coord_end[1], 5)
-    )
-
-
-def get_route_with_cache(coord_start, coord_end, cache):
-    key = _route_cache_key(coord_start, coord_end)
-    if key in cache:
-        return cache[key]
-
-    # Hứng 4 giá trị từ API/Hàm tính toán
-    distance_km, duration_min, geometry, mode = get_routing_info(coord_start, coord_end)
-    
-    # Lưu chiều xuôi vào cache
-    cache[key] = (distance_km, duration_min, geometry, mode)
+    coords = {a.id: (a.lat, a.lon) for a in attractions}
+    if len(coords) < 2:
+        return {}
+
+    ids = list(coords.keys())
+    rows = AttractionTravel.query.filter(
+        AttractionTravel.from_id.in_(ids),
+        AttractionTravel.to_id.in_(ids)
+    ).all()
+
+    matrix = {}
+    for row in rows:
+        start, end = coords[row.from_id], coords[row.to_id]
+        if (row.from_lat, row.from_lon) != start or (row.to_lat, row.to_lon) != end:
+            continue
+        matrix[_route_cache_key(start, end)] = (row.distance_km, row.duration_min, row.mode)
 
-    # Xử lý cache chiều ngược
-    reverse_key = _route_cache_key(coord_end, coord_start)
-    
-    reversed_geometry = None
-    if geometry and 'coordinates' in geometry:
-        reversed_geometry = {
-            'type': geometry['type'],
-            'coordinates': list(reversed(geometry['coordinates']))
-        }
-    
-    # Logic đảo ngược tên sân bay cho biến mode
-    reverse_mode = mode
-    if isinstance(mode, str) and mode.startswith('plane:'):
-        try:
-            prefix, names = mode.split(':', 1)
-            airport_start, airport_end = names.split('-')
-            reverse_mode = f"{prefix}:{airport_end}-{airport_start}"
-        except ValueError:
-            pass
-            
-    cache[reverse_key] = (distance_km, duration_min, reversed_geometry, reverse_mode)
-    
-    return cache[key]
+    logger.info(f"Ma trận tính sẵn: {len(matrix)}/{len(ids) * (len(ids) - 1)} cặp")
+    return matrix
 
 def parse_opening_hours(open_str):
     """
@@ -252,22 +122,13 @@ def get_weather_by_date_and_coordinates(api_key, date, lat, lon):
     """
     Lấy dự báo thời tiết cho ngày cụ thể sử dụng OpenWeatherMap Forecast API.
     API forecast trả về dự báo 5 ngày với khoảng thời gian 3 giờ.
+    Response được cache theo ô lưới tọa độ (service/weather_cache.py):
+    tour 5 ngày quanh 1 khu vực chỉ tốn 1 lần gọi API.
     """
-    base_url = "http://api.openweathermap.org/data/2.5/forecast"
-
-    params = {
-        'lat': lat,
-        'lon': lon,
-        'appid': api_key,
-        'units': 'metric',
-        'cnt': 40
-    }
-
     try:
-        response = requests.get(base_url, params=params, timeout=10)
+        data = get_forecast(api_key, lat, lon)
 
-        if response.status_code == 200:
-            data = response.json()
+        if data is not None:
             target_date_str = date.strftime("%Y-%m-%d")
 
             # Tìm dự báo cho ngày được chỉ định
@@ -285,12 +146,12 @@ def get_weather_by_date_and_coordinates(api_key, date, lat, lon):
                 if target_date_str == datetime.now().strftime("%Y-%m-%d"):
                     try:
                         print("[Weather] Attempting to fetch Current Weather fallback...")
-                        current_url = "https://api.openweathermap.org/data/2.5/weather"
+                        current_url = OPENWEATHERMAP_CURRENT_URL
                         c_params = {
                             'lat': lat, 'lon': lon, 
                             'appid': api_key, 'units': 'metric'
                         }
-                        c_res = requests.get(current_url, params=c_params, timeout=5)
+                        c_res = get_http_client().get(current_url, endpoint='openweathermap.weather', params=c_params, timeout=5)
                         if c_res.status_code == 200:
                             c_data = c_res.json()
                             # Giả lập cấu trúc dữ liệu giống forecast để trả về
@@ -347,7 +208,6 @@ def get_weather_by_date_and_coordinates(api_key, date, lat, lon):
             return weather_info
 
         else:
-            print(f"[Weather Error] Status: {response.status_code}, Message: {response.text}")
             return None
 
     except requests.exceptions.RequestException as e:
@@ -355,6 +215,15 @@ def get_weather_by_date_and_coordinates(api_key, date, lat, lon):
         return None
 
 
+def load_attractions_with_details(attraction_ids):
+    """
+    Load attraction đa hình (kèm cột của Festival / CulturalSpot) và tags bằng 2 query,
+    tránh lazy-load từng điểm khi kiểm tra lễ hội / giờ mở cửa / độ liên quan tags.
+    """
+    poly = with_polymorphic(Attraction, [Festival, CulturalSpot])
+    return db.session.query(poly).options(selectinload(poly.tags)).filter(poly.id.in_(attraction_ids)).all()
+
+
 def is_attraction_available(attraction, current_time=None, start_datetime=None, end_datetime=None):
     """
     Kiểm tra tình trạng mở cửa.
@@ -364,7 +233,7 @@ def is_attraction_available(attraction, current_time=None, start_datetime=None,
     """
     # 1. Check Festival
     if attraction.type == 'festival':
-        fes = Festival.query.get(attraction.id)
+        fes = attraction  # Đã load đa hình (Festival) từ đầu pipeline, không query lại
         if not fes or not fes.time_start: return False, "Thiếu thời gian"
         
         # Logic check năm
@@ -397,7 +266,7 @@ def is_attraction_available(attraction, current_time=None, start_datetime=None,
 
     # 2. Check CulturalSpot
     elif attraction.type == 'cultural_spot':
-        spot = CulturalSpot.query.get(attraction.id)
+        spot = attraction  # Đã load đa hình (CulturalSpot), có sẵn opening_hours
         if spot and spot.opening_hours:
             hours = parse_opening_hours(spot.opening_hours)
             if hours and current_time:
@@ -451,25 +320,30 @@ def calculate_tag_relevance(main_attr, candidate_attr):
         
     return score
 
-def find_supplementary_attraction(current_loc, current_time, visited_ids, main_attr, cache, max_day_limit_time):
+def find_supplementary_attraction(current_loc, current_time, visited_ids, main_attr, cache, max_day_limit_time, pool=None):
     """
     Tìm địa điểm B phụ:
     1. Gần A (bán kính < 5km).
     2. Chưa đi (không nằm trong visited_ids).
     3. Thỏa mãn thời gian: Đi + Chơi <= Giờ đóng cửa & <= Giới hạn ngày.
     4. Sắp xếp theo độ liên quan tags.
+    pool: dict id -> attraction đã load đầy đủ trong request, chỉ query những điểm chưa có.
     """
-    # Lấy tất cả địa điểm trong DB trừ những điểm đã đi
-    candidates = Attraction.query.filter(Attraction.id.notin_(visited_ids)).all()
+    # 1. Lọc sơ bộ khoảng cách (Chim bay < 10km để đỡ tốn API) trên index tọa độ trong RAM,
+    # chỉ nạp từ DB những điểm chưa đi nằm trong bán kính
+    nearby_ids, _ = get_coord_index().within_radius(current_loc[0], current_loc[1], 10, exclude_ids=visited_ids)
+    if not nearby_ids:
+        return None
+    if pool is None:
+        pool = {}
+    missing_ids = [i for i in nearby_ids if i not in pool]
+    if missing_ids:
+        pool.update({a.id: a for a in load_attractions_with_details(missing_ids)})
+    candidates = [pool[i] for i in sorted(nearby_ids) if i in pool]
     
     valid_candidates = []
     
     for cand in candidates:
-        # 1. Lọc sơ bộ khoảng cách (Chim bay < 10km để đỡ tốn API)
-        dist_straight = geodesic(current_loc, (cand.lat, cand.lon)).km
-        if dist_straight > 10: 
-            continue
-
         # 2. Tính toán đường đi thực tế
         dist, travel_min, geometry, mode = get_route_with_cache(current_loc, (cand.lat, cand.lon), cache)
         
@@ -498,8 +372,8 @@ def find_supplementary_attraction(current_loc, current_time, visited_ids, main_a
         # 5. Kiểm tra giờ đóng cửa cụ thể của địa điểm B
         # Hàm is_attraction_available chỉ check lúc đến, giờ check lúc về
         if cand.type == 'cultural_spot':
-             # Query lại để lấy giờ đóng cửa chính xác
-             spot = CulturalSpot.query.get(cand.id)
+             # Ứng viên đã được load kèm cột của CulturalSpot
+             spot = cand
              if spot and spot.opening_hours:
                  h_range = parse_opening_hours(spot.opening_hours)
                  if h_range:
@@ -549,7 +423,7 @@ def ideal_time_code(attraction):
     return IDEAL_TIME_ORDER.get(raw, IDEAL_TIME_ORDER[IDEAL_TIME_DEFAULT])
 
 
-def estimate_cluster_duration(attractions, start_location, cache):
+def estimate_cluster_duration(attractions, start_location, cache, matrix=None):
     """
     Ước lượng tổng thời gian (di chuyển + tham quan + ĂN UỐNG) cho một cụm.
     """
@@ -565,8 +439,8 @@ def estimate_cluster_duration(attractions, start_location, cache):
     
     while pending:
         # Tìm điểm gần nhất
-        nearest = min(pending, key=lambda attr: get_route_with_cache(current, (attr.lat, attr.lon), cache)[0])
-        _, travel_min, _, _ = get_route_with_cache(current, (nearest.lat, nearest.lon), cache)
+        nearest = min(pending, key=lambda attr: get_travel_time(current, (attr.lat, attr.lon), cache, matrix)[0])
+        _, travel_min, _ = get_travel_time(current, (nearest.lat, nearest.lon), cache, matrix)
         
         # Cộng thời gian di chuyển
         total_minutes += travel_min
@@ -588,7 +462,7 @@ def estimate_cluster_duration(attractions, start_location, cache):
     return total_minutes
 
 
-def cluster_attractions_with_gmm(attractions, start_location, max_days, cache, max_duration):
+def cluster_attractions_with_gmm(attractions, start_location, max_days, cache, max_duration, matrix=None):
     """
     Chia điểm đến thành các nhóm bằng Gaussian Mixture Model sao cho
     thời gian mỗi nhóm <= max_duration (khi có thể).
@@ -601,12 +475,17 @@ def cluster_attractions_with_gmm(attractions, start_location, max_days, cache, m
         # Trả về 1 cụm duy nhất chứa địa điểm đó
         return [attractions], [[attractions[0].lat / 180.0, attractions[0].lon / 180.0, 0, 0, 0]]
     
+    from sklearn.mixture import GaussianMixture    # Nạp khi cần (~2s), chỉ dùng với TOUR_CLUSTERING_ENGINE=gmm
+
     capped_days = min(max_days, len(attractions))
     capped_days = max(1, capped_days)
 
+    coords = [(attr.lat, attr.lon) for attr in attractions]
+    matrix = prefetch_travel_matrix([start_location] + coords, coords, cache, matrix)
+
     features = []
     for attr in attractions:
-        _, travel_min, _, _ = get_route_with_cache(start_location, (attr.lat, attr.lon), cache)
+        _, travel_min, _ = get_travel_time(start_location, (attr.lat, attr.lon), cache, matrix)
         features.append([
             attr.lat / 180.0,
             attr.lon / 180.0,
@@ -623,7 +502,7 @@ def cluster_attractions_with_gmm(attractions, start_location, max_days, cache, m
             clusters[label].append(attractions[idx])
 
         durations_ok = all(
-            estimate_cluster_duration(cluster, start_location, cache) <= max_duration
+            estimate_cluster_duration(cluster, start_location, cache, matrix) <= max_duration
             for cluster in clusters.values()
         )
         if durations_ok:
@@ -639,6 +518,39 @@ def cluster_attractions_with_gmm(attractions, start_location, max_days, cache, m
 
     return list(clusters.values()), gmm.means_.tolist()
 
+def cluster_attractions_by_capacity(attractions, start_location, max_days, cache, max_duration, matrix=None,
+                                    max_items_per_day=MAX_ITEMS_PER_DAY):
+    """
+    Chia điểm đến thành các ngày bằng engine phân cụm có ràng buộc (service/day_clustering.py):
+    mỗi cụm <= max_items_per_day điểm và <= max_duration phút (khi có thể), làm 1 lượt
+    trên ma trận thời gian di chuyển thay vì fit GMM nhiều lần.
+    Không tạo quá max_days cụm: hết ngày thì điểm còn lại vào cụm bị quá tải ít nhất.
+    Trả về (clusters, centers) cùng định dạng cluster_attractions_with_gmm.
+    """
+    if not attractions:
+        return [], []
+
+    points = [start_location] + [(attr.lat, attr.lon) for attr in attractions]
+    matrix = prefetch_travel_matrix(points, points[1:], cache, matrix)
+
+    travel = [[0] * len(points) for _ in points]
+    for i, start in enumerate(points):
+        for j, end in enumerate(points[1:], start=1):
+            if i != j:
+                travel[i][j] = get_travel_time(start, end, cache, matrix)[1]
+        if i > 0:
+            # Chiều về điểm xuất phát không dùng khi ước lượng, lấy đối xứng để chọn tâm cụm
+            travel[i][0] = travel[0][i]
+    visit = [0] + [approximate_visit_duration(attr) for attr in attractions]
+
+    groups = capacity_cluster(travel, visit, max_duration, max_items_per_day, max_clusters=max_days)
+    clusters = [[attractions[i - 1] for i in group] for group in groups]
+    centers = [
+        [sum(a.lat for a in cl) / len(cl) / 180.0, sum(a.lon for a in cl) / len(cl) / 180.0, 0, 0, 0]
+        for cl in clusters
+    ]
+    return clusters, centers
+
 def post_process_clusters_capacity(clusters, max_items_per_day=3):
     """
     Hậu xử lý: Kiểm tra nếu cụm nào > 3 điểm thì tách ra.
@@ -670,9 +582,11 @@ def post_process_clusters_capacity(clusters, max_items_per_day=3):
         
     return new_clusters 
 
-def find_mst_tour_order(attractions, start_location, cache):
+def find_mst_tour_order(attractions, start_location, cache, matrix=None):
     """
     Tạo thứ tự tham quan dựa trên Minimum Spanning Tree (Prim + DFS).
+    Chỉ cần khoảng cách/thời gian nên đọc từ ma trận tính sẵn (nếu có),
+    không lấy geometry cho các chặng.
     """
     n = len(attractions)
     if n == 0:
@@ -686,10 +600,13 @@ def find_mst_tour_order(attractions, start_location, cache):
 
     coords = [(attr.lat, attr.lon) for attr in attractions]
 
+    # Lấy trước khoảng cách mọi cặp (xuất phát + các điểm) bằng Matrix API theo lô
+    matrix = prefetch_travel_matrix([start_location] + coords, coords, cache, matrix)
+
     # Chọn node bắt đầu là điểm gần nhất với vị trí xuất phát
     start_idx = min(
         range(n),
-        key=lambda idx: get_route_with_cache(start_location, coords[idx], cache)[0]
+        key=lambda idx: get_travel_time(start_location, coords[idx], cache, matrix)[0]
     )
 
     visited = {start_idx}
@@ -700,7 +617,7 @@ def find_mst_tour_order(attractions, start_location, cache):
     for j in range(n):
         if j == start_idx:
             continue
-        dist, _, _, _ = get_route_with_cache(coords[start_idx], coords[j], cache)
+        dist, _, _ = get_travel_time(coords[start_idx], coords[j], cache, matrix)
         heapq.heappush(heap, (dist, start_idx, j))
 
     # Mở rộng MST
@@ -715,7 +632,7 @@ def find_mst_tour_order(attractions, start_location, cache):
         for nxt in range(n):
             if nxt in visited:
                 continue
-            ndist, _, _, _ = get_route_with_cache(coords[to], coords[nxt], cache)
+            ndist, _, _ = get_travel_time(coords[to], coords[nxt], cache, matrix)
             heapq.heappush(heap, (ndist, to, nxt))
 
     # DFS để lấy thứ tự tham quan
@@ -732,7 +649,7 @@ def find_mst_tour_order(attractions, start_location, cache):
 
         neighbors = sorted(
             adjacency[node],
-            key=lambda idx: get_route_with_cache(coords[node], coords[idx], cache)[0],
+            key=lambda idx: get_travel_time(coords[node], coords[idx], cache, matrix)[0],
             reverse=True
         )
         stack.extend(neighbors)
@@ -747,13 +664,12 @@ def find_mst_tour_order(attractions, start_location, cache):
 
     for attr in order:
         coord = (attr.lat, attr.lon)
-        dist, travel_min, geometry, _ = get_route_with_cache(current_coord, coord, cache)
+        dist, travel_min, _ = get_travel_time(current_coord, coord, cache, matrix)
         legs.append({
             "from": current_label,
             "to": attr.id,
             "distance": dist,
-            "travel_minutes": travel_min,
-            "geometry": geometry
+            "travel_minutes": travel_min
         })
         total_distance += dist
         total_travel_time += travel_min
@@ -775,6 +691,7 @@ def assign_clusters_to_days(clusters, centers, festival_constraints, start_locat
     """
     if not clusters:
         return []
+    import numpy as np
 
     wrapped = []
     for idx, items in enumerate(clusters):
@@ -846,10 +763,12 @@ def assign_clusters_to_days(clusters, centers, festival_constraints, start_locat
     return day_slots
 
 
-def build_day_itinerary(day_number, day_attractions, day_start_datetime, start_location, cache, order_index_map):
+def build_day_itinerary(day_number, day_attractions, day_start_datetime, start_location, cache, order_index_map, matrix=None, pool=None):
     """
     Sinh timeline cho từng ngày.
     Thêm Post-Visit Meal Check để đảm bảo không bị 'đói' khi đi điểm phụ.
+    Các bước chỉ cần thời gian di chuyển đọc từ ma trận tính sẵn, geometry chỉ lấy
+    cho chặng thực sự được đưa vào timeline.
     """
     logger.info(f"--- BẮT ĐẦU XÂY DỰNG NGÀY {day_number}: {len(day_attractions)} điểm ---")
 
@@ -926,7 +845,7 @@ def build_day_itinerary(day_number, day_attractions, day_start_datetime, start_l
         logger.debug(f"Đang xét điểm ưu tiên: {best_candidate.name}")
         
         # Tính toán di chuyển
-        dist, t_min, _, _ = get_route_with_cache(current_loc, (best_candidate.lat, best_candidate.lon), cache)
+        dist, t_min, _ = get_travel_time(current_loc, (best_candidate.lat, best_candidate.lon), cache, matrix)
         arrival_raw = current_time + timedelta(minutes=t_min)
         arrival_time = round_to_nearest_10_minutes(arrival_raw)
         
@@ -939,11 +858,11 @@ def build_day_itinerary(day_number, day_attractions, day_start_datetime, start_l
             open_dt = arrival_time.replace(hour=int(open_info), minute=int((open_info-int(open_info))*60))
             if (open_dt - arrival_time).total_seconds()/60 > 45 and len(candidates) > 1:
                 for alt in candidates[1:]:
-                    _, t_alt, _, _ = get_route_with_cache(current_loc, (alt.lat, alt.lon), cache)
+                    _, t_alt, _ = get_travel_time(current_loc, (alt.lat, alt.lon), cache, matrix)
                     arr_alt = round_to_nearest_10_minutes(current_time + timedelta(minutes=t_alt))
                     if is_attraction_available(alt, arr_alt)[0]:
                         vis_alt = approximate_visit_duration(alt)
-                        _, t_back, _, _ = get_route_with_cache((alt.lat, alt.lon), (best_candidate.lat, best_candidate.lon), cache)
+                        _, t_back, _ = get_travel_time((alt.lat, alt.lon), (best_candidate.lat, best_candidate.lon), cache, matrix)
                         if arr_alt + timedelta(minutes=vis_alt + t_back) >= open_dt:
                             final_target = alt; break
         
@@ -1087,7 +1006,8 @@ def build_day_itinerary(day_number, day_attractions, day_start_datetime, start_l
                 visited_ids=visited_ids,
                 main_attr=final_target,
                 cache=cache,
-                max_day_limit_time=day_end_limit
+                max_day_limit_time=day_end_limit,
+                pool=pool
             )
             
             if supp:
@@ -1144,12 +1064,70 @@ def build_day_itinerary(day_number, day_attractions, day_start_datetime, start_l
 
     return day_events, stats, routes, current_loc, current_time
 
-def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str, end_datetime_str, start_point_name=None):
+def split_clusters_by_region(valid_attrs, start_lat):
     """
-    Hàm tạo lịch trình thông minh V3 (Final).
+    Chia cụm theo vùng miền khi các điểm cách nhau quá xa (>500km):
+    sắp Bắc -> Nam (hoặc ngược lại theo điểm xuất phát), cắt cụm khi 2 điểm liền kề cách nhau >= 200km.
+    Trả về (clusters, centers).
+    """
+    # 1. Sắp xếp Bắc -> Nam
+    is_start_north = start_lat > 16 
+    sorted_attrs = sorted(valid_attrs, key=lambda x: x.lat, reverse=is_start_north)
+
+    # 2. Gom cụm
+    clusters = []
+    current_cluster = [sorted_attrs[0]]
+
+    # Khoảng cách giữa các điểm liền kề (theo thứ tự đã sắp) tính 1 lần trên mảng
+    import numpy as np
+    lats = np.array([a.lat for a in sorted_attrs])
+    lons = np.array([a.lon for a in sorted_attrs])
+    step_dists = haversine_km(lats[:-1], lons[:-1], lats[1:], lons[1:])
+
+    for i in range(1, len(sorted_attrs)):
+        curr = sorted_attrs[i]
+        dist = step_dists[i - 1]
+
+        if dist < 200: 
+            current_cluster.append(curr)
+        else:
+            clusters.append(current_cluster)
+            current_cluster = [curr]
+
+    if current_cluster:
+        clusters.append(current_cluster)
+
+    # 3. Tính Centers
+    centers = []
+    for i, cl in enumerate(clusters):
+        if cl:
+            # Tính trung bình
+            sum_lat = sum(a.lat for a in cl)
+            sum_lon = sum(a.lon for a in cl)
+            count = len(cl)
+
+            avg_lat = sum_lat / count
+            avg_lon = sum_lon / count
+
+            # In log để kiểm tra dữ liệu gốc
+            logger.error(f"[DEBUG CLUSTER {i+1}] Gồm các điểm: {[a.name for a in cl]}")
+            logger.error(f" -> Dữ liệu gốc: Lat={[a.lat for a in cl]}, Lon={[a.lon for a in cl]}")
+            logger.error(f" -> Trung bình tính được: Lat={avg_lat}, Lon={avg_lon}")
+
+            # [QUAN TRỌNG] Append đúng thứ tự (Lat, Lon)
+            centers.append((avg_lat / 180.0, avg_lon / 180.0))
+
+    logger.info(f"Centers final list: {centers}")
+    return clusters, centers
+
+@log_query_count("generate_smart_tour")
+def _build_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str, end_datetime_str, start_point_name=None):
+    """
+    Tính lịch trình (chưa kèm thời tiết), dùng bởi generate_smart_tour.
+    Trả về (kết quả, danh sách điểm cần lấy thời tiết, {ngày: future thời tiết đã gửi đi}).
     Tính năng:
     - Xử lý đa năm (2025-2026).
-    - Tối ưu hóa cụm (GMM + MST).
+    - Tối ưu hóa cụm (chia ngày theo sức chứa hoặc GMM + MST).
     - Smart Transit: Di chuyển đón đầu vào buổi tối nếu chặng sau quá xa.
     """
     logger.info(f"====== REQUEST TẠO TOUR MỚI ======")
@@ -1162,25 +1140,30 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
             "timeline": [], "routes": {}, "dailySummaries": [], 
             "invalidAttractions": [{"id": -1, "name": "LỖI GIỚI HẠN", "reason": error_msg}],
             "totalDays": 0, "totalDestinations": 0, "totalDistanceKm": 0
-        }
+        }, [], {}
     
     # 1. Parse thời gian
-    try:
-        start_dt = datetime.strptime(start_datetime_str, "%d/%m/%Y %H:%M")
-        end_dt = datetime.strptime(end_datetime_str, "%d/%m/%Y %H:%M")
-    except ValueError:
+    with span("parse_time"):
         try:
-            start_dt = datetime.strptime(start_datetime_str, "%d/%m/%Y")
-            end_dt = datetime.strptime(end_datetime_str, "%d/%m/%Y")
+            start_dt = datetime.strptime(start_datetime_str, "%d/%m/%Y %H:%M")
+            end_dt = datetime.strptime(end_datetime_str, "%d/%m/%Y %H:%M")
         except ValueError:
-            start_dt = datetime.now()
-            end_dt = start_dt + timedelta(days=1)
+            try:
+                start_dt = datetime.strptime(start_datetime_str, "%d/%m/%Y")
+                end_dt = datetime.strptime(end_datetime_str, "%d/%m/%Y")
+            except ValueError:
+                start_dt = datetime.now()
+                end_dt = start_dt + timedelta(days=1)
 
     start_location = (start_lat, start_lon)
-    route_cache = {}
+    # Cache route dùng chung giữa các request (RAM + SQLite)
+    route_cache = get_shared_route_cache()
     
     # 2. Lấy dữ liệu và Lọc sơ bộ
-    raw_attrs = Attraction.query.filter(Attraction.id.in_(attraction_ids)).all()
+    # Load 1 lần kèm cột Festival/CulturalSpot + tags, truyền nguyên object qua cả pipeline
+    with span("load_attractions"):
+        raw_attrs = load_attractions_with_details(attraction_ids)
+    attraction_pool = {a.id: a for a in raw_attrs}
     clean_attrs = []
     for a in raw_attrs:
         # Chỉ lấy điểm có tọa độ hợp lệ
@@ -1191,14 +1174,15 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
     valid_attrs = []
     invalid_attrs = []
     
-    for a in clean_attrs:
-        is_ok, reason = is_attraction_available(a, start_datetime=start_dt, end_datetime=end_dt)
-        if is_ok:
-            valid_attrs.append(a)
-        else:
-            rt = str(reason)
-            logger.warning(f" [LOẠI BỎ] {a.name}: {rt}")
-            invalid_attrs.append({"id": a.id, "name": a.name, "reason": rt})
+    with span("availability_filter"):
+        for a in clean_attrs:
+            is_ok, reason = is_attraction_available(a, start_datetime=start_dt, end_datetime=end_dt)
+            if is_ok:
+                valid_attrs.append(a)
+            else:
+                rt = str(reason)
+                logger.warning(f" [LOẠI BỎ] {a.name}: {rt}")
+                invalid_attrs.append({"id": a.id, "name": a.name, "reason": rt})
 
     logger.info(f"Sau khi lọc: {len(valid_attrs)} điểm hợp lệ / {len(clean_attrs)} tổng số")
 
@@ -1208,23 +1192,29 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
             "timeline": [], "routes": {}, "dailySummaries": [], 
             "invalidAttractions": invalid_attrs,
             "totalDays": 0, "totalDestinations": 0, "totalDistanceKm": 0
-        }
+        }, [], {}
 
     # 3. Tính toán số ngày và Phân cụm
     max_days_allowed = max(1, (end_dt.date() - start_dt.date()).days + 1)
     
-    mst_res = find_mst_tour_order(valid_attrs, start_location, route_cache)
+    # Ma trận khoảng cách tính sẵn giữa các điểm trong tour (1 query)
+    with span("travel_matrix"):
+        travel_matrix = load_travel_matrix(valid_attrs)
+
+    with span("mst_order"):
+        mst_res = find_mst_tour_order(valid_attrs, start_location, route_cache, travel_matrix)
     
-    festival_constraints = []
-    for attr in valid_attrs:
-        if attr.type == 'festival':
-            fes = Festival.query.get(attr.id)
-            if fes and fes.time_start:
-                offset = (fes.time_start.date() - start_dt.date()).days
-                if offset < 0: offset = 0
-                if offset >= max_days_allowed: offset = max_days_allowed - 1
-                
-                festival_constraints.append({"attraction": attr, "day_offset": offset})
+    with span("festival_constraints"):
+        festival_constraints = []
+        for attr in valid_attrs:
+            if attr.type == 'festival':
+                fes = attr
+                if fes and fes.time_start:
+                    offset = (fes.time_start.date() - start_dt.date()).days
+                    if offset < 0: offset = 0
+                    if offset >= max_days_allowed: offset = max_days_allowed - 1
+                    
+                    festival_constraints.append({"attraction": attr, "day_offset": offset})
 
     # Kiểm tra khoảng cách cực đại giữa các điểm
     max_dist = 0
@@ -1233,70 +1223,39 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
         sorted_by_lat = sorted(valid_attrs, key=lambda x: x.lat)
         p1 = sorted_by_lat[0]
         p2 = sorted_by_lat[-1]
-        max_dist = geodesic((p1.lat, p1.lon), (p2.lat, p2.lon)).km
+        max_dist = float(haversine_km(p1.lat, p1.lon, p2.lat, p2.lon))
 
     logger.info(f"Khoảng cách xa nhất giữa các điểm: {max_dist:.2f} km")
 
     if max_dist > 500:
         logger.warning("Phát hiện các điểm cách xa nhau (>500km). Chuyển sang chế độ chia ngày theo Vùng miền.")
-        
-        # 1. Sắp xếp Bắc -> Nam
-        is_start_north = start_lat > 16 
-        sorted_attrs = sorted(valid_attrs, key=lambda x: x.lat, reverse=is_start_north)
-        
-        # 2. Gom cụm
-        clusters = []
-        current_cluster = [sorted_attrs[0]]
-        
-        for i in range(1, len(sorted_attrs)):
-            prev = current_cluster[-1]
-            curr = sorted_attrs[i]
-            dist = geodesic((prev.lat, prev.lon), (curr.lat, curr.lon)).km
-            
-            if dist < 200: 
-                current_cluster.append(curr)
-            else:
-                clusters.append(current_cluster)
-                current_cluster = [curr]
-                
-        if current_cluster:
-            clusters.append(current_cluster)
-
-        # 3. Tính Centers
-        centers = []
-        for i, cl in enumerate(clusters):
-            if cl:
-                # Tính trung bình
-                sum_lat = sum(a.lat for a in cl)
-                sum_lon = sum(a.lon for a in cl)
-                count = len(cl)
-                
-                avg_lat = sum_lat / count
-                avg_lon = sum_lon / count
-                
-                # In log để kiểm tra dữ liệu gốc
-                logger.error(f"[DEBUG CLUSTER {i+1}] Gồm các điểm: {[a.name for a in cl]}")
-                logger.error(f" -> Dữ liệu gốc: Lat={[a.lat for a in cl]}, Lon={[a.lon for a in cl]}")
-                logger.error(f" -> Trung bình tính được: Lat={avg_lat}, Lon={avg_lon}")
-
-                # [QUAN TRỌNG] Append đúng thứ tự (Lat, Lon)
-                centers.append((avg_lat / 180.0, avg_lon / 180.0))
-        
-        logger.info(f"Centers final list: {centers}")
+        with span("clustering"):
+            clusters, centers = split_clusters_by_region(valid_attrs, start_lat)
 
     else:
-        # Nếu gần nhau, dùng GMM như cũ
-        logger.info("Khoảng cách gần, sử dụng thuật toán GMM.")
-        clusters, centers = cluster_attractions_with_gmm(
-            valid_attrs, start_location, max_days_allowed, route_cache, MAX_DAY_DURATION_MINUTES
-        )
+        if TOUR_CLUSTERING_ENGINE == 'gmm':
+            # Nếu gần nhau, dùng GMM như cũ
+            logger.info("Khoảng cách gần, sử dụng thuật toán GMM.")
+            with span("clustering"):
+                clusters, centers = cluster_attractions_with_gmm(
+                    valid_attrs, start_location, max_days_allowed, route_cache, MAX_DAY_DURATION_MINUTES,
+                    matrix=travel_matrix
+                )
+        else:
+            logger.info("Khoảng cách gần, chia ngày theo sức chứa (số điểm + thời gian / ngày).")
+            with span("clustering"):
+                clusters, centers = cluster_attractions_by_capacity(
+                    valid_attrs, start_location, max_days_allowed, route_cache, MAX_DAY_DURATION_MINUTES,
+                    matrix=travel_matrix
+                )
 
     logger.info(f"Trước khi tách: {len(clusters)} cụm.")
     
-    # 1. Gọi hàm tách cụm
-    clusters = post_process_clusters_capacity(clusters, max_items_per_day=3)
+    # 1. Gọi hàm tách cụm (engine 'capacity' đã giữ <= MAX_ITEMS_PER_DAY, bước này không đổi gì)
+    with span("capacity_split"):
+        clusters = post_process_clusters_capacity(clusters, max_items_per_day=MAX_ITEMS_PER_DAY)
     
-    logger.info(f"Sau khi tách (Limit 3): {len(clusters)} cụm (Số ngày dự kiến tăng).")
+    logger.info(f"Sau khi tách (Limit {MAX_ITEMS_PER_DAY}): {len(clusters)} cụm (Số ngày dự kiến tăng).")
 
     # 2. Tính lại Centers (Tâm cụm) 
     centers = []
@@ -1309,7 +1268,7 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
         else:
             centers.append([start_lat / 180.0, start_lon / 180.0, 0, 0, 0])
 
-    logger.info(f"Đã phân thành {len(clusters)} cụm (Ngày) bằng GMM.")
+    logger.info(f"Đã phân thành {len(clusters)} cụm (Ngày), engine: {TOUR_CLUSTERING_ENGINE}.")
     for i, c in enumerate(clusters):
         names = [a.name for a in c]
         logger.debug(f" - Cụm {i+1}: {names}")
@@ -1322,9 +1281,10 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
         clusters.append([])
         centers.append([start_lat / 180.0, start_lon / 180.0, 0, 0, 0])
 
-    day_clusters_raw = assign_clusters_to_days(
-        clusters, centers, festival_constraints, start_location, mst_res["order_index"]
-    )
+    with span("assign_days"):
+        day_clusters_raw = assign_clusters_to_days(
+            clusters, centers, festival_constraints, start_location, mst_res["order_index"]
+        )
 
     active_clusters = [c for c in day_clusters_raw if c["attractions"]]
     
@@ -1351,6 +1311,8 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
     
     # Đếm số ngày thực tế (Logical Day)
     logical_day_number = 0
+    weather_points = [] # Ngày + tâm cụm cần lấy thời tiết (lưu kèm cache lịch trình)
+    weather_jobs = {}   # Ngày -> future lấy thời tiết
 
     for idx, cluster_info in enumerate(day_clusters):
         logical_day_number += 1
@@ -1359,7 +1321,7 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
         target_jump_date = None
         for attr in cluster_info['attractions']:
             if attr.type == 'festival':
-                fes = Festival.query.get(attr.id)
+                fes = attr
                 if fes and fes.time_start:
                     # Tìm năm phù hợp
                     check_years = range(start_dt.year, end_dt.year + 1)
@@ -1385,34 +1347,40 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
         # 3. Thiết lập giờ xuất phát (6h sáng)
         day_start_dt = datetime.combine(curr_date.date(), datetime.min.time()).replace(hour=WAKE_UP_HOUR, minute=0)
         
-        # Lấy thời tiết tại tâm cụm
-        weather_info = None
-        if OPENWEATHERMAP_API_KEY:
-            c_lat, c_lon = cluster_info['center']
-            # Fallback về start_loc nếu center bị lỗi
-            if c_lat == 0 and c_lon == 0: c_lat, c_lon = start_location
-            weather_info = get_weather_by_date_and_coordinates(OPENWEATHERMAP_API_KEY, day_start_dt, c_lat, c_lon)
-
         # A. EVENT START DAY
-        timeline.append({
+        day_start_event = {
             "day": logical_day_number, 
             "date": day_start_dt.strftime("%d/%m/%Y"), 
             "time": format_time_vn(day_start_dt),
             "type": "DAY_START", 
             "name": f"Ngày {logical_day_number}", 
             "detail": f"Thức dậy tại vị trí {overnight_place_name}, sẵn sàng khởi hành", 
-            "weather": weather_info
-        })
+            "weather": None
+        }
+        timeline.append(day_start_event)
+
+        # Lấy thời tiết tại tâm cụm (chạy nền, các ngày gọi song song, điền kết quả ở cuối)
+        if OPENWEATHERMAP_API_KEY:
+            c_lat, c_lon = cluster_info['center']
+            # Fallback về start_loc nếu center bị lỗi
+            if c_lat == 0 and c_lon == 0: c_lat, c_lon = start_location
+            point = {"day": logical_day_number, "date": day_start_dt.strftime("%d/%m/%Y %H:%M"), "lat": c_lat, "lon": c_lon}
+            weather_points.append(point)
+            with span("weather_submit"):
+                weather_jobs[logical_day_number] = _submit_weather_job(point)
         
         # B. BUILD ITINERARY (Đi các điểm trong ngày)
-        events, stats, routes, last_location, day_end_time = build_day_itinerary(
-            logical_day_number, 
-            cluster_info['attractions'], 
-            day_start_dt, 
-            curr_loc, 
-            route_cache, 
-            mst_res['order_index']
-        )
+        with span("day_itinerary"):
+            events, stats, routes, last_location, day_end_time = build_day_itinerary(
+                logical_day_number, 
+                cluster_info['attractions'], 
+                day_start_dt, 
+                curr_loc, 
+                route_cache, 
+                mst_res['order_index'],
+                matrix=travel_matrix,
+                pool=attraction_pool
+            )
         timeline.extend(events)
 
         # C. SMART TRANSIT: QUYẾT ĐỊNH DI CHUYỂN CUỐI NGÀY
@@ -1422,7 +1390,8 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
         
         if is_last_day:
             # === NGÀY CUỐI: VỀ NHÀ ===
-            d_home, t_home, g_home, m_home = get_route_with_cache(last_location, start_location, route_cache)
+            with span("smart_transit"):
+                d_home, t_home, g_home, m_home = get_route_with_cache(last_location, start_location, route_cache)
             is_flight = isinstance(m_home, str) and m_home.startswith('plane')
             
             if d_home > 1:
@@ -1455,7 +1424,7 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
             next_event_date = None
             for attr in next_cluster['attractions']:
                 if attr.type == 'festival':
-                    fes = Festival.query.get(attr.id)
+                    fes = attr
                     if fes and fes.time_start:
                         check_years = range(start_dt.year, end_dt.year + 1)
                         for y in check_years:
@@ -1477,7 +1446,8 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
             # 2. LOGIC QUYẾT ĐỊNH
             # NẾU GAP > 3 NGÀY: Về nhà nghỉ ngơi
             if gap_days > 3:
-                d_back, t_back, g_back, m_back = get_route_with_cache(last_location, start_location, route_cache)
+                with span("smart_transit"):
+                    d_back, t_back, g_back, m_back = get_route_with_cache(last_location, start_location, route_cache)
                 is_flight = False
                 if d_back > 10: # Chỉ di chuyển nếu đang ở xa nhà
                     is_flight = isinstance(m_back, str) and m_back.startswith('plane')
@@ -1509,7 +1479,8 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
 
             # NẾU GAP <= 3 NGÀY: Di chuyển đến điểm tiếp theo nếu xa
             else:
-                d_next, t_next, g_next, m_next = get_route_with_cache(last_location, next_center, route_cache)
+                with span("smart_transit"):
+                    d_next, t_next, g_next, m_next = get_route_with_cache(last_location, next_center, route_cache)
                 is_flight = False
                 dest_location_name = "khu vực tiếp theo"
                 if d_next > 50:
@@ -1568,7 +1539,7 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
             "pointCount": stats["point_count"],
             "center": cluster_info["center"],
             "includesFestival": any(a.type == 'festival' for a in cluster_info["attractions"]),
-            "weather": weather_info
+            "weather": None
         }
         daily_summaries.append(day_summary)
         day_centers.append({"day": logical_day_number, "center": cluster_info["center"]})
@@ -1581,7 +1552,11 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
         # Tăng ngày (Logic: Ngày hôm sau là ngày tiếp theo trên lịch)
         curr_date = curr_date + timedelta(days=1)
 
+    with span("route_cache_flush"):
+        route_cache.flush()
     logger.info(f"====== HOÀN TẤT TẠO TOUR: {round(total_distance, 2)}km, {logical_day_number} ngày ======")
+    logger.info(f"Route cache: {route_cache.stats()}")
+    logger.info(f"HTTP: {get_http_stats()}")
     
     return {
         "timeline": timeline,
@@ -1601,4 +1576,58 @@ def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str
             } for constraint in festival_constraints
         ],
         "routes": daily_routes_map
-    }
\ No newline at end of file
+    }, weather_points, weather_jobs
+
+
+def _submit_weather_job(point):
+    """Lấy thời tiết 1 ngày ở thread nền (các ngày gọi song song)."""
+    day_start_dt = datetime.strptime(point["date"], "%d/%m/%Y %H:%M")
+    return get_executor().submit(
+        get_weather_by_date_and_coordinates, OPENWEATHERMAP_API_KEY, day_start_dt, point["lat"], point["lon"]
+    )
+
+
+def _attach_weather(result, weather_jobs):
+    # Điền thời tiết đã lấy song song vào sự kiện đầu ngày và tổng kết ngày
+    day_start_events = {e["day"]: e for e in result["timeline"] if e["type"] == "DAY_START"}
+    with span("weather_wait"):
+        for summary in result["dailySummaries"]:
+            job = weather_jobs.get(summary["day"])
+            if job is not None:
+                summary["weather"] = day_start_events[summary["day"]]["weather"] = job.result()
+    return result
+
+
+def generate_smart_tour(attraction_ids, start_lat, start_lon, start_datetime_str, end_datetime_str, start_point_name=None):
+    """
+    Hàm tạo lịch trình thông minh V3 (Final).
+    Tính năng:
+    - Xử lý đa năm (2025-2026).
+    - Tối ưu hóa cụm (chia ngày theo sức chứa hoặc GMM + MST).
+    - Smart Transit: Di chuyển đón đầu vào buổi tối nếu chặng sau quá xa.
+    Lịch trình được cache theo input đã chuẩn hóa (service/itinerary_cache.py),
+    thời tiết luôn lấy mới rồi ghép vào.
+    Từng bước được đo bằng span (service/tracing.py): bọc lời gọi trong trace_timings()
+    để lấy bảng thời gian, đặt TOUR_PROFILE_DIR để ghi profile mỗi lần gọi.
+    """
+    with profile_call("tour"), span("total"):
+        cache_key = None
+        if ITINERARY_CACHE_ENABLED:
+            with span("itinerary_cache"):
+                cache_key = make_itinerary_key(attraction_ids, start_lat, start_lon, start_datetime_str, end_datetime_str, start_point_name)
+                cached = get_itinerary_cache().get(cache_key)
+            if cached is not None:
+                logger.info(f"[Itinerary Cache] HIT: {len(attraction_ids)} điểm, {start_datetime_str} - {end_datetime_str}")
+                weather_jobs = {}
+                if OPENWEATHERMAP_API_KEY:
+                    with span("weather_submit"):
+                        weather_jobs = {p["day"]: _submit_weather_job(p) for p in cached["weatherPoints"]}
+                return _attach_weather(cached["result"], weather_jobs)
+
+        result, weather_points, weather_jobs = _build_smart_tour(
+            attraction_ids, start_lat, start_lon, start_datetime_str, end_datetime_str, start_point_name=start_point_name
+        )
+        if cache_key is not None:
+            with span("itinerary_cache"):
+                get_itinerary_cache().set(cache_key, {"result": result, "weatherPoints": weather_points})
+        return _attach_weather(result, weather_jobs)
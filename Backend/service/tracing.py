@@ -0,0 +1,219 @@
+"""
+Đo thời gian từng bước của generate_smart_tour (và các pipeline khác nếu cần).
+
+- span(name): context manager đo 1 bước. Luôn cộng vào histogram theo bước (toàn process),
+  nếu đang có trace (trace_timings) thì ghi thêm vào trace đó. Bước lặp lại nhiều lần
+  (VD mỗi ngày 1 lần day_itinerary) được cộng dồn thời gian + số lần gọi.
+- trace_timings(): mở trace cho 1 lời gọi -> trace.to_json() trả về bảng thời gian từng bước
+  (dùng cho ?debug=timings). Trace gắn theo contextvars nên các request song song không lẫn nhau.
+- get_stage_metrics() / render_stage_histograms(): histogram theo bước cho /api/metrics.
+- profile_call(label): bật cProfile (hoặc pyinstrument) khi đặt TOUR_PROFILE_DIR,
+  ghi 1 file / lần gọi vào thư mục đó. Không đặt thì không tốn gì.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+TOUR_PROFILE_DIR = os.getenv('TOUR_PROFILE_DIR', '')
+TOUR_PROFILER = os.getenv('TOUR_PROFILER', 'cprofile')             # 'cprofile' hoặc 'pyinstrument'
+TOUR_PROFILE_MIN_MS = float(os.getenv('TOUR_PROFILE_MIN_MS', 0))   # Chỉ ghi file khi lời gọi chậm hơn mức này
+
+# Mốc histogram (giây), giống mặc định của thư viện Prometheus + vài mốc dài cho gọi GraphHopper
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+class Trace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}    # name -> [ms, calls], giữ thứ tự bước chạy đầu tiên
+
+    def add(self, name, elapsed_ms):
+        stage = self.stages.setdefault(name, [0.0, 0])
+        stage[0] += elapsed_ms
+        stage[1] += 1
+
+    def to_json(self):
+        return {
+            "totalMs": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": [
+                {"name": name, "ms": round(ms, 1), "calls": calls}
+                for name, (ms, calls) in self.stages.items()
+            ]
+        }
+
+
+class StageHistogram:
+    def __init__(self):
+        self.buckets = [0] * len(STAGE_BUCKETS)     # Số lần <= từng mốc (chưa cộng dồn)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        for i, bound in enumerate(STAGE_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def to_json(self):
+        return {
+            "count": self.count,
+            "avgMs": round(self.total_seconds * 1000 / self.count, 1) if self.count else 0.0,
+            "maxMs": round(self.max_seconds * 1000, 1),
+            "totalMs": round(self.total_seconds * 1000, 1)
+        }
+
+
+_histograms = {}    # name -> StageHistogram
+_histogram_lock = threading.Lock()
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_timings(enabled=True):
+    """
+    with trace_timings() as trace:
+        result = generate_smart_tour(...)
+    trace.to_json() -> {"totalMs": ..., "stages": [{"name", "ms", "calls"}, ...]}
+    enabled=False thì trả về None và không ghi trace (histogram vẫn ghi như thường).
+    """
+    if not enabled:
+        yield None
+        return
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name):
+    """Đo 1 bước: cộng vào histogram của bước + trace hiện tại (nếu có)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _histogram_lock:
+            histogram = _histograms.get(name)
+            if histogram is None:
+                histogram = _histograms[name] = StageHistogram()
+            histogram.observe(elapsed)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, elapsed * 1000)
+
+
+def get_stage_metrics():
+    with _histogram_lock:
+        return {name: h.to_json() for name, h in sorted(_histograms.items())}
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_stage_histograms(name="app_tour_stage_duration_seconds"):
+    """Histogram theo bước dạng Prometheus text (nối vào sau render_prometheus)."""
+    with _histogram_lock:
+        items = [(stage, list(h.buckets), h.count, h.total_seconds) for stage, h in sorted(_histograms.items())]
+
+    lines = [
+        f"# HELP {name} Thời gian từng bước khi tạo tour (giây)",
+        f"# TYPE {name} histogram"
+    ]
+    for stage, buckets, count, total in items:
+        label = f'stage="{_label(stage)}"'
+        cumulative = 0
+        for bound, hits in zip(STAGE_BUCKETS, buckets):
+            cumulative += hits
+            lines.append(f'{name}_bucket{{{label},le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{label},le="+Inf"}} {count}')
+        lines.append(f'{name}_sum{{{label}}} {total:g}')
+        lines.append(f'{name}_count{{{label}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+# ----------------------------------------------------------------------
+# Profile theo lời gọi (bật bằng TOUR_PROFILE_DIR)
+# ----------------------------------------------------------------------
+def _profile_path(label, extension):
+    os.makedirs(TOUR_PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    return os.path.join(TOUR_PROFILE_DIR, f"{label}-{stamp}-{threading.get_ident()}.{extension}")
+
+
+def _start_profiler():
+    """Trả về (profiler, 'cprofile' | 'pyinstrument') hoặc (None, None) nếu không bật được."""
+    if TOUR_PROFILER == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("[PROFILE] Chưa cài pyinstrument, dùng cProfile")
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler, 'pyinstrument'
+
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Đã có profiler khác đang chạy (VD 2 request song song trên Python 3.12+)
+        logger.warning(f"[PROFILE] Không bật được cProfile: {e}")
+        return None, None
+    return profiler, 'cprofile'
+
+
+@contextmanager
+def profile_call(label):
+    """
+    Ghi profile của khối code ra TOUR_PROFILE_DIR:
+    - cProfile: <label>-<thời gian>.prof (xem bằng `python -m pstats` hoặc snakeviz)
+    - pyinstrument: <label>-<thời gian>.html
+    Không đặt TOUR_PROFILE_DIR thì không làm gì.
+    """
+    if not TOUR_PROFILE_DIR:
+        yield
+        return
+
+    profiler, kind = _start_profiler()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if kind == 'pyinstrument':
+                profiler.stop()
+            else:
+                profiler.disable()
+            if elapsed_ms >= TOUR_PROFILE_MIN_MS:
+                try:
+                    if kind == 'pyinstrument':
+                        path = _profile_path(label, 'html')
+                        with open(path, 'w', encoding='utf-8') as f:
+                            f.write(profiler.output_html())
+                    else:
+                        path = _profile_path(label, 'prof')
+                        profiler.dump_stats(path)
+                    logger.info(f"[PROFILE] {label}: {elapsed_ms:.0f}ms -> {path}")
+                except OSError as e:
+                    logger.warning(f"[PROFILE] Không ghi được file profile: {e}")
@@ -0,0 +1,113 @@
+from datetime import datetime
+from models import db, Attraction, AttractionTravel
+from .routing import get_travel_time, prefetch_travel_matrix, ESTIMATED_MODE, MATRIX_BATCH_SIZE
+from .route_cache import get_shared_route_cache
+from .itinerary_cache import bump_data_version
+
+BATCH_SIZE = 500
+
+
+def _find_dirty_attractions(coords):
+    """
+    Điểm cần tính lại = điểm mới (chưa có dòng nào trong ma trận),
+    điểm đã bị đổi tọa độ so với lần tính trước
+    hoặc còn cặp chỉ là ước lượng đường chim bay (lần trước GraphHopper lỗi).
+    """
+    stored = {
+        row.from_id: (row.from_lat, row.from_lon)
+        for row in db.session.query(
+            AttractionTravel.from_id, AttractionTravel.from_lat, AttractionTravel.from_lon
+        ).distinct()
+    }
+    estimated = {
+        row.from_id
+        for row in db.session.query(AttractionTravel.from_id)
+        .filter(AttractionTravel.mode == ESTIMATED_MODE).distinct()
+    }
+    return {attr_id for attr_id, coord in coords.items() if stored.get(attr_id) != coord or attr_id in estimated}
+
+
+def refresh_travel_matrix(full=False, batch_size=BATCH_SIZE):
+    """
+    Job offline: tính khoảng cách / thời gian / phương tiện cho mọi cặp điểm
+    và lưu vào bảng attraction_travel.
+
+    - full=False (mặc định): chỉ tính lại các cặp có ít nhất 1 đầu là điểm mới,
+      điểm đã bị di chuyển hoặc còn cặp ước lượng (mode = ESTIMATED_MODE), xóa các dòng của điểm đã bị xóa.
+    - full=True: tính lại toàn bộ.
+    Commit theo lô batch_size dòng.
+    """
+    coords = {
+        row.id: (row.lat, row.lon)
+        for row in db.session.query(Attraction.id, Attraction.lat, Attraction.lon)
+        if row.lat is not None and row.lon is not None
+    }
+
+    # 1. Dọn dòng của điểm không còn tồn tại
+    removed = AttractionTravel.query.filter(
+        ~AttractionTravel.from_id.in_(coords.keys()) | ~AttractionTravel.to_id.in_(coords.keys())
+    ).delete(synchronize_session=False)
+
+    dirty = set(coords.keys()) if full else _find_dirty_attractions(coords)
+    if not dirty:
+        if removed:
+            bump_data_version()
+        db.session.commit()
+        print(f"Travel matrix is up to date ({len(coords)} attractions, removed {removed} stale rows).")
+        return 0
+
+    print(f"Refreshing travel matrix for {len(dirty)}/{len(coords)} attractions...")
+
+    # 2. Xóa các cặp liên quan tới điểm cần tính lại
+    dirty_ids = list(dirty)
+    AttractionTravel.query.filter(
+        AttractionTravel.from_id.in_(dirty_ids) | AttractionTravel.to_id.in_(dirty_ids)
+    ).delete(synchronize_session=False)
+
+    # 3. Tính lại các cặp (from, to) có ít nhất 1 đầu bị "dirty"
+    route_cache = get_shared_route_cache()
+    now = datetime.utcnow()
+    batch = []
+    written = 0
+
+    all_coords = list(coords.values())
+    dirty_coords = [coords[attr_id] for attr_id in dirty_ids]
+    items = list(coords.items())
+
+    for i in range(0, len(items), MATRIX_BATCH_SIZE):
+        chunk = items[i:i + MATRIX_BATCH_SIZE]
+
+        # Điểm dirty cần cả hàng, điểm sạch chỉ cần các cột dirty -> lấy theo lô qua Matrix API
+        matrix = prefetch_travel_matrix([start for attr_id, start in chunk if attr_id in dirty], all_coords, route_cache)
+        prefetch_travel_matrix([start for attr_id, start in chunk if attr_id not in dirty], dirty_coords, route_cache, matrix)
+
+        for from_id, start in chunk:
+            for to_id, end in items:
+                if from_id == to_id or (from_id not in dirty and to_id not in dirty):
+                    continue
+
+                dist, mins, mode = get_travel_time(start, end, route_cache, matrix)
+                batch.append({
+                    "from_id": from_id, "to_id": to_id,
+                    "from_lat": start[0], "from_lon": start[1],
+                    "to_lat": end[0], "to_lon": end[1],
+                    "distance_km": dist, "duration_min": int(mins),
+                    "mode": mode, "updated_at": now
+                })
+
+                if len(batch) >= batch_size:
+                    db.session.bulk_insert_mappings(AttractionTravel, batch)
+                    db.session.commit()
+                    written += len(batch)
+                    batch = []
+                    print(f"  ... {written} pairs written")
+
+    if batch:
+        db.session.bulk_insert_mappings(AttractionTravel, batch)
+        written += len(batch)
+    # Lịch trình đã cache dùng khoảng cách cũ -> tăng phiên bản dữ liệu (commit luôn)
+    bump_data_version()
+    route_cache.flush()
+
+    print(f"Travel matrix refreshed: {written} pairs written, {removed} stale rows removed.")
+    return written
@@ -1,30 +1,129 @@
 """Service functions for user-related operations"""
-from models import db, User, FavoriteAttraction, Review, Attraction
+from collections import defaultdict
+
+from models import db, User, FavoriteAttraction, Review, Attraction, Festival, CulturalSpot, Tag, attraction_tags
+from .pagination import DEFAULT_PAGE_SIZE, keyset_page
+
+# Only the columns the responses need, read as plain rows (no ORM objects, no lazy loads)
+_festival = Festival.__table__
+_cultural_spot = CulturalSpot.__table__
+ATTRACTION_COLUMNS = (
+    Attraction.id, Attraction.name, Attraction.location, Attraction.brief_description,
+    Attraction.detail_description, Attraction.average_rating, Attraction.visit_duration,
+    Attraction.image_url, Attraction.lat, Attraction.lon, Attraction.type,
+    _festival.c.time_start, _festival.c.time_end, _festival.c.is_lunar,
+    _festival.c.original_start, _festival.c.original_end,
+    _cultural_spot.c.opening_hours, _cultural_spot.c.ticket_price, _cultural_spot.c.spot_type
+)
+
+
+def _tags_by_attraction(attraction_ids):
+    """Tag names of many attractions in one query: {attraction_id: [tag_name, ...]}"""
+    tags = defaultdict(list)
+    if attraction_ids:
+        rows = db.session.query(attraction_tags.c.attraction_id, Tag.tag_name)\
+            .join(Tag, Tag.id == attraction_tags.c.tag_id)\
+            .filter(attraction_tags.c.attraction_id.in_(attraction_ids))\
+            .order_by(attraction_tags.c.attraction_id, Tag.id)
+        for attraction_id, tag_name in rows:
+            tags[attraction_id].append(tag_name)
+    return tags
+
+
+def attraction_row_json(row, tags):
+    """Same output as Attraction/Festival/CulturalSpot.to_json, built from an ATTRACTION_COLUMNS row."""
+    data = {
+        "id": row.id,
+        "name": row.name,
+        "location": row.location,
+        "briefDescription": row.brief_description,
+        "detailDescription": row.detail_description,
+        "averageRating": row.average_rating,
+        "visitDuration": row.visit_duration,
+        "imageUrl": row.image_url,
+        "tags": tags,
+        "lat": row.lat,
+        "lon": row.lon
+    }
+    if row.type == 'festival':
+        data.update({
+            "timeStart": row.time_start.isoformat() if row.time_start else None,
+            "timeEnd": row.time_end.isoformat() if row.time_end else None,
+            "isLunar": row.is_lunar,
+            "originalStart": row.original_start,
+            "originalEnd": row.original_end,
+            "type": "festival"
+        })
+    elif row.type == 'cultural_spot':
+        data.update({
+            "openingHours": row.opening_hours,
+            "ticketPrice": row.ticket_price,
+            "spotType": row.spot_type,
+            "type": "cultural_spot"
+        })
+    return data
+
 
 def get_user_favorites_service(user_id):
-    """Get all favorite attractions for a user"""
-    favorites = FavoriteAttraction.query.filter_by(user_id=user_id).all()
-    attractions = []
-    for fav in favorites:
-        attraction = Attraction.query.get(fav.attraction_id)
-        if attraction:
-            attractions.append(attraction.to_json())
-    return attractions
-
-def get_user_reviews_service(user_id):
-    """Get all reviews written by a user"""
-    reviews = Review.query.filter_by(user_id=user_id).order_by(Review.created_at.desc()).all()
+    """
+    Get all favorite attractions for a user.
+    2 queries whatever the number of favorites: attraction columns (+ festival / cultural spot columns
+    via outer join), then tags of all of them.
+    """
+    rows = db.session.query(*ATTRACTION_COLUMNS)\
+        .select_from(FavoriteAttraction)\
+        .join(Attraction, Attraction.id == FavoriteAttraction.attraction_id)\
+        .outerjoin(_festival, _festival.c.id == Attraction.id)\
+        .outerjoin(_cultural_spot, _cultural_spot.c.id == Attraction.id)\
+        .filter(FavoriteAttraction.user_id == user_id)\
+        .order_by(Attraction.id).all()
+    tags = _tags_by_attraction([row.id for row in rows])
+    return [attraction_row_json(row, tags.get(row.id, [])) for row in rows]
+
+
+def count_user_reviews(user_id):
+    """Total number of reviews written by a user (independent of the current page)."""
+    return Review.query.filter_by(user_id=user_id).count()
+
+
+def get_user_reviews_service(user_id, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """
+    Get one page of reviews written by a user (newest first), with author and attraction
+    in the same query. Returns (reviews_data, next_cursor); next_cursor is None on the last page.
+    """
+    query = db.session.query(
+        Review.review_id, Review.user_id, Review.rating_score, Review.content, Review.created_at,
+        User.username, User.avatar_url, User.email,
+        Attraction.id.label('attraction_id'), Attraction.name.label('attraction_name'),
+        Attraction.location.label('attraction_location'), Attraction.image_url.label('attraction_image_url')
+    ).select_from(Review)\
+        .outerjoin(User, User.user_id == Review.user_id)\
+        .outerjoin(Attraction, Attraction.id == Review.attraction_id)\
+        .filter(Review.user_id == user_id)
+    rows, next_cursor = keyset_page(query, (Review.created_at, Review.review_id), limit, cursor)
+
     reviews_data = []
-    for review in reviews:
-        attraction = Attraction.query.get(review.attraction_id)
-        review_data = review.to_json()
-        if attraction:
-            review_data['attraction'] = {   
-                'id': attraction.id,
-                'name': attraction.name,
-                'location': attraction.location,
-                'imageUrl': attraction.image_url
+    for row in rows:
+        # Same fields as Review.to_json
+        review_data = {
+            "reviewId": row.review_id,
+            "userId": row.user_id,
+            "rating": row.rating_score,
+            "content": row.content,
+            "createdAt": row.created_at.isoformat() if row.created_at else None,
+            "user": {
+                "user_id": row.user_id,
+                "username": row.username,
+                "avatar_url": row.avatar_url,
+                "email": row.email
+            } if row.username is not None else None
+        }
+        if row.attraction_id is not None:
+            review_data['attraction'] = {
+                'id': row.attraction_id,
+                'name': row.attraction_name,
+                'location': row.attraction_location,
+                'imageUrl': row.attraction_image_url
             }
         reviews_data.append(review_data)
-    return reviews_data
-
+    return reviews_data, next_cursor
@@ -0,0 +1,169 @@
+"""
+Cache dự báo thời tiết OpenWeatherMap theo ô lưới tọa độ.
+
+- API forecast trả về 40 mốc (3 giờ / mốc, 5 ngày) cho 1 tọa độ -> lưu nguyên response
+  theo ô lưới (lat/lon làm tròn WEATHER_GRID_DECIMALS), mọi ngày của tour đọc từ 1 lần gọi.
+- Hạn dùng theo chu kỳ cập nhật 3 giờ của dự báo: hết hạn ở mốc 3 giờ kế tiếp
+  (00h, 03h, 06h... UTC) thay vì đếm TTL từ lúc gọi.
+- Stale-while-revalidate: quá hạn nhưng chưa quá WEATHER_STALE_SECONDS thì trả bản cũ ngay
+  và làm mới ở thread nền; quá nữa thì gọi lại và chờ.
+  Làm mới chạy trên thread pool riêng (không dùng executor HTTP chung): job thời tiết từng ngày
+  trên executor chung có thể đang chờ đúng lần làm mới đó, dùng chung pool thì có thể chờ nhau mãi.
+- Nhiều ngày / request cùng ô lưới gọi đồng thời chỉ phát sinh 1 request ra ngoài.
+- URL cấu hình được (OPENWEATHERMAP_FORECAST_URL) để trỏ sang weather_stub_server.py khi test.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+
+from .http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+OPENWEATHERMAP_FORECAST_URL = os.getenv('OPENWEATHERMAP_FORECAST_URL', 'http://api.openweathermap.org/data/2.5/forecast')
+OPENWEATHERMAP_CURRENT_URL = os.getenv('OPENWEATHERMAP_CURRENT_URL', 'https://api.openweathermap.org/data/2.5/weather')
+WEATHER_GRID_DECIMALS = int(os.getenv('WEATHER_GRID_DECIMALS', 1))           # 1 số lẻ ~ 11km
+WEATHER_REFRESH_SECONDS = int(os.getenv('WEATHER_REFRESH_SECONDS', 3 * 3600))  # Chu kỳ cập nhật dự báo
+WEATHER_STALE_SECONDS = int(os.getenv('WEATHER_STALE_SECONDS', 3 * 3600))     # Cho dùng bản cũ thêm bao lâu
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv('WEATHER_CACHE_MAX_ENTRIES', 2000))
+WEATHER_REFRESH_WORKERS = int(os.getenv('WEATHER_REFRESH_WORKERS', 2))         # Số thread làm mới nền
+
+
+def grid_cell(lat, lon):
+    return round(float(lat), WEATHER_GRID_DECIMALS), round(float(lon), WEATHER_GRID_DECIMALS)
+
+
+def next_refresh_at(now=None):
+    """Mốc cập nhật dự báo kế tiếp (bội số của WEATHER_REFRESH_SECONDS tính từ epoch, tức theo giờ UTC)."""
+    now = time.time() if now is None else now
+    return (int(now // WEATHER_REFRESH_SECONDS) + 1) * WEATHER_REFRESH_SECONDS
+
+
+class WeatherCache:
+    """
+    Cache response forecast theo ô lưới. Value là dict JSON của API
+    (hoặc None nếu API lỗi / trả mã khác 200 -> không cache).
+    """
+
+    def __init__(self, max_entries=WEATHER_CACHE_MAX_ENTRIES, stale_seconds=WEATHER_STALE_SECONDS):
+        self.max_entries = max_entries
+        self.stale_seconds = stale_seconds
+        self._entries = {}          # cell -> (fresh_until, data)
+        self._in_flight = {}        # cell -> Future của lần gọi đang chạy
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.api_calls = 0
+
+    def get_forecast(self, api_key, lat, lon):
+        cell = grid_cell(lat, lon)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(cell)
+            if entry is not None:
+                fresh_until, data = entry
+                if now < fresh_until:
+                    self.hits += 1
+                    return data
+                if now < fresh_until + self.stale_seconds:
+                    # Trả bản cũ ngay, làm mới ở thread nền (nếu chưa có ai đang làm)
+                    self.stale_hits += 1
+                    if cell not in self._in_flight:
+                        future = self._in_flight[cell] = Future()
+                        _get_refresh_executor().submit(self._fetch, api_key, cell, future)
+                    return data
+            self.misses += 1
+            future = self._in_flight.get(cell)
+            is_owner = future is None
+            if is_owner:
+                future = self._in_flight[cell] = Future()
+
+        if is_owner:
+            self._fetch(api_key, cell, future)
+        # Các ngày / request khác cùng ô lưới chờ chung 1 lời gọi
+        return future.result()
+
+    def _fetch(self, api_key, cell, future):
+        data = None
+        try:
+            data = _request_forecast(api_key, *cell)
+        finally:
+            with self._lock:
+                self.api_calls += 1
+                if data is not None:
+                    self._entries.pop(cell, None)
+                    self._entries[cell] = (next_refresh_at(), data)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.pop(next(iter(self._entries)))
+                self._in_flight.pop(cell, None)
+            future.set_result(data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "staleHits": self.stale_hits,
+                "misses": self.misses,
+                "apiCalls": self.api_calls
+            }
+
+
+def _request_forecast(api_key, lat, lon):
+    params = {
+        'lat': lat,
+        'lon': lon,
+        'appid': api_key,
+        'units': 'metric',
+        'cnt': 40
+    }
+    try:
+        response = get_http_client().get(OPENWEATHERMAP_FORECAST_URL, endpoint='openweathermap.forecast', params=params, timeout=10)
+        if response.status_code == 200:
+            return response.json()
+        print(f"[Weather Error] Status: {response.status_code}, Message: {response.text}")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"[Weather Failed] {e}")
+    return None
+
+
+_weather_cache = None
+_cache_lock = threading.Lock()
+_refresh_executor = None
+
+
+def _get_refresh_executor():
+    """Thread pool riêng cho làm mới nền: thread ở đây không chờ gì khác nên luôn chạy xong."""
+    global _refresh_executor
+    if _refresh_executor is None:
+        with _cache_lock:
+            if _refresh_executor is None:
+                _refresh_executor = ThreadPoolExecutor(
+                    max_workers=WEATHER_REFRESH_WORKERS, thread_name_prefix='weather-refresh'
+                )
+    return _refresh_executor
+
+
+def get_weather_cache():
+    """Cache thời tiết dùng chung cho toàn process."""
+    global _weather_cache
+    if _weather_cache is None:
+        with _cache_lock:
+            if _weather_cache is None:
+                _weather_cache = WeatherCache()
+    return _weather_cache
+
+
+def get_forecast(api_key, lat, lon):
+    """Response forecast 5 ngày của ô lưới chứa (lat, lon), None nếu không lấy được."""
+    return get_weather_cache().get_forecast(api_key, lat, lon)
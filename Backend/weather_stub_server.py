@@ -0,0 +1,104 @@
+"""
+Server giả lập OpenWeatherMap (forecast + current weather) để chạy / test tạo tour
+không cần mạng và API key thật. Dữ liệu sinh theo tọa độ + thời gian, cùng input cho cùng kết quả.
+
+Cách chạy (trong thư mục Backend):
+    python weather_stub_server.py --port 8090
+
+Rồi chạy app với:
+    OPENWEATHERMAP_API_KEY=stub
+    OPENWEATHERMAP_FORECAST_URL=http://127.0.0.1:8090/data/2.5/forecast
+    OPENWEATHERMAP_CURRENT_URL=http://127.0.0.1:8090/data/2.5/weather
+
+GET /stats trả về số lần đã gọi từng API (kiểm tra cache thời tiết).
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SLOT_SECONDS = 3 * 3600
+SLOT_COUNT = 40
+CONDITIONS = [
+    ("Clear", "bầu trời quang đãng", "01d"),
+    ("Clouds", "mây rải rác", "03d"),
+    ("Rain", "mưa nhẹ", "10d"),
+]
+
+_calls = {"forecast": 0, "weather": 0}
+_calls_lock = threading.Lock()
+
+
+def _slot(lat, lon, dt):
+    seed = int(abs(lat) * 100 + abs(lon) * 10 + dt // SLOT_SECONDS)
+    main, description, icon = CONDITIONS[seed % len(CONDITIONS)]
+    hour = time.gmtime(dt).tm_hour
+    temp = round(24 + (lat % 5) + (4 if 3 <= hour <= 9 else 0) - (seed % 3), 1)   # 03-09h UTC = 10-16h giờ VN
+    return {
+        "dt": dt,
+        "main": {"temp": temp, "temp_min": temp - 1, "temp_max": temp + 1, "humidity": 60 + seed % 30},
+        "weather": [{"main": main, "description": description, "icon": icon}],
+        "wind": {"speed": round(1 + seed % 5 * 0.7, 1)},
+        "clouds": {"all": seed % 100}
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        if url.path == '/stats':
+            with _calls_lock:
+                return self._send(200, dict(_calls))
+
+        try:
+            lat, lon = float(query['lat']), float(query['lon'])
+        except (KeyError, ValueError):
+            return self._send(400, {"cod": "400", "message": "wrong latitude or longitude"})
+        if not query.get('appid'):
+            return self._send(401, {"cod": 401, "message": "Invalid API key"})
+
+        first_slot = (int(time.time()) // SLOT_SECONDS + 1) * SLOT_SECONDS
+        if url.path == '/data/2.5/forecast':
+            with _calls_lock:
+                _calls["forecast"] += 1
+            count = min(int(query.get('cnt', SLOT_COUNT)), SLOT_COUNT)
+            slots = [_slot(lat, lon, first_slot + i * SLOT_SECONDS) for i in range(count)]
+            return self._send(200, {"cod": "200", "cnt": count, "list": slots, "city": {"coord": {"lat": lat, "lon": lon}}})
+        if url.path == '/data/2.5/weather':
+            with _calls_lock:
+                _calls["weather"] += 1
+            current = _slot(lat, lon, int(time.time()))
+            return self._send(200, {**current, "coord": {"lat": lat, "lon": lon}})
+        return self._send(404, {"cod": "404", "message": "not found"})
+
+    def log_message(self, format, *args):
+        pass    # Không in log từng request
+
+
+def serve(host='127.0.0.1', port=8090):
+    """Chạy server ở thread nền, trả về server (gọi server.shutdown() để dừng)."""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Server giả lập OpenWeatherMap cho môi trường dev / test")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    args = parser.parse_args()
+
+    print(f"Weather stub chạy tại http://{args.host}:{args.port}/data/2.5/forecast")
+    ThreadingHTTPServer((args.host, args.port), StubHandler).serve_forever()